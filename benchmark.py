@@ -1,17 +1,88 @@
 import time
 import os
+import csv
+import json
+import traceback
+import multiprocessing
 from database import RelationalDatabase
+from estimator import ComplementEstimator
+from profiling import StageProfiler
+from workload_generator import SyntheticWorkloadGenerator
 import matplotlib.pyplot as plt
 import numpy as np
+from sklearn.metrics import adjusted_rand_score, normalized_mutual_info_score
+
+# Dataset folders (name, path) directly inside a benchmark folder, optionally limited to the selected names
+def DatasetFolders(benchmark_folder: str, selected: list[str] = None):
+    if not benchmark_folder:
+        return []
+    datasets = []
+    for dir_name in sorted(os.listdir(benchmark_folder)):
+        dir_path = os.path.join(benchmark_folder, dir_name)
+        if os.path.isdir(dir_path) and (not selected or dir_name in selected):
+            datasets.append((dir_name, dir_path))
+    return datasets
+
+# Pair counts (true positives, false positives, true negatives, false negatives) of a column alignment, over
+# each pair of tables (including a table and itself) and each pair of columns from these tables. Columns with
+# the same name are a positive pair, and the pair is flagged as positive if they have the same integration ID.
+# Instead of comparing every pair, the pairs with equal labels are counted from how often each label occurs:
+# over all ordered pairs of tables a label that occurs n times forms n^2 pairs, and adding the pairs within
+# each table counts every pair of tables with i <= j twice
+def PairConfusionCounts(table_indices: list[int], column_names: list[str], integration_ids: list[int]):
+    if len(table_indices) == 0:
+        return 0, 0, 0, 0
+    table_indices = np.asarray(table_indices, dtype=np.int64)
+    name_codes = np.unique(np.asarray(column_names, dtype=str), return_inverse=True)[1].reshape(-1)
+    id_codes = np.unique(np.asarray(integration_ids), return_inverse=True)[1].reshape(-1)
+
+    def EqualLabelPairs(labels):
+        overall = np.unique(labels, return_counts=True)[1]
+        within_tables = np.unique(table_indices * (labels.max() + 1) + labels, return_counts=True)[1]
+        return int((np.sum(overall ** 2) + np.sum(within_tables ** 2)) // 2)
+
+    all_pairs = EqualLabelPairs(np.zeros_like(table_indices))
+    same_name = EqualLabelPairs(name_codes)
+    same_id = EqualLabelPairs(id_codes)
+    true_positives = EqualLabelPairs(name_codes * (id_codes.max() + 1) + id_codes)
+    false_negatives = same_name - true_positives
+    false_positives = same_id - true_positives
+    true_negatives = all_pairs - true_positives - false_negatives - false_positives
+    return true_positives, false_positives, true_negatives, false_negatives
 
 class Benchmarker:
-    def __init__(self):
+    # output_policy selects which ALITE stages are written to TestData ("none", "final" or "all"), and
+    # trace_memory enables tracemalloc peaks in the per-stage statistics (at a noticeable runtime cost), and
+    # profile writes a cProfile of every stage to TestData/<dataset> and reports the hot functions.
+    # column_features selects how columns are featurized for alignment ("values" or "signature"), and
+    # estimate_output records the sampled output estimate of every run in OutputEstimates (which takes a pass
+    # over the tables per pair of tables), to calibrate RelationalDatabase.EstimateComplement
+    def __init__(self, output_policy: str = "all", trace_memory: bool = False, profile: bool = False,
+                 column_features: str = "values", estimate_output: bool = False):
+        self.OutputPolicy = output_policy
+        self.TraceMemory = trace_memory
+        self.Profile = profile
+        self.ColumnFeatures = column_features
+        self.RecordOutputEstimates = estimate_output
         self.Durations: dict[tuple[str, str], float] = {}
         self.TupleCounts: dict[tuple[str, str], tuple[int, int]] = {}
+        # output size predicted from samples of the aligned tables, to calibrate RelationalDatabase.EstimateComplement
+        self.OutputEstimates: dict[tuple[str, str], float] = {}
         self.ClusterDurations: dict[str, float] = {}
         self.ClusterQuality: dict[str, list[float]] = {}
         self.ClusterParameters: dict[str, list[int]] = {}
+        # adjusted rand index and normalized mutual information of the alignment against the column names
+        self.ClusterAgreement: dict[str, dict[str, float]] = {}
         self.SilhouetteScores: dict[str, dict[int, float]] = {}
+        # every measured duration, for repeated runs of the same dataset
+        self.DurationSamples: dict[tuple[str, str], list[float]] = {}
+        self.ClusterDurationSamples: dict[str, list[float]] = {}
+        # per-stage records (see Instrumentation) for each benchmarked dataset and method
+        self.StageStatistics: dict[tuple[str, str], list[dict]] = {}
+        # functions with the most own time in profiled runs, for each dataset and method
+        self.HotFunctions: dict[tuple[str, str], list[dict]] = {}
+        # datasets that failed or timed out in a parallel run, keyed by (stage, dataset name), with the reason
+        self.FailedBenchmarks: dict[tuple[str, str], str] = {}
 
         if not os.path.exists('TestData'):
             os.mkdir('TestData')
@@ -19,7 +90,10 @@ class Benchmarker:
     def Benchmark2(self, database: RelationalDatabase, dataset_name: str, method: str):
         # Select the appropriate method function based on the method name
         if method.lower() == "alite":
-            method_func = database.RunALITE
+            method_func = lambda folder: database.RunALITE(folder, output_policy=self.OutputPolicy, profile=self.Profile)
+        elif method.lower() == "alite-sqlite":
+            method_func = lambda folder: database.RunALITE(folder, output_policy=self.OutputPolicy, profile=self.Profile,
+                                                           engine="sqlite")
         else:
             print(f"{method} is not a valid method or is not implemented.")
             return
@@ -31,15 +105,22 @@ class Benchmarker:
 
         # Measure initial tuple count
         input_tuples = database.TupleCount()
+        database.Instrumentation.Reset()
+        database.Instrumentation.TraceMemory = self.TraceMemory
 
         # Benchmark the method execution time
         start_time = time.time()
         full_disjunction = method_func(dataset_output_folder)
         end_time = time.time()
 
+        # stage outputs are written in the background, wait for them outside of the timed section
+        database.WaitForOutput()
+
         # Store the duration
         duration = end_time - start_time
         self.Durations[(dataset_name, method)] = duration
+        self.DurationSamples.setdefault((dataset_name, method), []).append(duration)
+        self.StageStatistics[(dataset_name, method)] = [record.AsDict() for record in database.Instrumentation.Records]
 
         # Attempt to get output tuple count
         try:
@@ -49,13 +130,36 @@ class Benchmarker:
 
         # Store the input and output tuple counts
         self.TupleCounts[(dataset_name, method)] = (input_tuples, output_tuples)
+        # the tables are aligned now, so the uncalibrated output estimate can be recorded for later calibration
+        if self.RecordOutputEstimates:
+            self.OutputEstimates[(dataset_name, method)] = ComplementEstimator().EstimateOutput(database.Tables)[0]
         print(f"{method} took {duration:.2f} seconds on {dataset_name}, {input_tuples} -> {output_tuples}")
+        print(database.Instrumentation.Summary())
+        if database.Profiler:
+            self.HotFunctions[(dataset_name, method)] = database.Profiler.HotFunctions()
+            print(database.Profiler.Summary())
 
     def Benchmark(self, data_folder: str, dataset_name: str, method: str):
         db = RelationalDatabase()
         db.LoadFromFolder(data_folder)
         self.Benchmark2(db, dataset_name, method)
 
+    # Benchmark a method on synthetic workloads of increasing size to find where its runtime stops scaling.
+    # The remaining parameters are passed to SyntheticWorkloadGenerator. With known_alignment, the columns
+    # are aligned by their generated names instead of by the embedding model
+    def BenchmarkScaling(self, row_counts: list[int], method: str = "ALITE", known_alignment: bool = True, **generator_params):
+        for row_count in row_counts:
+            dataset_name = f"synthetic_{row_count}"
+            data_folder = os.path.join('TestData', 'Synthetic', dataset_name)
+            generator = SyntheticWorkloadGenerator(row_count=row_count, **generator_params)
+            generator.Generate(data_folder)
+
+            db = RelationalDatabase()
+            db.LoadFromFolder(data_folder)
+            if known_alignment:
+                SyntheticWorkloadGenerator.ApplyKnownAlignment(db)
+            self.Benchmark2(db, dataset_name, method)
+
     def RunBenchmarks(self, align_benchmark_folder: str ,integration_benchmark_folder: str):
         # run clustering quality benchmarks for the align benchmark folder
         if align_benchmark_folder:
@@ -64,7 +168,8 @@ class Benchmarker:
                     for dir_name in dirs:
                         dir_path = os.path.join(root, dir_name)
                         db = RelationalDatabase()
-                        db.LoadFromFolder(dir_path)
+                        # clustering only looks at column samples, so the full tables are never read
+                        db.LoadFromFolder(dir_path, lazy=True)
                         self.ClusteringQualityStatistics(db, dir_name)
         
         # run the integration benchmarks for the integration benchmark folder
@@ -79,6 +184,157 @@ class Benchmarker:
                         for method in methods:
                             self.Benchmark2(db, dir_name, method)
 
+    # Collect all recorded results into a JSON-serializable dictionary
+    def Results(self):
+        integration = []
+        for (dataset_name, method), samples in self.DurationSamples.items():
+            input_tuples, output_tuples = self.TupleCounts.get((dataset_name, method), (None, None))
+            integration.append({
+                "dataset": dataset_name,
+                "method": method,
+                "durations": samples,
+                "input_tuples": input_tuples,
+                "output_tuples": output_tuples,
+                "stages": self.StageStatistics.get((dataset_name, method), []),
+                "hot_functions": self.HotFunctions.get((dataset_name, method), []),
+            })
+
+        clustering = []
+        quality_names = ["true_positives", "false_positives", "true_negatives", "false_negatives",
+                         "precision", "recall", "accuracy", "f1"]
+        parameter_names = ["table_count", "min_columns", "max_columns", "predicted_columns", "actual_columns"]
+        for dataset_name, quality in self.ClusterQuality.items():
+            clustering.append({
+                "dataset": dataset_name,
+                "durations": self.ClusterDurationSamples.get(dataset_name, []),
+                "quality": dict(zip(quality_names, quality)),
+                "parameters": dict(zip(parameter_names, self.ClusterParameters.get(dataset_name, []))),
+                "agreement": self.ClusterAgreement.get(dataset_name, {}),
+                "silhouette_scores": {str(n): score for n, score in self.SilhouetteScores.get(dataset_name, {}).items()},
+                "hot_functions": self.HotFunctions.get((dataset_name, "Alignment"), []),
+            })
+        return {"integration": integration, "clustering": clustering}
+
+    # Write the results to a JSON file, or to a CSV file with one row per measured run
+    def ExportResults(self, filepath: str):
+        results = self.Results()
+        if filepath.lower().endswith(".csv"):
+            with open(filepath, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                writer.writerow(["kind", "dataset", "method", "repetition", "duration", "input_tuples", "output_tuples",
+                                 "precision", "recall", "accuracy", "f1"])
+                for entry in results["integration"]:
+                    for repetition, duration in enumerate(entry["durations"]):
+                        writer.writerow(["integration", entry["dataset"], entry["method"], repetition, duration,
+                                         entry["input_tuples"], entry["output_tuples"], "", "", "", ""])
+                for entry in results["clustering"]:
+                    quality = entry["quality"]
+                    for repetition, duration in enumerate(entry["durations"]):
+                        writer.writerow(["clustering", entry["dataset"], "", repetition, duration, "", "",
+                                         quality["precision"], quality["recall"], quality["accuracy"], quality["f1"]])
+        else:
+            with open(filepath, 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2, default=float)
+        print(f"Benchmark results saved to {filepath}")
+
+    # Result dictionaries that can be merged from benchmarkers that ran in other processes
+    def ResultDictionaries(self):
+        return {
+            "Durations": self.Durations,
+            "TupleCounts": self.TupleCounts,
+            "OutputEstimates": self.OutputEstimates,
+            "ClusterDurations": self.ClusterDurations,
+            "ClusterQuality": self.ClusterQuality,
+            "ClusterParameters": self.ClusterParameters,
+            "ClusterAgreement": self.ClusterAgreement,
+            "SilhouetteScores": self.SilhouetteScores,
+            "StageStatistics": self.StageStatistics,
+            "HotFunctions": self.HotFunctions,
+            "DurationSamples": self.DurationSamples,
+            "ClusterDurationSamples": self.ClusterDurationSamples,
+        }
+
+    def MergeResults(self, results: dict):
+        for name, values in results.items():
+            merged = getattr(self, name)
+            if name.endswith("Samples"):
+                for key, samples in values.items():
+                    merged.setdefault(key, []).extend(samples)
+            else:
+                merged.update(values)
+
+    # Run the benchmarks of RunBenchmarks with each dataset in its own process, at most workers at a time.
+    # A dataset that raises, crashes or runs longer than timeout seconds is recorded in FailedBenchmarks and
+    # does not affect the others. Results are merged into the same dictionaries as a sequential run
+    def RunBenchmarksParallel(self, align_benchmark_folder: str, integration_benchmark_folder: str, workers: int = None,
+                              timeout: float = None, selected: list[str] = None):
+        workers = workers or os.cpu_count()
+        tasks = [("align", dir_name, dir_path) for dir_name, dir_path in DatasetFolders(align_benchmark_folder, selected)]
+        tasks += [("integration", dir_name, dir_path) for dir_name, dir_path in DatasetFolders(integration_benchmark_folder, selected)]
+
+        running = []    # (process, connection, task, start time)
+        while tasks or running:
+            while tasks and len(running) < workers:
+                task = tasks.pop(0)
+                receiver, sender = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(target=BenchmarkDatasetInProcess,
+                                                  args=(*task, self.OutputPolicy, self.TraceMemory, self.Profile,
+                                                        self.ColumnFeatures, self.RecordOutputEstimates, sender))
+                process.start()
+                sender.close()
+                running.append((process, receiver, task, time.time()))
+                print(f"Started {task[0]} benchmark for {task[1]}")
+
+            still_running = []
+            for process, receiver, task, start_time in running:
+                stage, dataset_name = task[0], task[1]
+                if receiver.poll():
+                    status, payload = receiver.recv()
+                    process.join()
+                    if status == "ok":
+                        self.MergeResults(payload)
+                        print(f"Finished {stage} benchmark for {dataset_name}")
+                    else:
+                        self.FailedBenchmarks[(stage, dataset_name)] = payload
+                        print(f"{stage} benchmark for {dataset_name} failed:\n{payload}")
+                elif not process.is_alive():
+                    self.FailedBenchmarks[(stage, dataset_name)] = f"worker exited with code {process.exitcode}"
+                    print(f"{stage} benchmark for {dataset_name} crashed (exit code {process.exitcode})")
+                elif timeout and time.time() - start_time > timeout:
+                    process.terminate()
+                    process.join()
+                    self.FailedBenchmarks[(stage, dataset_name)] = f"timed out after {timeout} seconds"
+                    print(f"{stage} benchmark for {dataset_name} timed out after {timeout} seconds")
+                else:
+                    still_running.append((process, receiver, task, start_time))
+                    continue
+                receiver.close()
+            running = still_running
+            time.sleep(0.1)
+
+    # Run the Align benchmark once with every column featurization, recording each dataset as
+    # "<dataset> [<features>]", and return the mean F1 score and alignment time of each featurization
+    def CompareColumnFeatures(self, align_benchmark_folder: str, selected: list[str] = None,
+                              column_features: list[str] = None):
+        original_features = self.ColumnFeatures
+        comparison = {}
+        for features in column_features or ["values", "signature"]:
+            self.ColumnFeatures = features
+            f1_scores, durations = [], []
+            for dataset_name, dataset_path in DatasetFolders(align_benchmark_folder, selected):
+                db = RelationalDatabase()
+                db.LoadFromFolder(dataset_path, lazy=True)
+                name = f"{dataset_name} [{features}]"
+                self.ClusteringQualityStatistics(db, name)
+                f1_scores.append(self.ClusterQuality[name][7])
+                durations.append(self.ClusterDurations[name])
+            comparison[features] = {"f1": float(np.mean(f1_scores)), "duration": float(np.mean(durations))}
+        self.ColumnFeatures = original_features
+
+        for features, result in comparison.items():
+            print(f"{features:10} mean F1 {result['f1']:.3f}, mean alignment time {result['duration']:.2f}s")
+        return comparison
+
     def VisualizeDuration(self, max_datasets_visualized: int = 20, log_scale: bool = False):
         # Filter datasets and methods for visualization
         datasets = list(set([x[0] for x in self.Durations.keys()]))[:max_datasets_visualized]
@@ -150,50 +406,44 @@ class Benchmarker:
 
     def ClusteringQualityStatistics(self, database: RelationalDatabase, dataset_name: str):
         if not database.IntegrationIDsAssigned:
+            database.Instrumentation.Reset()
+            database.Instrumentation.TraceMemory = self.TraceMemory
+            database.ColumnFeatures = self.ColumnFeatures
+            profiler = None
+            if self.Profile:
+                profiler = StageProfiler(os.path.join('TestData', dataset_name))
+                database.Instrumentation.AddHook(profiler)
             start = time.time()
             database.AssignIntegrationIDs()
             end = time.time()
+            if profiler:
+                database.Instrumentation.RemoveHook(profiler)
+                profiler.SaveCombined()
+                self.HotFunctions[(dataset_name, "Alignment")] = profiler.HotFunctions()
+                print(profiler.Summary())
             self.ClusterDurations[dataset_name] = end - start
+            self.ClusterDurationSamples.setdefault(dataset_name, []).append(end - start)
+            self.StageStatistics[(dataset_name, "Alignment")] = [record.AsDict() for record in database.Instrumentation.Records]
         self.SilhouetteScores[dataset_name] = database.SilhouetteScores
         
         # in this case, a "Negative" is a relation between a column from one table and a column from
         # another table that does not exist. A "Positive" is a relation between two such columns that
         # does exist. In this benchmark, it can be assumed that columns with the same name have a Positive
         # relation, while those with different names have a Negative relation
-        true_negatives = 0
-        false_negatives = 0
-        true_positives = 0
-        false_positives = 0
-        
-        unique_columns = set()
-        table_count = len(database.Tables)
-
-        # take each pair of tables (including a table and itself), and take each pair of columns from 
-        # these tables to compare their names and assigned integration IDs
-        for i in range(table_count):
-            for j in range(i, table_count):
-                table = database.Tables[i]
-                other_table = database.Tables[j]
-                for columnID, columnName in table.ColumnNames.items():
-                    for other_columnID, other_columnName in other_table.ColumnNames.items():
-                        unique_columns.add(columnName)
-                        unique_columns.add(other_columnName)
-                        if columnName == other_columnName:
-                            # this is a positive relation
-                            if columnID == other_columnID:
-                                # is positive, flagged as positive
-                                true_positives += 1
-                            else:
-                                # is positive, flagged as negative
-                                false_negatives += 1
-                        else:
-                            # this is a negative relation
-                            if columnID == other_columnID:
-                                # is negative, flagged as positive
-                                false_positives += 1
-                            else:
-                                # is negative, flagged as negative
-                                true_negatives += 1
+        table_indices, column_names, integration_ids = [], [], []
+        for table_index, table in enumerate(database.Tables):
+            for columnID, columnName in table.ColumnNames.items():
+                table_indices.append(table_index)
+                column_names.append(columnName)
+                integration_ids.append(columnID)
+        true_positives, false_positives, true_negatives, false_negatives = PairConfusionCounts(table_indices, column_names, integration_ids)
+        unique_columns = set(column_names)
+
+        # agreement between the integration IDs and the column names as clusterings of all columns
+        self.ClusterAgreement[dataset_name] = {
+            "adjusted_rand_index": adjusted_rand_score(column_names, integration_ids),
+            "normalized_mutual_info": normalized_mutual_info_score(column_names, integration_ids),
+        }
 
         precision = (true_positives) / (true_positives + false_positives)
         recall = (true_positives) / (true_positives + false_negatives)
@@ -209,6 +459,8 @@ class Benchmarker:
         print(f"Recall: {recall}")
         print(f"Accuracy: {accuracy}")
         print(f"F1 score: {f1}")
+        print(f"Adjusted rand index: {self.ClusterAgreement[dataset_name]['adjusted_rand_index']}")
+        print(f"Normalized mutual information: {self.ClusterAgreement[dataset_name]['normalized_mutual_info']}")
 
         all_stats = [true_positives, false_positives, true_negatives, false_negatives, precision, recall, accuracy, f1]
         self.ClusterQuality[dataset_name] = all_stats
@@ -393,3 +645,23 @@ class Benchmarker:
         plt.title(f"Column Clustering for {dataset_name[:10]}...")
         plt.show()
 
+
+# Entry point of a worker process in Benchmarker.RunBenchmarksParallel: benchmarks one dataset and sends back
+# either ("ok", result dictionaries) or ("error", traceback)
+def BenchmarkDatasetInProcess(kind: str, dataset_name: str, dataset_path: str, output_policy: str, trace_memory: bool,
+                              profile: bool, column_features: str, estimate_output: bool, connection):
+    try:
+        benchmarker = Benchmarker(output_policy=output_policy, trace_memory=trace_memory, profile=profile,
+                                  column_features=column_features, estimate_output=estimate_output)
+        db = RelationalDatabase()
+        if kind == "align":
+            db.LoadFromFolder(dataset_path, lazy=True)
+            benchmarker.ClusteringQualityStatistics(db, dataset_name)
+        else:
+            db.LoadFromFolder(dataset_path)
+            benchmarker.Benchmark2(db, dataset_name, "ALITE")
+        connection.send(("ok", benchmarker.ResultDictionaries()))
+    except Exception:
+        connection.send(("error", traceback.format_exc()))
+    finally:
+        connection.close()
@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import argparse
+import numpy as np
+from scipy import stats
+from benchmark import Benchmarker, DatasetFolders
+from database import RelationalDatabase
+
+
+# Command-line entry point for the benchmarks, as an alternative to driving Benchmarker from test_suite.ipynb.
+#   python benchmark_cli.py run --stages integration --datasets chicago_parks --repetitions 5 --output results.json
+#   python benchmark_cli.py run --workers 4 --timeout 600 --output results.json
+#   python benchmark_cli.py compare baseline.json results.json
+
+
+def RunRepetitions(benchmarker: Benchmarker, args, repetitions: int):
+    if args.workers > 1:
+        align_folder = args.align_folder if "align" in args.stages else None
+        real_folder = args.real_folder if "integration" in args.stages else None
+        for _ in range(repetitions):
+            benchmarker.RunBenchmarksParallel(align_folder, real_folder, args.workers, args.timeout, args.datasets)
+        return
+
+    if "align" in args.stages:
+        for dataset_name, dataset_path in DatasetFolders(args.align_folder, args.datasets):
+            for _ in range(repetitions):
+                db = RelationalDatabase()
+                db.LoadFromFolder(dataset_path, lazy=True)
+                benchmarker.ClusteringQualityStatistics(db, dataset_name)
+
+    if "integration" in args.stages:
+        for dataset_name, dataset_path in DatasetFolders(args.real_folder, args.datasets):
+            snapshot = None
+            if args.fork_snapshot:
+                # load and align once, and run every repetition on a fork, which only times the integration stages
+                db = RelationalDatabase()
+                db.LoadFromFolder(dataset_path)
+                db.AssignIntegrationIDs()
+                snapshot = db.Snapshot()
+            for _ in range(repetitions):
+                # ALITE modifies the tables it runs on, so every repetition starts from a fresh load or fork
+                for method in args.methods:
+                    if snapshot:
+                        db = snapshot.Fork()
+                    else:
+                        db = RelationalDatabase()
+                        db.LoadFromFolder(dataset_path)
+                    benchmarker.Benchmark2(db, dataset_name, method)
+
+
+def Run(args):
+    if args.warmup:
+        print(f"Running {args.warmup} warmup repetition(s)")
+        RunRepetitions(Benchmarker(output_policy="none", column_features=args.column_features), args, args.warmup)
+
+    benchmarker = Benchmarker(output_policy=args.output_policy, trace_memory=args.trace_memory, profile=args.profile,
+                              column_features=args.column_features, estimate_output=args.estimate_output)
+    RunRepetitions(benchmarker, args, args.repetitions)
+    for output in args.output:
+        benchmarker.ExportResults(output)
+    for (stage, dataset_name), reason in benchmarker.FailedBenchmarks.items():
+        print(f"{stage} benchmark for {dataset_name} did not complete: {reason.strip().splitlines()[-1]}")
+    return 1 if benchmarker.FailedBenchmarks else 0
+
+
+# Durations of every benchmarked entry in a results file, keyed by (kind, dataset, method)
+def DurationSamples(results: dict):
+    samples = {}
+    for entry in results["integration"]:
+        samples[("integration", entry["dataset"], entry["method"])] = entry["durations"]
+    for entry in results["clustering"]:
+        samples[("clustering", entry["dataset"], "")] = entry["durations"]
+    return samples
+
+
+# Compare the durations of a run against a baseline. An entry is flagged as a slowdown when its mean is more
+# than threshold slower and, if both runs have repetitions, a one-sided Welch t-test is significant at alpha
+def CompareResults(baseline: dict, current: dict, alpha: float = 0.05, threshold: float = 0.05):
+    baseline_samples = DurationSamples(baseline)
+    current_samples = DurationSamples(current)
+    comparisons = []
+    for key in sorted(baseline_samples.keys() & current_samples.keys()):
+        base, cur = baseline_samples[key], current_samples[key]
+        if not base or not cur:
+            continue
+        ratio = np.mean(cur) / np.mean(base)
+        p_value = None
+        if len(base) > 1 and len(cur) > 1:
+            p_value = stats.ttest_ind(cur, base, equal_var=False, alternative='greater').pvalue
+        slower = ratio > 1 + threshold and (p_value is None or p_value < alpha)
+        comparisons.append({
+            "kind": key[0], "dataset": key[1], "method": key[2],
+            "baseline_mean": float(np.mean(base)), "current_mean": float(np.mean(cur)),
+            "ratio": float(ratio), "p_value": None if p_value is None else float(p_value),
+            "regression": bool(slower),
+        })
+    return comparisons
+
+
+def Compare(args):
+    with open(args.baseline, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    with open(args.current, 'r', encoding='utf-8') as file:
+        current = json.load(file)
+
+    comparisons = CompareResults(baseline, current, args.alpha, args.threshold)
+    for comparison in comparisons:
+        p_value = "n/a" if comparison["p_value"] is None else f"{comparison['p_value']:.4f}"
+        flag = "SLOWER" if comparison["regression"] else "ok"
+        name = f"{comparison['kind']}/{comparison['dataset']}" + (f"/{comparison['method']}" if comparison['method'] else "")
+        print(f"{flag:6} {name}: {comparison['baseline_mean']:.3f}s -> {comparison['current_mean']:.3f}s "
+              f"(x{comparison['ratio']:.2f}, p={p_value})")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(comparisons, file, indent=2)
+
+    regressions = sum(comparison["regression"] for comparison in comparisons)
+    print(f"{regressions} significant slowdown(s) in {len(comparisons)} compared benchmark(s)")
+    return 1 if regressions else 0
+
+
+def ParseArguments(argv):
+    parser = argparse.ArgumentParser(description="Run ALITE benchmarks and compare results against a baseline.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run benchmarks and write machine-readable results")
+    run_parser.add_argument("--align-folder", default=os.path.join('Benchmark', 'Selected Align Benchmark'))
+    run_parser.add_argument("--real-folder", default=os.path.join('Benchmark', 'Selected Real Benchmark'))
+    run_parser.add_argument("--stages", nargs="+", choices=["align", "integration"], default=["align", "integration"])
+    run_parser.add_argument("--datasets", nargs="*", help="dataset folder names to run (default: all)")
+    run_parser.add_argument("--repetitions", type=int, default=1)
+    run_parser.add_argument("--warmup", type=int, default=0, help="repetitions to run and discard first")
+    run_parser.add_argument("--workers", type=int, default=1, help="datasets to benchmark in parallel processes")
+    run_parser.add_argument("--timeout", type=float, help="seconds before a dataset is stopped (parallel runs only)")
+    run_parser.add_argument("--output-policy", choices=["none", "final", "all"], default="none")
+    run_parser.add_argument("--trace-memory", action="store_true")
+    run_parser.add_argument("--column-features", choices=["values", "signature"], default="values",
+                            help="column featurization for alignment (see column_signature.py)")
+    run_parser.add_argument("--methods", nargs="+", choices=["ALITE", "ALITE-SQLite"], default=["ALITE"],
+                            help="integration methods to benchmark (sequential runs only); ALITE-SQLite runs ALITE on the SQLite engine")
+    run_parser.add_argument("--fork-snapshot", action="store_true",
+                            help="load and align each dataset once and run every repetition on a fork of it (sequential runs only), "
+                                 "so durations leave out loading and alignment")
+    run_parser.add_argument("--estimate-output", action="store_true",
+                            help="record the sampled output estimate of every run, to calibrate RelationalDatabase.EstimateComplement")
+    run_parser.add_argument("--profile", action="store_true", help="write a cProfile of every stage to TestData/<dataset>")
+    run_parser.add_argument("--output", nargs="+", default=["benchmark_results.json"],
+                            help="result files, written as CSV if the name ends in .csv and as JSON otherwise")
+    run_parser.set_defaults(func=Run)
+
+    compare_parser = subparsers.add_parser("compare", help="compare a results file against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--alpha", type=float, default=0.05, help="significance level of the t-test")
+    compare_parser.add_argument("--threshold", type=float, default=0.05, help="minimum relative slowdown to flag")
+    compare_parser.add_argument("--output", help="write the comparison as JSON")
+    compare_parser.set_defaults(func=Compare)
+
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    arguments = ParseArguments(sys.argv[1:])
+    sys.exit(arguments.func(arguments))
@@ -0,0 +1,67 @@
+import time
+
+
+# Wall-clock and work limit for the complement phase of an ALITE run. Complement charges every tuple pair it
+# compares, and stops starting new work once a limit is reached, keeping the tuples it has not processed yet
+# as they are. The run then subsumes what it has, so the result is a best-effort full disjunction: every tuple
+# in it is a correct combination of input tuples, but some combinations may be missing. The completeness
+# statistics tell how far the complement phase got
+class ExecutionBudget:
+    def __init__(self, time_limit: float = None, comparison_limit: int = None):
+        self.TimeLimit = time_limit     # in seconds
+        self.ComparisonLimit = comparison_limit
+        self.StartTime: float = None
+        self.Comparisons: int = 0
+        # complement iterations that ran to the end
+        self.IterationsCompleted: int = 0
+        # tuple pairs that interrupted iterations did not compare, and tuples they kept without complementing them
+        self.PairsUnexamined: int = 0
+        self.TuplesUnprocessed: int = 0
+
+    def Start(self):
+        self.StartTime = time.perf_counter()
+        self.Comparisons = 0
+        self.IterationsCompleted = 0
+        self.PairsUnexamined = 0
+        self.TuplesUnprocessed = 0
+
+    def Elapsed(self):
+        return time.perf_counter() - self.StartTime if self.StartTime is not None else 0.0
+
+    def Charge(self, comparisons: int):
+        self.Comparisons += comparisons
+
+    def Exhausted(self):
+        if self.TimeLimit is not None and self.Elapsed() >= self.TimeLimit:
+            return True
+        return self.ComparisonLimit is not None and self.Comparisons >= self.ComparisonLimit
+
+    def IterationFinished(self):
+        self.IterationsCompleted += 1
+
+    # Record an iteration that was stopped before (or while) going through its tuples. Stopping between
+    # iterations before the fixpoint is reached counts as stopping the next iteration before its first tuple
+    def Interrupted(self, tuples_unprocessed: int, pairs_unexamined: int):
+        self.TuplesUnprocessed += tuples_unprocessed
+        self.PairsUnexamined += pairs_unexamined
+
+    def ReportProgress(self, iteration: int, tuple_count: int):
+        limits = []
+        if self.TimeLimit is not None:
+            limits.append(f"{self.Elapsed():.1f}s of {self.TimeLimit}s")
+        if self.ComparisonLimit is not None:
+            limits.append(f"{self.Comparisons} of {self.ComparisonLimit} comparisons")
+        print(f"Complement iteration {iteration}: {tuple_count} tuples, {', '.join(limits) or f'{self.Comparisons} comparisons'}")
+
+    def Complete(self):
+        return not self.TuplesUnprocessed
+
+    def Completeness(self):
+        return {
+            "Complete": self.Complete(),
+            "IterationsCompleted": self.IterationsCompleted,
+            "Comparisons": self.Comparisons,
+            "PairsUnexamined": self.PairsUnexamined,
+            "TuplesUnprocessed": self.TuplesUnprocessed,
+            "ElapsedTime": self.Elapsed(),
+        }
@@ -0,0 +1,88 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+from table import RelationalTable
+
+
+# Stage checkpoints for resuming an ALITE run. Every checkpoint records a fingerprint of its inputs: the
+# first stage is keyed on the input tables, and each later stage is keyed on the checkpoint of the stage
+# before it, so rerunning an earlier stage invalidates every checkpoint that was built on top of it
+class CheckpointStore:
+    def __init__(self, checkpoint_folder: str, input_fingerprint: str, stages: list[str]):
+        self.CheckpointFolder = checkpoint_folder
+        self.InputFingerprint = input_fingerprint
+        self.Stages = stages
+        # checkpoint ID of the most recent stage that was saved or resumed from
+        self.LastCheckpointID: str = None
+
+        if not os.path.exists(checkpoint_folder):
+            os.makedirs(checkpoint_folder)
+
+    def StageFolder(self, stage_index: int):
+        return os.path.join(self.CheckpointFolder, self.Stages[stage_index])
+
+    # Fingerprint of what a stage was computed from, including any parameters that change its result
+    def StageInput(self, stage_index: int, previous_id: str, parameters: dict = None):
+        digest = hashlib.sha256()
+        digest.update(self.Stages[stage_index].encode())
+        digest.update((previous_id or self.InputFingerprint).encode())
+        digest.update(json.dumps(parameters or {}, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def ReadMetadata(self, stage_index: int):
+        metadata_file = os.path.join(self.StageFolder(stage_index), "checkpoint.json")
+        if not os.path.exists(metadata_file):
+            return None
+        with open(metadata_file, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    # Number of leading stages with a valid checkpoint, i.e. how many stages can be skipped
+    def CompletedStages(self, stage_parameters: dict[int, dict] = None):
+        stage_parameters = stage_parameters or {}
+        previous_id = None
+        completed = 0
+        for stage_index in range(len(self.Stages)):
+            metadata = self.ReadMetadata(stage_index)
+            expected_input = self.StageInput(stage_index, previous_id, stage_parameters.get(stage_index))
+            if metadata is None or metadata["Input"] != expected_input:
+                break
+            previous_id = metadata["CheckpointID"]
+            completed += 1
+        return completed
+
+    def SaveStage(self, stage_index: int, tables: list[RelationalTable], state: dict = None, parameters: dict = None):
+        stage_folder = self.StageFolder(stage_index)
+        # remove the old checkpoint first, so a crash while writing never leaves a checkpoint that looks valid
+        if os.path.exists(stage_folder):
+            shutil.rmtree(stage_folder)
+        os.makedirs(stage_folder)
+
+        for idx, table in enumerate(tables):
+            table.SaveSnapshot(os.path.join(stage_folder, f"table_{idx}"))
+
+        metadata = {
+            "Stage": self.Stages[stage_index],
+            "Input": self.StageInput(stage_index, self.LastCheckpointID if stage_index else None, parameters),
+            "CheckpointID": uuid.uuid4().hex,
+            "TableCount": len(tables),
+            "State": state or {},
+        }
+        # the metadata file is written last and marks the checkpoint as complete
+        with open(os.path.join(stage_folder, "checkpoint.json"), 'w', encoding='utf-8') as file:
+            json.dump(metadata, file)
+        self.LastCheckpointID = metadata["CheckpointID"]
+        print(f"Checkpoint saved for stage '{self.Stages[stage_index]}'")
+
+    def LoadStage(self, stage_index: int):
+        metadata = self.ReadMetadata(stage_index)
+        stage_folder = self.StageFolder(stage_index)
+        tables = []
+        for idx in range(metadata["TableCount"]):
+            table = RelationalTable()
+            table.LoadFromSnapshot(os.path.join(stage_folder, f"table_{idx}"))
+            tables.append(table)
+        self.LastCheckpointID = metadata["CheckpointID"]
+        print(f"Loaded checkpoint for stage '{self.Stages[stage_index]}'")
+        return tables, metadata["State"]
@@ -37,7 +37,8 @@ class ColumnClustering:
     def __init__(self, min_clusters: int):
         self.min_clusters_ = min_clusters
         self.labels: dict[int, list[int]] = {}
-    def fit(self, column_embeddings: list[np.ndarray], from_table: list[int]):
+    # column_embeddings may be a list of vectors or a matrix with one row per column (rows are used as views)
+    def fit(self, column_embeddings: np.ndarray | list[np.ndarray], from_table: list[int]):
         cluster_tuples = zip(column_embeddings, from_table, range(len(column_embeddings)))
         clusters = [ColumnCluster(embedding, table, idx) for embedding, table, idx in cluster_tuples]
 
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+from minhash import MinHash
+
+# Cheap column signature for alignment, as an alternative to embedding up to 100 values per column: the
+# embedding of the header name, followed by statistics of the values and 1-bit MinHash features. Every part is
+# scaled to at most unit length and then weighted, so the Euclidean distances used by ColumnClustering mix the
+# three. The 1-bit MinHash features are +-1 per hash function, so the squared distance between two columns
+# grows linearly with the Jaccard distance of their value sets
+HEADER_WEIGHT = 1.0
+STATISTICS_WEIGHT = 0.5
+MINHASH_WEIGHT = 0.5
+MINHASH_BITS = 64
+
+# upper edges of the string length and log10 magnitude histogram bins
+LENGTH_BINS = [0, 2, 5, 9, 17, 33, np.inf]
+MAGNITUDE_BINS = [0, 1, 2, 3, 4, 6, np.inf]
+STATISTICS_COUNT = 10 + (len(LENGTH_BINS) - 1) + (len(MAGNITUDE_BINS) - 1)
+
+
+def SignatureDimension(header_dimension: int):
+    return header_dimension + STATISTICS_COUNT + MINHASH_BITS
+
+
+# Statistics of a column, all between 0 and 1: the pandas dtype as one-hot (numeric, boolean, datetime, other),
+# null, distinct, numeric, negative, alphabetic and digit ratios, and histograms of the string lengths and of
+# the magnitudes of numeric values
+def ColumnStatistics(column: pd.Series):
+    values = column.dropna()
+    statistics = [
+        pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column),
+        pd.api.types.is_bool_dtype(column),
+        pd.api.types.is_datetime64_any_dtype(column),
+        pd.api.types.is_object_dtype(column) or pd.api.types.is_string_dtype(column),
+    ]
+    if len(values) == 0:
+        return np.array(statistics + [1.0] + [0.0] * (STATISTICS_COUNT - 5), dtype=np.float32)
+
+    strings = values.astype(str)
+    lengths = strings.str.len()
+    numeric = pd.to_numeric(values, errors='coerce').dropna()
+    character_count = max(1, lengths.sum())
+    statistics += [
+        1 - len(values) / len(column),
+        values.nunique() / len(values),
+        len(numeric) / len(values),
+        (numeric < 0).mean() if len(numeric) else 0.0,
+        strings.str.count(r'[A-Za-z]').sum() / character_count,
+        strings.str.count(r'[0-9]').sum() / character_count,
+    ]
+    statistics += list(np.histogram(lengths, bins=LENGTH_BINS)[0] / len(values))
+    if len(numeric):
+        magnitudes = np.log10(np.abs(numeric.to_numpy(dtype=np.float64)) + 1)
+        statistics += list(np.histogram(magnitudes, bins=MAGNITUDE_BINS)[0] / len(numeric))
+    else:
+        statistics += [0.0] * (len(MAGNITUDE_BINS) - 1)
+    return np.array(statistics, dtype=np.float32)
+
+
+# The part of the signature that does not depend on the header: weighted statistics and MinHash features
+def ValueFeatures(column: pd.Series):
+    statistics = ColumnStatistics(column) / np.sqrt(STATISTICS_COUNT)
+    bits = (MinHash(column, num_perm=MINHASH_BITS) & np.uint64(1)).astype(np.float32) * 2 - 1
+    bits /= np.sqrt(MINHASH_BITS)
+    return np.concatenate([STATISTICS_WEIGHT * statistics, MINHASH_WEIGHT * bits])
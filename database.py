@@ -1,10 +1,36 @@
 import os
+import copy
+import json
+import hashlib
+import pandas as pd
 from table import RelationalTable
-from sentence_transformers import SentenceTransformer
+from checkpoint import CheckpointStore
+from output_writer import BackgroundWriter
+from instrumentation import Instrumentation
+from profiling import StageProfiler
+from planner import IntegrationPlanner, PlanStep
+from spill import SpillPartitioner
+from sql_engine import SQLiteEngine
+from incremental import IncrementalFullDisjunction
+from budget import ExecutionBudget
+from estimator import ComplementEstimator
+from embedding import LoadEmbeddingModel
+from pipeline import AlignmentPipeline
+from column_signature import SignatureDimension
+from minhash import DEFAULT_PERMUTATIONS, LSHIndex, EstimateContainment
 from column_clustering import ColumnClustering
 from sklearn.metrics import silhouette_score
 import numpy as np
 
+# Stages of ALITE, named after the output written at the end of each of them
+ALITE_STAGES = [
+    "0 - AlignedTables",
+    "1 - PostOuterJoinAndLabeledNulls",
+    "2 - PostComplement",
+    "3 - ReplacingLabeledNulls",
+    "4 - PostSubsumption",
+]
+
 class RelationalDatabase:
     def __init__(self):
         self.Tables: list[RelationalTable] = []
@@ -12,79 +38,258 @@ class RelationalDatabase:
         # for benchmarking purposes
         self.SilhouetteScores: dict[int, float] = {}
         self.ColumnClusterSizes: list[int] = None
+        # embeddings of all columns, one row per column, and the (table index, integration ID) of every row
+        self.EmbeddingMatrix: np.ndarray = None
+        self.EmbeddingColumns: list[tuple[int, int]] = []
+        # model name or local model directory, and backend (see embedding.py) used to embed the columns
+        self.EmbeddingModel: str = "all-MiniLM-L6-v2"
+        self.EmbeddingBackend: str = "torch"
+        # how columns are featurized for alignment: "values" embeds a sample of the values of each column,
+        # "signature" embeds only the header and adds value statistics (see column_signature.py)
+        self.ColumnFeatures: str = "values"
+        # estimated value containment of overlapping column pairs from different tables, keyed by
+        # ((table index, column index), (table index, column index)) (see ComputeColumnOverlaps)
+        self.ColumnOverlaps: dict[tuple[tuple[int, int], tuple[int, int]], float] = {}
+        # weight of the value overlap when choosing the number of column clusters, in addition to the silhouette
+        # score (0 disables it), and the containment above which two columns count as overlapping
+        self.OverlapWeight: float = 0.0
+        self.OverlapThreshold: float = 0.5
+        # per-stage timing, memory and tuple counts of alignment and ALITE runs
+        self.Instrumentation: Instrumentation = Instrumentation()
+        # writes the outputs of the most recent ALITE run in the background, if enabled
+        self.OutputWriter: BackgroundWriter = None
+        # profiles of the stages of the most recent ALITE run, if it was profiled
+        self.Profiler: StageProfiler = None
+        # budget of the most recent ALITE run, if it had one, and how complete its result is (see budget.py)
+        self.Budget: ExecutionBudget = None
+        self.Completeness: dict = None
+        # queue depths, stalls and stage busy times of the most recent pipelined alignment (see pipeline.py)
+        self.PipelineStatistics: dict = None
+
+    # Immutable copy of the database that can be forked for every run (see DatabaseSnapshot)
+    def Snapshot(self):
+        return DatabaseSnapshot(self)
 
-    # Load all CSV files within the folder into tables in this database
-    def LoadFromFolder(self, data_folder: str):
+    # Load all CSV files within the folder into tables in this database. With lazy loading, only a
+    # sample of each file is read up front and the full tables are read when the tuples are needed
+    # With sketch, MinHash sketches of the column values are computed while loading (see ComputeColumnOverlaps).
+    # The storage selects how the tables keep their data (see RelationalTable.Storage)
+    def LoadFromFolder(self, data_folder: str, lazy: bool = False, sketch: bool = False, storage: str = "object"):
+        for filepath in self.FolderFiles(data_folder):
+            print(f"Loading data from file {os.path.basename(filepath)} into relational table")
+            new_table = RelationalTable()
+            new_table.LoadFromCSV(filepath, lazy=lazy, sketch=sketch, storage=storage)
+            self.Tables.append(new_table)
+
+    # Paths of the files directly within the folder, in the order they are loaded
+    @staticmethod
+    def FolderFiles(data_folder: str):
         for root, dirs, files in os.walk(data_folder):
             if os.path.realpath(root) == os.path.realpath(data_folder):
-                for file in files:
-                    print(f"Loading data from file {file} into relational table")
-                    new_table = RelationalTable()
-                    filepath = os.path.join(root, file)
-                    new_table.LoadFromCSV(filepath)
-                    self.Tables.append(new_table)
+                return [os.path.join(root, file) for file in files]
+        return []
+
+    # Load the CSV files within the folder (after the tables already in the database) and assign integration IDs
+    # in one pipeline, so that reading the files and embedding their columns overlap (see pipeline.py). The
+    # queue depths, stalls and busy time of every stage end up in PipelineStatistics
+    def LoadAndAssignIntegrationIDs(self, data_folder: str, lazy: bool = False, sketch: bool = False,
+                                    storage: str = "object", queue_size: int = 4, embedding_file: str = None):
+        model = LoadEmbeddingModel(self.EmbeddingModel, self.EmbeddingBackend)
+        pipeline = AlignmentPipeline(model, self.ColumnFeatures, queue_size)
+        with self.Instrumentation.Stage("Pipelined loading and column embedding") as record:
+            self.Tables, column_embeddings = pipeline.Run(self.Tables + self.FolderFiles(data_folder), lazy, sketch, storage)
+            record.Count("tables", len(self.Tables))
+        self.PipelineStatistics = pipeline.Statistics()
+        print(f"Alignment pipeline: {self.PipelineStatistics}")
+        self.AssignIntegrationIDs(embedding_file, column_embeddings)
 
     def TupleCount(self):
         return sum(table.TupleCount() for table in self.Tables)
 
+    # Find the column pairs from different tables whose values overlap, without comparing all pairs: the MinHash
+    # sketches of all columns go into an LSH index and only candidate pairs have their containment estimated.
+    # A pair is kept if either column is contained in the other by at least threshold. Columns with fewer than
+    # min_distinct values (e.g. flags) overlap with each other trivially and are left out
+    def ComputeColumnOverlaps(self, threshold: float = 0.5, num_perm: int = DEFAULT_PERMUTATIONS, bands: int = 32,
+                              min_distinct: int = 5):
+        index = LSHIndex(num_perm, bands)
+        sketches = {}
+        for table_index, table in enumerate(self.Tables):
+            signatures, distinct_counts = table.ValueSketches(num_perm)
+            for column_index, (signature, distinct_count) in enumerate(zip(signatures, distinct_counts)):
+                if distinct_count >= min_distinct:
+                    sketches[(table_index, column_index)] = (signature, distinct_count)
+                    index.Insert((table_index, column_index), signature)
+
+        self.ColumnOverlaps = {}
+        for column, other_column in index.CandidatePairs():
+            if column[0] == other_column[0]:
+                continue
+            signature, size = sketches[column]
+            other_signature, other_size = sketches[other_column]
+            containment = max(EstimateContainment(signature, size, other_signature, other_size),
+                              EstimateContainment(other_signature, other_size, signature, size))
+            if containment >= threshold:
+                self.ColumnOverlaps[tuple(sorted((column, other_column)))] = containment
+        print(f"Found {len(self.ColumnOverlaps)} overlapping column pairs")
+        return self.ColumnOverlaps
+
+    # Highest column overlap between each pair of tables (i, j) with i < j that have overlapping columns
+    def TableOverlaps(self):
+        table_overlaps = {}
+        for ((table_index, _), (other_table_index, _)), containment in self.ColumnOverlaps.items():
+            pair = (table_index, other_table_index)
+            table_overlaps[pair] = max(table_overlaps.get(pair, 0.0), containment)
+        return table_overlaps
+
+    # Order of the tables in which each table overlaps as much as possible with one of the tables before it,
+    # starting from the table with the largest total overlap. Tables without overlaps keep their order at the end
+    def OverlapTableOrder(self):
+        table_overlaps = self.TableOverlaps()
+        neighbours: dict[int, dict[int, float]] = {}
+        for (table_index, other_table_index), containment in table_overlaps.items():
+            neighbours.setdefault(table_index, {})[other_table_index] = containment
+            neighbours.setdefault(other_table_index, {})[table_index] = containment
+
+        order = []
+        remaining = sorted(neighbours, key=lambda index: (-sum(neighbours[index].values()), index))
+        while remaining:
+            best, best_overlap = remaining[0], -1.0
+            for table_index in remaining:
+                overlap = max((neighbours[table_index].get(ordered, 0.0) for ordered in order), default=0.0)
+                if overlap > best_overlap:
+                    best, best_overlap = table_index, overlap
+            order.append(best)
+            remaining.remove(best)
+        order.extend(index for index in range(len(self.Tables)) if index not in neighbours)
+        return order
+
     # Assign integration IDs to the columns of each table in the database
-    def AssignIntegrationIDs(self):
-        # load a pretrained transformer
-        model = SentenceTransformer("all-MiniLM-L6-v2")
+    # The embeddings of all columns are kept in one contiguous float32 matrix (memory-mapped to embedding_file
+    # if one is given), which clustering and silhouette scoring read directly. The embedding file doubles as a
+    # cache: a later alignment of the same input tables with the same settings maps the embeddings from the file
+    # (see EmbeddingCacheKey) instead of computing them again
+    # With column embeddings (a block of rows per table, see LoadAndAssignIntegrationIDs), the tables already
+    # have their integration IDs and embeddings, and are only clustered
+    def AssignIntegrationIDs(self, embedding_file: str = None, column_embeddings: list[np.ndarray] = None):
+        # load a pretrained transformer (cached across calls)
+        model = LoadEmbeddingModel(self.EmbeddingModel, self.EmbeddingBackend)
 
         # minimum and maximum columns that could be in the full disjunction
         minimum_columns = 0
         maximum_columns = 0
 
-        # initialize the tables with unique integration IDs and column embeddings
+        # initialize the tables with unique integration IDs
         offset = 0
         all_integrationIDs = []
-        all_column_embeddings = {}
         from_table = []
+        self.EmbeddingColumns = []
         for idx, table in enumerate(self.Tables):
-            print(f"Initializing table {idx}")
-            offset = table.InitializeIntegrationIDs(offset)
-            table.InitializeColumnEmbeddings(model)
-            column_count = len(table.ColumnNames)
+            if column_embeddings is None:
+                offset = table.InitializeIntegrationIDs(offset)
+            column_count = len(table.IntegrationIDToColumnIndex)
 
             # minimum columns is the size of the largest single table
             if not minimum_columns or column_count > minimum_columns:
                 minimum_columns = column_count
             # maximum columns is the sum of the sizes of all tables
             maximum_columns += column_count
-            
-            #print(f"Table {idx} embeddings: {table.ColumnEmbeddings}")
 
-            all_column_embeddings.update(table.ColumnEmbeddings)
             all_integrationIDs.extend(table.IntegrationIDToColumnIndex.keys())
             from_table.extend([idx]*column_count)
-        all_embeddings = list(all_column_embeddings.values())
+            self.EmbeddingColumns.extend((idx, integrationID) for integrationID in table.IntegrationIDToColumnIndex)
+
+        # each table writes its column embeddings into its own block of rows of the shared matrix
+        feature_dimension = model.get_sentence_embedding_dimension()
+        if self.ColumnFeatures == "signature":
+            feature_dimension = SignatureDimension(feature_dimension)
+        matrix_shape = (maximum_columns, feature_dimension)
+        cached = False
+        if embedding_file:
+            cache_key = self.EmbeddingCacheKey(matrix_shape)
+            cached = column_embeddings is None and self.ReadEmbeddingCacheKey(embedding_file) == cache_key
+            if cached:
+                print(f"Using the cached column embeddings in {embedding_file}")
+            elif os.path.exists(embedding_file + ".json"):
+                # the old key must not outlive the embeddings it describes
+                os.remove(embedding_file + ".json")
+            self.EmbeddingMatrix = np.memmap(embedding_file, dtype=np.float32, mode='r' if cached else 'w+', shape=matrix_shape)
+        else:
+            self.EmbeddingMatrix = np.empty(matrix_shape, dtype=np.float32)
+        with self.Instrumentation.Stage("Column embedding") as record:
+            row = 0
+            for idx, table in enumerate(self.Tables):
+                column_count = len(table.IntegrationIDToColumnIndex)
+                if cached:
+                    table.GetColumnNames()
+                    table.ColumnEmbeddings.update(zip(table.IntegrationIDToColumnIndex, self.EmbeddingMatrix[row:row + column_count]))
+                    row += column_count
+                    continue
+                if column_embeddings is not None:
+                    # the number of columns is only known once the pipeline has loaded every table, so the blocks
+                    # are copied into the matrix afterwards and the tables are pointed at their rows
+                    self.EmbeddingMatrix[row:row + column_count] = column_embeddings[idx]
+                    table.ColumnEmbeddings.update(zip(table.IntegrationIDToColumnIndex, self.EmbeddingMatrix[row:row + column_count]))
+                    row += column_count
+                    continue
+                print(f"Initializing table {idx}")
+                if self.ColumnFeatures == "signature":
+                    table.InitializeColumnSignatures(model, out=self.EmbeddingMatrix[row:row + column_count])
+                else:
+                    table.InitializeColumnEmbeddings(model, out=self.EmbeddingMatrix[row:row + column_count])
+                row += column_count
+            record.Count("columns", maximum_columns)
+        if embedding_file and not cached:
+            self.EmbeddingMatrix.flush()
+            with open(embedding_file + ".json", 'w', encoding='utf-8') as file:
+                json.dump(cache_key, file)
+        all_embeddings = self.EmbeddingMatrix
+
+        # column pairs with overlapping values, as rows of the embedding matrix, if the overlap is used as a signal
+        overlapping_rows = None
+        if self.OverlapWeight:
+            with self.Instrumentation.Stage("Column overlaps") as record:
+                self.ComputeColumnOverlaps(self.OverlapThreshold)
+                matrix_row = {}
+                for row, (idx, integrationID) in enumerate(self.EmbeddingColumns):
+                    matrix_row[(idx, self.Tables[idx].IntegrationIDToColumnIndex[integrationID])] = row
+                overlapping_rows = np.array([[matrix_row[column], matrix_row[other_column]]
+                                             for column, other_column in self.ColumnOverlaps], dtype=np.int64).reshape(-1, 2)
+                record.Count("pairs", len(overlapping_rows))
 
         print(f"Total embeddings: {len(all_embeddings)}")
         print(f"Minimum columns: {minimum_columns}\tMaximum columns: {maximum_columns}")
 
         # compute all possible clusterings here, choose from them below
         print("Clustering column embeddings")
-        column_clustering = ColumnClustering(min_clusters=minimum_columns)
-        column_clustering.fit(all_embeddings, from_table)
+        with self.Instrumentation.Stage("Column clustering"):
+            column_clustering = ColumnClustering(min_clusters=minimum_columns)
+            column_clustering.fit(all_embeddings, from_table)
         best_clustering = None
         best_score = -1
 
         # try all possible cluster sizes, select the size that maximizes silhouette score
-        for n_clusters in range(minimum_columns, maximum_columns):
-            
-            if n_clusters not in column_clustering.labels:
-                print(f"Skipping {n_clusters} clusters")
-                continue
-            cluster_labels = column_clustering.labels[n_clusters]
+        with self.Instrumentation.Stage("Silhouette search"):
+            for n_clusters in range(minimum_columns, maximum_columns):
+                
+                if n_clusters not in column_clustering.labels:
+                    print(f"Skipping {n_clusters} clusters")
+                    continue
+                cluster_labels = column_clustering.labels[n_clusters]
+
+                silhouette = silhouette_score(all_embeddings, cluster_labels)
+                self.SilhouetteScores[n_clusters] = silhouette
+                print(f"Silhouette score for {n_clusters} clusters: {silhouette}")
 
-            silhouette = silhouette_score(all_embeddings, cluster_labels)
-            self.SilhouetteScores[n_clusters] = silhouette
-            print(f"Silhouette score for {n_clusters} clusters: {silhouette}")
+                # favour clusterings that put columns with overlapping values together
+                score = silhouette
+                if overlapping_rows is not None and len(overlapping_rows):
+                    labels = np.asarray(cluster_labels)
+                    score += self.OverlapWeight * np.mean(labels[overlapping_rows[:, 0]] == labels[overlapping_rows[:, 1]])
 
-            if best_score < silhouette:
-                best_score = silhouette
-                best_clustering = cluster_labels
+                if best_score < score:
+                    best_score = score
+                    best_clustering = cluster_labels
 
         print(f"Best clustering achieved using {len(set(best_clustering))} clusters")
         self.ColumnClusterSizes = [minimum_columns, maximum_columns, len(set(best_clustering))]
@@ -95,52 +300,470 @@ class RelationalDatabase:
         # now reassign the table column names to be which cluster that column is in (the cluster is the new integration ID)
         for idx, table in enumerate(self.Tables):
             table.RenameColumns(column_clusters)
-            print(f"Table {idx} ({table.TableName}) final integration IDs: {table.DataFrame.columns}")
+            print(f"Table {idx} ({table.TableName}) final integration IDs: {table.AlignmentFrame().columns}")
             print(f"Integration ID Mapping: {table.ColumnNames}")
             
         self.IntegrationIDsAssigned = True
         print("Integration IDs assigned to all tables.")
 
-    # Run the ALITE algorithm on the database
-    def RunALITE(self, output_folder: str):
+    # Key of the column embeddings of the input tables with the current alignment settings, stored next to an
+    # embedding file to tell whether its embeddings can be reused. The values of a column are sampled at random,
+    # so reused embeddings are those of an earlier sample
+    def EmbeddingCacheKey(self, matrix_shape: tuple[int, int]):
+        return {"Fingerprint": self.InputFingerprint(), "EmbeddingModel": self.EmbeddingModel,
+                "EmbeddingBackend": self.EmbeddingBackend, "ColumnFeatures": self.ColumnFeatures, "Shape": list(matrix_shape)}
+
+    @staticmethod
+    def ReadEmbeddingCacheKey(embedding_file: str):
+        if not os.path.exists(embedding_file) or not os.path.exists(embedding_file + ".json"):
+            return None
+        with open(embedding_file + ".json", 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    # Fingerprint of the input tables, used to decide whether stage checkpoints are still valid
+    def InputFingerprint(self):
+        digest = hashlib.sha256()
+        for table in self.Tables:
+            digest.update(str(table.TableName).encode())
+            digest.update(str(table.AlignmentFrame().columns.to_list()).encode())
+            digest.update(table.Storage.encode())
+            if table.SourceFile and os.path.exists(table.SourceFile):
+                file_stats = os.stat(table.SourceFile)
+                digest.update(f"{table.SourceFile}:{file_stats.st_size}:{file_stats.st_mtime_ns}".encode())
+            else:
+                digest.update(pd.util.hash_pandas_object(table.DataFrame, index=False).values.tobytes())
+        return digest.hexdigest()
+
+    # Database attributes produced by column alignment that are kept alongside the aligned tables checkpoint
+    def AlignmentState(self):
+        return {
+            "SilhouetteScores": [[n_clusters, score] for n_clusters, score in self.SilhouetteScores.items()],
+            "ColumnClusterSizes": self.ColumnClusterSizes,
+        }
+
+    # Settings that change the result of column alignment, part of the input of the aligned tables checkpoint
+    def AlignmentParameters(self):
+        return {
+            "EmbeddingModel": self.EmbeddingModel,
+            "EmbeddingBackend": self.EmbeddingBackend,
+            "ColumnFeatures": self.ColumnFeatures,
+            "OverlapWeight": self.OverlapWeight,
+            "OverlapThreshold": self.OverlapThreshold,
+        }
+
+    def RestoreAlignmentState(self, state: dict):
+        self.SilhouetteScores = {n_clusters: score for n_clusters, score in state["SilhouetteScores"]}
+        self.ColumnClusterSizes = state["ColumnClusterSizes"]
+
+    # Load the latest valid checkpoint, returning how many stages it covers and the full disjunction (if any)
+    def ResumeFromCheckpoint(self, checkpoints: CheckpointStore, stage_parameters: dict[int, dict] = None):
+        completed_stages = checkpoints.CompletedStages(stage_parameters)
+        if not completed_stages:
+            return 0, None
+
+        print(f"Resuming ALITE after stage '{ALITE_STAGES[completed_stages - 1]}'")
+        # the alignment state is needed for benchmarking no matter which stage is resumed from
+        tables, state = checkpoints.LoadStage(0)
+        self.RestoreAlignmentState(state)
+        if completed_stages == 1:
+            self.Tables = tables
+            self.IntegrationIDsAssigned = True
+            return 1, None
+        tables, _ = checkpoints.LoadStage(completed_stages - 1)
+        return completed_stages, tables[0]
+
+    # Write the full disjunction as it is after one stage of ALITE, either as CSV and text or as a binary snapshot
+    def SaveStageOutput(self, table: RelationalTable, output_folder: str, stage_name: str, output_format: str):
+        if output_format == "snapshot":
+            table.SaveSnapshot(os.path.join(output_folder, stage_name))
+        else:
+            table.saveToFile(os.path.join(output_folder, stage_name))
+
+    # Run a write task on the background writer if there is one, otherwise right away
+    def Write(self, write_func, *args):
+        if self.OutputWriter:
+            self.OutputWriter.Submit(write_func, *args)
+        else:
+            write_func(*args)
+
+    # Block until all outputs of the last ALITE run have been written, re-raising the first write error
+    def WaitForOutput(self):
+        if self.OutputWriter:
+            output_writer, self.OutputWriter = self.OutputWriter, None
+            output_writer.Wait()
 
-        # Step 1: Assign integration IDs
+    # Record the result of an ALITE stage as output (depending on the output policy) and, when resuming is
+    # enabled, as a checkpoint. With a background writer, a copy is written so the next stage can go ahead
+    def FinishStage(self, table: RelationalTable, output_folder: str, stage_index: int, output_format: str,
+                    output_policy: str, checkpoints: CheckpointStore, parameters: dict = None):
+        is_final_stage = stage_index == len(ALITE_STAGES) - 1
+        write_output = output_policy == "all" or (output_policy == "final" and is_final_stage)
+        if not write_output and not checkpoints:
+            return
+
+        snapshot = table.Copy() if self.OutputWriter else table
+        if write_output:
+            self.Write(self.SaveStageOutput, snapshot, output_folder, ALITE_STAGES[stage_index], output_format)
+        if checkpoints:
+            self.Write(checkpoints.SaveStage, stage_index, [snapshot], None, parameters)
+
+    # Complement the tuples of an outer union. With prune_dangling, tuples that cannot complement with any other
+    # tuple are set aside first and added back to the result (see RelationalTable.SplitDanglingTuples)
+    def ComplementTable(self, table: RelationalTable, prune_dangling: bool = True, budget: ExecutionBudget = None):
+        dangling = None
+        if prune_dangling:
+            with self.Instrumentation.Stage("Dangling tuple pruning") as record:
+                joinable, dangling = table.SplitDanglingTuples()
+                table.DataFrame = joinable
+                record.Count("joinable", len(joinable))
+                record.Count("dangling", len(dangling))
+            print(f"Pruned {len(dangling)} dangling tuples, complementing {len(joinable)} tuples")
+        if table.TupleCount():
+            table.Complement(self.Instrumentation, budget)
+        if dangling is not None and len(dangling):
+            table.DataFrame = pd.concat([table.DataFrame, dangling], ignore_index=True).drop_duplicates(ignore_index=True)
+
+    # Plan of the full disjunction of the aligned tables as a sequence of pairwise integrations, and its explanation
+    def PlanIntegration(self):
+        planner = IntegrationPlanner(self.Tables)
+        plan = planner.Plan()
+        return plan, planner.Explain(plan)
+
+    # Predict the output size and runtime of ALITE on the aligned tables from a sample of each table (see
+    # estimator.py), without running it. The prediction is calibrated on the tuple counts and durations of
+    # previous runs of the method, e.g. Benchmarker.TupleCounts, Durations and OutputEstimates
+    def EstimateComplement(self, tuple_counts: dict[tuple[str, str], tuple[int, int]] = None,
+                           durations: dict[tuple[str, str], float] = None,
+                           output_estimates: dict[tuple[str, str], float] = None,
+                           sample_size: int = 200, method: str = "ALITE"):
         if not self.IntegrationIDsAssigned:
-            self.AssignIntegrationIDs()
+            with self.Instrumentation.Stage("Column alignment"):
+                self.AssignIntegrationIDs()
+        estimator = ComplementEstimator(sample_size)
+        if tuple_counts and durations:
+            estimator.Calibrate(tuple_counts, durations, output_estimates, method)
+        with self.Instrumentation.Stage("Complement estimation"):
+            estimate = estimator.Estimate(self.Tables)
+        print(estimate.Explain())
+        return estimate
 
-        # Step 2: Create a new table for the full disjunction
-        fullDisjunction = RelationalTable()
+    # Compute the full disjunction step by step along a plan from PlanIntegration. Every step complements the result
+    # so far and the tuples of the step's tables with the tuples of all tables integrated so far, so a tuple
+    # subsumed in an earlier step is still combined through the original tuples it was made from, and tables
+    # without shared columns are combined as well. Between steps the result is subsumed to keep it small; labeled
+    # nulls are only removed in the last step. Every step records its actual and estimated output
+    def RunIntegrationPlan(self, plan: list[PlanStep], prune_dangling: bool = True, budget: ExecutionBudget = None):
+        result = RelationalTable()
+        integrated: list[RelationalTable] = []
+        for step_number, step in enumerate(plan, start=1):
+            with self.Instrumentation.Stage(f"Integration step {step_number}") as record:
+                step_tables = [self.Tables[table_index] for table_index in step.TableIndices]
+                integrated = step_tables + integrated
+                # the rows are the result so far, the tuples of the step's tables and those of earlier steps
+                step_table = RelationalTable()
+                step_table.OuterUnionWith(result)
+                for table in integrated:
+                    table.GenerateLabeledNulls()
+                    step_table.OuterUnionWith(table)
+                frame = step_table.DataFrame
+                result_tuples = result.TupleCount()
+                input_tuples = result_tuples + sum(table.TupleCount() for table in step_tables)
+                joinable = step_table.JoinableMask() if prune_dangling else np.ones(len(frame), dtype=bool)
+                # dangling tuples cannot complement with any other tuple, so they are kept as they are
+                is_input = np.arange(len(frame)) < input_tuples
+                dangling = frame[is_input & ~joinable]
+                partners = frame[(np.arange(len(frame)) >= result_tuples) & joinable].reset_index(drop=True)
+                step_table.DataFrame = frame[is_input & joinable].reset_index(drop=True)
+                record.Count("input", input_tuples)
+                record.Count("dangling", len(dangling))
+                if step_table.TupleCount():
+                    step_table.Complement(self.Instrumentation, budget, partners)
+                if len(dangling):
+                    step_table.DataFrame = pd.concat([step_table.DataFrame, dangling], ignore_index=True).drop_duplicates(ignore_index=True)
+                if step_number == len(plan):
+                    step_table.ReplaceLabeledNulls()
+                step_table.SubsumeTuples()
+                record.Count("output", step_table.TupleCount())
+                record.Count("estimated", round(step.EstimatedTuples))
+            result = step_table
+        return result
 
-        print("Outer Union Start")
-        
-        # Step 3: Generate labeled nulls for each table and perform outer union
-        for table in self.Tables:
-            table.GenerateLabeledNulls()
-            fullDisjunction.OuterUnionWith(table)
-        
-        fullDisjunction.saveToFile(os.path.join(output_folder, "1 - PostOuterJoinAndLabeledNulls"))
+    # Incremental maintenance of the full disjunction of an earlier ALITE run in the output folder, which must have
+    # been run with resume=True so that its checkpoints hold the aligned tables, the outer union and the result.
+    # Appended or deleted tuples of a table (see IncrementalFullDisjunction.Update) are given with the table's
+    # original column names. The checkpoints are only read
+    def IncrementalFullDisjunction(self, output_folder: str):
+        checkpoints = CheckpointStore(os.path.join(output_folder, "Checkpoints"), self.InputFingerprint(), ALITE_STAGES)
+        for stage_index in [0, 1, len(ALITE_STAGES) - 1]:
+            if checkpoints.ReadMetadata(stage_index) is None:
+                raise ValueError(f"No checkpoint for stage '{ALITE_STAGES[stage_index]}' in {output_folder}, "
+                                 f"run ALITE with resume=True first")
+        with self.Instrumentation.Stage("Incremental index build") as record:
+            aligned_tables, _ = checkpoints.LoadStage(0)
+            column_maps = [{original: aligned for aligned, original in table.ColumnNames.items()} for table in aligned_tables]
+            outer_union = checkpoints.LoadStage(1)[0][0]
+            full_disjunction = checkpoints.LoadStage(len(ALITE_STAGES) - 1)[0][0]
+            incremental = IncrementalFullDisjunction(outer_union, full_disjunction, column_maps)
+            record.Count("output", len(incremental.Result))
+        return incremental
+
+    # Run the ALITE algorithm on the database. With resume, every stage is checkpointed under the output
+    # folder and a rerun on the same inputs continues after the last stage that has a valid checkpoint.
+    # The output policy selects which stages are written ("none", "final" or "all"), and with background
+    # output the writing happens on a separate thread; call WaitForOutput to wait for it to finish.
+    # With table_order "overlap", the outer union visits the tables in OverlapTableOrder instead of input order.
+    # With prune_dangling, tuples that cannot complement with any other tuple skip the complement phase.
+    # With strategy "pairwise", the tables are integrated along the plan of PlanIntegration instead of all at
+    # once (see RunIntegrationPlan), which gives the same full disjunction, and only the final result is written.
+    # The pairwise strategy runs on the pandas engine and does not spill.
+    # With a memory budget, complementation and subsumption spill hash partitions of the tuples to the spill
+    # folder (by default "Spill" in the output folder) and process one partition at a time (see spill.py), and
+    # the stage outputs are written without background output. The budget bounds the working set of these two
+    # stages only; the outer union and the merged result of each stage are still held in memory.
+    # With engine "sqlite", the outer union, complementation and subsumption run as SQL on a SQLite database in
+    # the output folder (see sql_engine.py) instead, which ignores prune_dangling and cannot be combined with a memory budget.
+    # With a time budget (in seconds, counted from the start of the run) or a comparison budget (tuple pairs
+    # compared by complementation), complementation stops once the budget is used up and the run goes on to
+    # subsume what it has. Completeness then tells how far complementation got, and the stages after the outer
+    # union are not checkpointed unless the result is complete
+    def RunALITE(self, output_folder: str, output_format: str = "csv", resume: bool = False,
+                 output_policy: str = "all", background_output: bool = True, profile: bool = False,
+                 table_order: str = "input", prune_dangling: bool = True, strategy: str = "single",
+                 memory_budget: int = None, spill_folder: str = None, engine: str = "pandas",
+                 time_budget: float = None, comparison_budget: int = None):
+        if engine not in ["pandas", "sqlite"]:
+            raise ValueError(f"Unknown engine {engine}, expected pandas or sqlite")
+        if engine == "sqlite" and memory_budget:
+            raise ValueError("The sqlite engine does not support a memory budget")
+        if strategy not in ["single", "pairwise"]:
+            raise ValueError(f"Unknown strategy {strategy}, expected single or pairwise")
+        if strategy == "pairwise" and (engine == "sqlite" or memory_budget):
+            raise ValueError("The pairwise strategy runs on the pandas engine without a memory budget")
+        if output_policy not in ["none", "final", "all"]:
+            raise ValueError(f"Unknown output policy {output_policy}, expected none, final or all")
+
+        # never let two runs write (or read checkpoints) at the same time
+        self.WaitForOutput()
+
+        self.Budget = None
+        self.Completeness = None
+        if time_budget is not None or comparison_budget is not None:
+            self.Budget = ExecutionBudget(time_budget, comparison_budget)
+            self.Budget.Start()
+
+        # with profiling, a cProfile of every stage is written to the output folder
+        self.Instrumentation.RemoveHook(self.Profiler)
+        self.Profiler = None
+        if profile:
+            self.Profiler = StageProfiler(output_folder)
+            self.Instrumentation.AddHook(self.Profiler)
+
+        checkpoints = None
+        completed_stages = 0
+        fullDisjunction = None
+        if resume:
+            checkpoints = CheckpointStore(os.path.join(output_folder, "Checkpoints"), self.InputFingerprint(), ALITE_STAGES)
+            with self.Instrumentation.Stage("Checkpoint loading"):
+                stage_parameters = {0: self.AlignmentParameters(), 1: {"TableOrder": table_order, "Strategy": strategy}}
+                completed_stages, fullDisjunction = self.ResumeFromCheckpoint(checkpoints, stage_parameters)
+
+        # the background writer needs a copy of every stage output, which a memory budget cannot afford
+        if background_output and not memory_budget:
+            self.OutputWriter = BackgroundWriter()
+
+        # the writer is closed (and the SQLite database) however the run ends, so that its thread never
+        # keeps the interpreter alive; pending writes still finish
+        sql_engine = None
+        try:
+            if engine == "sqlite" and completed_stages < len(ALITE_STAGES):
+                os.makedirs(output_folder, exist_ok=True)
+                sql_engine = SQLiteEngine(os.path.join(output_folder, "ALITE.sqlite"), self.Instrumentation)
+
+            partitioner = None
+            if memory_budget:
+                spill_folder = spill_folder or os.path.join(output_folder, "Spill")
+                partitioner = SpillPartitioner(spill_folder, memory_budget, instrumentation=self.Instrumentation)
+
+            # Step 1: Assign integration IDs
+            if completed_stages < 1:
+                if not self.IntegrationIDsAssigned:
+                    with self.Instrumentation.Stage("Column alignment"):
+                        self.AssignIntegrationIDs()
+                if checkpoints:
+                    aligned_tables = [table.Copy() for table in self.Tables] if self.OutputWriter else self.Tables
+                    self.Write(checkpoints.SaveStage, 0, aligned_tables, self.AlignmentState(), self.AlignmentParameters())
+
+            if strategy == "pairwise" and completed_stages < len(ALITE_STAGES):
+                with self.Instrumentation.Stage("Integration planning"):
+                    plan, explanation = self.PlanIntegration()
+                print(explanation)
+                fullDisjunction = self.RunIntegrationPlan(plan, prune_dangling, self.Budget)
+                self.FinishStage(fullDisjunction, output_folder, len(ALITE_STAGES) - 1, output_format, output_policy, None)
+                print(f"Tuple count: {fullDisjunction.TupleCount()}")
+                # the single-integration stages below are skipped
+                completed_stages = len(ALITE_STAGES)
+
+            if completed_stages < 2:
+                # Step 2: Create a new table for the full disjunction
+                fullDisjunction = RelationalTable()
+
+                print("Outer Union Start")
+            
+                # Step 3: Generate labeled nulls for each table and perform outer union
+                with self.Instrumentation.Stage("Outer union") as record:
+                    order = range(len(self.Tables))
+                    if table_order == "overlap":
+                        self.ComputeColumnOverlaps(self.OverlapThreshold)
+                        order = self.OverlapTableOrder()
+                        print(f"Table order by value overlap: {order}")
+                    if sql_engine:
+                        sql_engine.LoadTables([self.Tables[table_index] for table_index in order])
+                        fullDisjunction.DataFrame = sql_engine.OuterUnion()
+                        fullDisjunction.GenerateLabeledNulls()
+                    else:
+                        for table_index in order:
+                            table = self.Tables[table_index]
+                            table.GenerateLabeledNulls()
+                            fullDisjunction.OuterUnionWith(table)
+                    record.Count("output", fullDisjunction.TupleCount())
+            
+                self.FinishStage(fullDisjunction, output_folder, 1, output_format, output_policy, checkpoints,
+                                 {"TableOrder": table_order, "Strategy": strategy})
+                
+                print("Outer Union Done")
+                print(f"Tuple count: {fullDisjunction.TupleCount()}")
+
+            if completed_stages < 3:
+                print("Complement Start")
+                # Step 4: Complement phase
+                with self.Instrumentation.Stage("Complement") as record:
+                    record.Count("input", fullDisjunction.TupleCount())
+                    if sql_engine:
+                        fullDisjunction.DataFrame = sql_engine.Complement(fullDisjunction.DataFrame, self.Budget)
+                    elif partitioner:
+                        partitioner.Complement(fullDisjunction, lambda table: self.ComplementTable(table, prune_dangling, self.Budget))
+                        record.Count("partitions", partitioner.PartitionCount)
+                    else:
+                        self.ComplementTable(fullDisjunction, prune_dangling, self.Budget)
+                    record.Count("output", fullDisjunction.TupleCount())
+                    if self.Budget:
+                        record.Count("unexamined_pairs", self.Budget.PairsUnexamined)
+
+                if self.Budget and not self.Budget.Complete():
+                    # a partial complement must not be resumed from as if it were complete
+                    print(f"Complement stopped by the budget, {self.Budget.PairsUnexamined} tuple pairs left unexamined")
+                    checkpoints = None
+                self.FinishStage(fullDisjunction, output_folder, 2, output_format, output_policy, checkpoints)
+                print(f"Tuple count: {fullDisjunction.TupleCount()}")
             
-        print("Outer Union Done")
-        print(f"Tuple count: {fullDisjunction.TupleCount()}")
+                print("Complement Done")
 
-        print("Complement Start")
-        # Step 4: Complement phase
-        fullDisjunction.Complement()
+            if completed_stages < 4:
+                # Step 5: Replace labeled nulls with actual values (if any replacement logic applies)
+                with self.Instrumentation.Stage("Replace labeled nulls"):
+                    fullDisjunction.ReplaceLabeledNulls()
 
-        fullDisjunction.saveToFile(os.path.join(output_folder, "2 - PostComplement"))
-        print(f"Tuple count: {fullDisjunction.TupleCount()}")
-        
-        print("Complement Done")
+                self.FinishStage(fullDisjunction, output_folder, 3, output_format, output_policy, checkpoints)
 
-        # Step 5: Replace labeled nulls with actual values (if any replacement logic applies)
-        fullDisjunction.ReplaceLabeledNulls()
+            if completed_stages < 5:
+                # Step 6: Subsumption - remove subsumable tuples
+                with self.Instrumentation.Stage("Subsumption") as record:
+                    record.Count("input", fullDisjunction.TupleCount())
+                    if sql_engine:
+                        fullDisjunction.DataFrame = sql_engine.SubsumeTuples(fullDisjunction.DataFrame)
+                    elif partitioner:
+                        partitioner.SubsumeTuples(fullDisjunction)
+                        record.Count("partitions", partitioner.PartitionCount)
+                    else:
+                        fullDisjunction.SubsumeTuples()
+                    record.Count("output", fullDisjunction.TupleCount())
 
-        fullDisjunction.saveToFile(os.path.join(output_folder, "3 - ReplacingLabeledNulls"))
+                self.FinishStage(fullDisjunction, output_folder, 4, output_format, output_policy, checkpoints)
+                print(f"Tuple count: {fullDisjunction.TupleCount()}")
+
+            if self.Budget:
+                self.Completeness = self.Budget.Completeness()
+                print(f"Completeness: {self.Completeness}")
+        finally:
+            if sql_engine:
+                sql_engine.Close()
+            if self.OutputWriter:
+                self.OutputWriter.Close()
+            if self.Profiler:
+                self.Instrumentation.RemoveHook(self.Profiler)
+        if self.Profiler:
+            self.Profiler.SaveCombined()
+        return fullDisjunction
+
+
+# Attributes of a database that a snapshot keeps, besides the tables and the embedding matrix
+SNAPSHOT_ATTRIBUTES = [
+    "IntegrationIDsAssigned", "SilhouetteScores", "ColumnClusterSizes", "EmbeddingColumns", "EmbeddingModel",
+    "EmbeddingBackend", "ColumnFeatures", "ColumnOverlaps", "OverlapWeight", "OverlapThreshold",
+]
+
+
+# Immutable copy of a loaded (and usually aligned) database, which is forked into a new database for every run,
+# e.g. for repeated benchmark runs that should not reload and realign the tables. The snapshot copies the table
+# data once into read-only column arrays, and the tables of every fork share these arrays instead of copying
+# them. ALITE replaces the data of a table (GenerateLabeledNulls maps it into a new frame and RenameColumns only
+# renames it) rather than writing into it, so forks do not affect each other or the snapshot, and anything that
+# does write into the shared arrays fails with a read-only error instead of changing the snapshot. Columns of
+# extension types (nullable and arrow storage) cannot be made read-only, so every fork gets its own copy of them
+class DatabaseSnapshot:
+    def __init__(self, database: RelationalDatabase):
+        self.Tables: list[RelationalTable] = []
+        for table in database.Tables:
+            # lazily loaded tables are read in full, so that forks never read the source files
+            frame = table.DataFrame
+            frozen_table = table.Copy(deep=False)
+            frozen_table.DataFrame = self.FreezeFrame(frame)
+            self.Tables.append(frozen_table)
+        self.EmbeddingMatrix: np.ndarray = None
+        if database.EmbeddingMatrix is not None:
+            self.EmbeddingMatrix = database.EmbeddingMatrix.copy()
+            self.EmbeddingMatrix.flags.writeable = False
+        self.Attributes: dict = {name: copy.deepcopy(getattr(database, name)) for name in SNAPSHOT_ATTRIBUTES}
 
-        # Step 6: Subsumption - remove subsumable tuples
-        fullDisjunction.SubsumeTuples()
+    # Copy of the frame with every column in its own read-only array
+    @staticmethod
+    def FreezeFrame(frame: pd.DataFrame):
+        columns = {}
+        for index in range(frame.shape[1]):
+            column = frame.iloc[:, index]
+            if isinstance(column.dtype, np.dtype):
+                values = column.to_numpy(copy=True)
+                values.flags.writeable = False
+            else:
+                values = column.array.copy()
+            columns[index] = values
+        frozen = pd.DataFrame(columns, index=frame.index, copy=False)
+        frozen.columns = frame.columns
+        return frozen
 
-        fullDisjunction.saveToFile(os.path.join(output_folder, "4 - PostSubsumption"))
-        print(f"Tuple count: {fullDisjunction.TupleCount()}")
+    # Frame of a fork, sharing the read-only numpy columns of the snapshot frame and copying the extension columns
+    @staticmethod
+    def ForkFrame(frame: pd.DataFrame):
+        columns = {}
+        for index in range(frame.shape[1]):
+            column = frame.iloc[:, index]
+            if isinstance(column.dtype, np.dtype):
+                columns[index] = column.to_numpy()
+            else:
+                columns[index] = column.array.copy()
+        forked = pd.DataFrame(columns, index=frame.index, copy=False)
+        forked.columns = frame.columns
+        return forked
 
-        return fullDisjunction
\ No newline at end of file
+    # New database with the tables and alignment of the snapshot, sharing the numpy columns of the table data
+    def Fork(self):
+        database = RelationalDatabase()
+        database.Tables = []
+        for snapshot_table in self.Tables:
+            table = snapshot_table.Copy(deep=False)
+            table.DataFrame = self.ForkFrame(snapshot_table.DataFrame)
+            database.Tables.append(table)
+        database.EmbeddingMatrix = self.EmbeddingMatrix
+        for name, value in self.Attributes.items():
+            setattr(database, name, copy.deepcopy(value))
+        return database
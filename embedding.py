@@ -0,0 +1,42 @@
+import os
+import torch
+from sentence_transformers import SentenceTransformer
+
+
+# Embedding models for column values. Every backend is a SentenceTransformer, so anything that encodes values
+# (e.g. RelationalTable.InitializeColumnEmbeddings) works with all of them:
+#   "torch"     full-precision PyTorch, as before
+#   "quantized" PyTorch with the linear layers dynamically quantized to int8, which is considerably faster on CPU
+#   "onnx"      ONNX Runtime (requires sentence-transformers 3.2 or later with the onnx extra), from a directory
+#               with an exported model or a model that sentence-transformers can export on the fly
+# The model may be a model name or a local model directory, so nodes without network access can use a copy
+# of the model (SentenceTransformer reads a local directory without going to the hub). The torch backend loads
+# the model exactly as before, on whatever device SentenceTransformer picks. Loaded models are cached for the
+# lifetime of the process
+EMBEDDING_BACKENDS = ["torch", "quantized", "onnx"]
+
+_loaded_models: dict[tuple[str, str], SentenceTransformer] = {}
+
+
+def LoadEmbeddingModel(model: str = "all-MiniLM-L6-v2", backend: str = "torch"):
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend}, expected one of {EMBEDDING_BACKENDS}")
+
+    key = (model, backend)
+    if key not in _loaded_models:
+        print(f"Loading embedding model {model} ({backend})")
+        if backend == "onnx":
+            transformer = SentenceTransformer(model, backend="onnx", local_files_only=os.path.isdir(model))
+        elif backend == "quantized":
+            # dynamic quantization only runs on the CPU
+            transformer = SentenceTransformer(model, device="cpu")
+            transformer = torch.ao.quantization.quantize_dynamic(transformer, {torch.nn.Linear}, dtype=torch.qint8)
+        else:
+            transformer = SentenceTransformer(model)
+        transformer.eval()
+        _loaded_models[key] = transformer
+    return _loaded_models[key]
+
+
+def ClearEmbeddingModels():
+    _loaded_models.clear()
@@ -0,0 +1,218 @@
+import time
+import math
+import warnings
+import numpy as np
+import pandas as pd
+from table import RelationalTable
+
+
+# Value overlap and fan-out of one table towards another, measured on a sample of the first table: the fraction
+# of its tuples that have a partner in the other table, and the average number of partners of those that do
+class JoinStatistics:
+    def __init__(self, left: int, right: int, column: str, overlap: float, fanout: float):
+        self.Left: int = left
+        self.Right: int = right
+        self.Column: str = column      # None if the tables share no columns
+        self.Overlap: float = overlap
+        self.Fanout: float = fanout
+
+
+# Predicted size and runtime of the complement phase of ALITE (see ComplementEstimator)
+class ComplementEstimate:
+    def __init__(self, input_tuples: int, raw_output_tuples: float, output_tuples: float, comparisons: float,
+                 seconds: float, joins: list[JoinStatistics], calibration_runs: int, compatible_fraction: float = None):
+        self.InputTuples: int = input_tuples
+        # estimated output before and after calibration against previous runs
+        self.RawOutputTuples: float = raw_output_tuples
+        self.OutputTuples: float = output_tuples
+        self.Comparisons: float = comparisons
+        self.Seconds: float = seconds
+        self.Joins: list[JoinStatistics] = joins
+        self.CalibrationRuns: int = calibration_runs
+        # estimated fraction of the compared tuple pairs that complement each other
+        self.CompatibleFraction: float = compatible_fraction
+
+    def Explain(self):
+        lines = [f"Estimated ALITE run on {self.InputTuples} input tuples: ~{self.OutputTuples:.0f} output tuples, "
+                 f"~{self.Comparisons:.2e} tuple comparisons, ~{self.Seconds:.1f} seconds "
+                 f"({'calibrated on ' + str(self.CalibrationRuns) + ' runs' if self.CalibrationRuns else 'uncalibrated'})"]
+        for join in self.Joins:
+            on = f"on column {join.Column}" if join.Column is not None else "without shared columns (cartesian)"
+            lines.append(f"  T{join.Left} -> T{join.Right} {on}: {join.Overlap:.0%} of tuples match, {join.Fanout:.1f} partners each")
+        return "\n".join(lines)
+
+
+# Predicts how many tuples the full disjunction of aligned tables has and how long ALITE takes to compute it, from
+# a sample of each table instead of running Complement. For every pair of tables, the sampled tuples of one are
+# looked up in the value counts of the other on their most selective shared column (a missing value matches any
+# tuple), which gives the value overlap and fan-out of the join. Tuples without a partner are kept on their own,
+# and the others contribute one tuple per partner, counting every pair of tables once. Complement compares every
+# tuple it has against every tuple of the outer union in each iteration, so the comparisons are estimated as the
+# input tuples times the input and output tuples (the first iteration and the one that finds the fixpoint).
+# The time per comparison is measured on sample tuples, separately for pairs that complement each other (which
+# go through every column and are merged) and pairs that conflict (which stop at the first conflicting column),
+# and the two are weighted by the fraction of compatible pairs that the join statistics predict. This still
+# leaves out part of the overhead of Complement itself, so the estimate is best calibrated against the input and output tuple counts and durations of previous runs
+# (Benchmarker.TupleCounts and Durations): the runtime is fitted as a fixed overhead plus a time per comparison,
+# and the output is scaled by the ratio of the actual to the estimated output of runs with a recorded estimate
+# (Benchmarker.OutputEstimates)
+class ComplementEstimator:
+    def __init__(self, sample_size: int = 200, seed: int = 0):
+        self.SampleSize = sample_size
+        self.Seed = seed
+        self.SecondsPerComparison: float = None
+        self.Overhead: float = 0.0
+        self.OutputScale: float = 1.0
+        self.CalibrationRuns: int = 0
+
+    @staticmethod
+    def EstimatedComparisons(input_tuples: float, output_tuples: float):
+        return input_tuples * (input_tuples + output_tuples)
+
+    # Fit the runtime and output size to previous runs of the method, keyed by (dataset name, method)
+    def Calibrate(self, tuple_counts: dict[tuple[str, str], tuple[int, int]], durations: dict[tuple[str, str], float],
+                  output_estimates: dict[tuple[str, str], float] = None, method: str = "ALITE"):
+        runs = [(tuple_counts[key][0], tuple_counts[key][1], durations[key]) for key in tuple_counts
+                if key[1] == method and key in durations and tuple_counts[key][1] >= 0]
+        self.CalibrationRuns = len(runs)
+        if runs:
+            comparisons = np.array([self.EstimatedComparisons(input_tuples, output_tuples) for input_tuples, output_tuples, _ in runs], dtype=float)
+            seconds = np.array([duration for _, _, duration in runs], dtype=float)
+            slope, intercept = None, 0.0
+            if len(runs) > 1 and np.ptp(comparisons) > 0:
+                slope, intercept = np.linalg.lstsq(np.column_stack([comparisons, np.ones(len(runs))]), seconds, rcond=None)[0]
+            if slope is None or slope <= 0 or intercept < 0:
+                # too few or too noisy runs for an overhead, so all of the time goes to the comparisons
+                slope, intercept = seconds.sum() / max(comparisons.sum(), 1.0), 0.0
+            self.SecondsPerComparison, self.Overhead = float(slope), float(intercept)
+
+        ratios = [tuple_counts[key][1] / estimate for key, estimate in (output_estimates or {}).items()
+                  if key[1] == method and key in tuple_counts and tuple_counts[key][1] > 0 and estimate > 0]
+        if ratios:
+            # geometric mean, so that over- and underestimates by the same factor cancel out
+            self.OutputScale = math.exp(sum(math.log(ratio) for ratio in ratios) / len(ratios))
+
+    def Sample(self, table: RelationalTable):
+        frame = table.DataFrame
+        return frame if len(frame) <= self.SampleSize else frame.sample(self.SampleSize, random_state=self.Seed)
+
+    @staticmethod
+    def Missing(frame: pd.DataFrame):
+        table = RelationalTable()
+        table.DataFrame = frame
+        return table.MissingMask()
+
+    # Overlap and fan-out of the left table's sample towards the right table
+    def MeasureJoin(self, left: int, right: int, sample: pd.DataFrame, right_frame: pd.DataFrame):
+        shared = [column for column in sample.columns if column in set(right_frame.columns)]
+        if not shared:
+            return JoinStatistics(left, right, None, 1.0 if len(right_frame) else 0.0, float(len(right_frame)))
+        right_missing = self.Missing(right_frame[shared])
+        column = max(shared, key=lambda column: right_frame[column][~right_missing[column]].nunique())
+        value_counts = right_frame[column][~right_missing[column]].value_counts()
+        missing_count = int(right_missing[column].sum())
+        sample_missing = self.Missing(sample[[column]])[column]
+        partners = np.array([len(right_frame) if is_missing else value_counts.get(value, 0) + missing_count
+                             for value, is_missing in zip(sample[column], sample_missing)], dtype=float)
+        matched = partners > 0
+        overlap = float(matched.mean()) if len(partners) else 0.0
+        fanout = float(partners[matched].mean()) if matched.any() else 0.0
+        return JoinStatistics(left, right, column, overlap, fanout)
+
+    # Fraction of the ordered pairs of input tuples that complement each other: the partners each table's tuples
+    # have in every other table, out of all pairs. Tuples of the same table rarely complement each other
+    @staticmethod
+    def CompatibleFraction(sizes: list[int], joins: list[JoinStatistics]):
+        input_tuples = sum(sizes)
+        if not input_tuples:
+            return 0.0
+        compatible_pairs = sum(sizes[join.Left] * join.Overlap * join.Fanout for join in joins)
+        return min(1.0, compatible_pairs / input_tuples ** 2)
+
+    # Time of comparing two tuples the way Complement does (reading the tuple, skipping identical tuples,
+    # complementing and, for compatible pairs, adding the result to the output), on pairs of sampled tuples:
+    # compatible pairs and conflicting pairs are timed on their own and weighted by the fraction of compatible pairs
+    def MeasureComparisonCost(self, samples: list[pd.DataFrame], compatible_fraction: float, pairs: int = 50):
+        frames = [sample for sample in samples if len(sample)]
+        if not frames:
+            return 0.0
+        outer_union = RelationalTable()
+        outer_union.DataFrame = pd.concat(frames, ignore_index=True)
+        outer_union.DataFrame = outer_union.DataFrame.reindex(sorted(outer_union.DataFrame.columns), axis=1).fillna('')
+        rows = [row for _, row in outer_union.DataFrame.iterrows()]
+
+        # draw pairs until there are enough of both kinds, or give up after a number of attempts
+        rng = np.random.default_rng(self.Seed)
+        compatible, conflicting = [], []
+        for _ in range(20 * pairs):
+            if len(compatible) >= pairs and len(conflicting) >= pairs:
+                break
+            t_1, t_2 = (rows[int(index)] for index in rng.integers(0, len(rows), size=2))
+            if t_1.equals(t_2):
+                continue
+            kind = compatible if outer_union.k(t_1, t_2)[1] else conflicting
+            if len(kind) < pairs:
+                kind.append((t_1, t_2))
+        if not compatible:
+            # a tuple and a copy of it without one of its values always complement each other
+            for t_1 in rows[:pairs]:
+                present = [position for position, value in enumerate(t_1) if str(value) != '']
+                if present:
+                    t_2 = t_1.copy()
+                    t_2.iloc[present[0]] = ''
+                    compatible.append((t_1, t_2))
+
+        def time_pairs(tuple_pairs):
+            if not tuple_pairs:
+                return 0.0
+            output = pd.DataFrame(columns=outer_union.DataFrame.columns)
+            with warnings.catch_warnings():
+                # Complement warns about concatenating to an empty frame as well
+                warnings.simplefilter("ignore", FutureWarning)
+                start = time.perf_counter()
+                for t_1, t_2 in tuple_pairs:
+                    if t_1.equals(t_2):
+                        continue
+                    R, complement_status = outer_union.k(t_1, t_2)
+                    if complement_status:
+                        pd.concat([output, pd.DataFrame([R])], ignore_index=True)
+                return (time.perf_counter() - start) / len(tuple_pairs)
+
+        conflicting_cost = time_pairs(conflicting)
+        compatible_cost = time_pairs(compatible)
+        if not conflicting:
+            conflicting_cost = compatible_cost
+        # Complement also reads every tuple it compares against with iterrows
+        start = time.perf_counter()
+        for _ in outer_union.DataFrame.iterrows():
+            pass
+        row_cost = (time.perf_counter() - start) / len(rows)
+        return row_cost + compatible_fraction * compatible_cost + (1 - compatible_fraction) * conflicting_cost
+
+    # Estimated output tuples before calibration, and the join statistics they are based on
+    def EstimateOutput(self, tables: list[RelationalTable]):
+        frames = [table.DataFrame for table in tables]
+        sizes = [len(frame) for frame in frames]
+        joins = [self.MeasureJoin(i, j, self.Sample(tables[i]), frames[j])
+                 for i in range(len(frames)) for j in range(len(frames)) if i != j and sizes[i] and sizes[j]]
+
+        best_overlap = [0.0] * len(frames)
+        for join in joins:
+            best_overlap[join.Left] = max(best_overlap[join.Left], join.Overlap)
+        unmatched = sum(size * (1 - overlap) for size, overlap in zip(sizes, best_overlap))
+        joined = sum(sizes[join.Left] * join.Overlap * join.Fanout for join in joins if join.Left < join.Right)
+        return max(unmatched + joined, max(sizes, default=0)), joins
+
+    def Estimate(self, tables: list[RelationalTable]):
+        raw_output_tuples, joins = self.EstimateOutput(tables)
+        sizes = [table.TupleCount() for table in tables]
+        input_tuples = sum(sizes)
+        output_tuples = raw_output_tuples * self.OutputScale
+        comparisons = self.EstimatedComparisons(input_tuples, output_tuples)
+        compatible_fraction = self.CompatibleFraction(sizes, joins)
+        seconds_per_comparison = self.SecondsPerComparison
+        if seconds_per_comparison is None:
+            seconds_per_comparison = self.MeasureComparisonCost([self.Sample(table) for table in tables], compatible_fraction)
+        seconds = self.Overhead + seconds_per_comparison * comparisons
+        return ComplementEstimate(input_tuples, raw_output_tuples, output_tuples, comparisons, seconds, joins,
+                                  self.CalibrationRuns, compatible_fraction)
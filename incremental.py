@@ -0,0 +1,256 @@
+import os
+import json
+from itertools import chain
+import pandas as pd
+from table import RelationalTable
+
+
+# Maintains the full disjunction of a finished ALITE run while tuples are appended to or deleted from its tables,
+# without rerunning ALITE. It keeps the original tuples of the run (its outer union, with labeled nulls) and the
+# final result, both indexed by the values of every column, so that an update only looks at tuples that share
+# values with the changed ones:
+#   - appending: the result tuples that a new tuple complements are no longer complete, so they are dropped, and
+#     the new tuples are complemented against the indexed original tuples until a fixpoint, like Complement
+#   - deleting: the result tuples that contain all values of a deleted tuple may have been built from it, so they
+#     are dropped, and the original tuples they were built from are complemented again without the deleted ones
+# The complemented tuples are then subsumed against the result, also through the index. The result is the same as
+# rerunning ALITE (without dangling tuple pruning, which does not change it) on the updated tables
+class IncrementalFullDisjunction:
+    def __init__(self, outer_union: RelationalTable = None, full_disjunction: RelationalTable = None,
+                 column_maps: list[dict] = None):
+        self.Columns: list = []
+        # original tuples, by position; deleted ones are None
+        self.Originals: list[tuple] = []
+        # result tuples by ID, and the next free ID
+        self.Result: dict[int, tuple] = {}
+        self.NextResultID: int = 0
+        # for each table, its original column names -> aligned column names
+        self.ColumnMaps: list[dict] = column_maps or []
+        # per column: value -> positions (or IDs) of the tuples with that value, and the tuples missing a value
+        self.OriginalIndex: list[dict] = []
+        self.OriginalNulls: list[set] = []
+        self.ResultIndex: list[dict] = []
+        self.ResultNulls: list[set] = []
+        if outer_union is not None:
+            self.Initialize(outer_union, full_disjunction)
+
+    def Initialize(self, outer_union: RelationalTable, full_disjunction: RelationalTable):
+        self.Columns = list(outer_union.DataFrame.columns)
+        self.OriginalIndex = [{} for _ in self.Columns]
+        self.OriginalNulls = [set() for _ in self.Columns]
+        self.ResultIndex = [{} for _ in self.Columns]
+        self.ResultNulls = [set() for _ in self.Columns]
+        self.Originals = []
+        self.Result = {}
+        for row in self.Rows(outer_union.DataFrame):
+            self.AddOriginal(row)
+        for row in self.Rows(full_disjunction.DataFrame[self.Columns]):
+            self.AddResult(row)
+
+    # Tuples of a frame, with labeled nulls kept and any other missing value as None
+    @staticmethod
+    def Rows(frame: pd.DataFrame):
+        normalize = lambda value: value if isinstance(value, RelationalTable.LabeledNull) or not pd.isna(value) else None
+        return [tuple(normalize(value) for value in row) for row in frame.itertuples(index=False, name=None)]
+
+    # Missing as RelationalTable.k sees it
+    @staticmethod
+    def IsNull(value):
+        return value is None or isinstance(value, RelationalTable.LabeledNull) or pd.isna(value) or str(value) == ''
+
+    @staticmethod
+    def Compatible(t_1: tuple, t_2: tuple):
+        is_null = IncrementalFullDisjunction.IsNull
+        return all(is_null(val1) or is_null(val2) or val1 == val2 for val1, val2 in zip(t_1, t_2))
+
+    @staticmethod
+    def Merge(t_1: tuple, t_2: tuple):
+        is_null = IncrementalFullDisjunction.IsNull
+        return tuple(val1 if not is_null(val1) else val2 if not is_null(val2) else None for val1, val2 in zip(t_1, t_2))
+
+    # Whether t_1 subsumes t_2, as RelationalTable.is_subsumed
+    @staticmethod
+    def Subsumes(t_1: tuple, t_2: tuple):
+        return all(val2 is None or (val1 is not None and val1 == val2) for val1, val2 in zip(t_1, t_2))
+
+    # Whether every value of t_1 is in t_2
+    @staticmethod
+    def ContainedIn(t_1: tuple, t_2: tuple):
+        is_null = IncrementalFullDisjunction.IsNull
+        return all(is_null(val1) or val1 == val2 for val1, val2 in zip(t_1, t_2))
+
+    def AddToIndex(self, index: list[dict], nulls: list[set], key: int, row: tuple):
+        for column, value in enumerate(row):
+            if self.IsNull(value):
+                nulls[column].add(key)
+            else:
+                index[column].setdefault(value, set()).add(key)
+
+    def RemoveFromIndex(self, index: list[dict], nulls: list[set], key: int, row: tuple):
+        for column, value in enumerate(row):
+            if self.IsNull(value):
+                nulls[column].discard(key)
+            else:
+                index[column][value].discard(key)
+
+    # Keys of the indexed tuples that can agree with the row on every column where the row has a value: the
+    # tuples with the row's value or no value in the column where that leaves the fewest. With values_only,
+    # only tuples that have the row's value there
+    def Candidates(self, row: tuple, index: list[dict], nulls: list[set], all_keys, values_only: bool = False):
+        best = None
+        for column, value in enumerate(row):
+            if self.IsNull(value):
+                continue
+            matching = index[column].get(value, set())
+            size = len(matching) + (0 if values_only else len(nulls[column]))
+            if best is None or size < best[0]:
+                best = (size, matching, nulls[column])
+        if best is None:
+            return list(all_keys)
+        return list(best[1]) if values_only else list(chain(best[1], best[2]))
+
+    def AddOriginal(self, row: tuple):
+        self.Originals.append(row)
+        self.AddToIndex(self.OriginalIndex, self.OriginalNulls, len(self.Originals) - 1, row)
+
+    def AddResult(self, row: tuple):
+        self.Result[self.NextResultID] = row
+        self.AddToIndex(self.ResultIndex, self.ResultNulls, self.NextResultID, row)
+        self.NextResultID += 1
+
+    def RemoveResult(self, result_id: int):
+        self.RemoveFromIndex(self.ResultIndex, self.ResultNulls, result_id, self.Result.pop(result_id))
+
+    def OriginalPositions(self):
+        return (position for position, row in enumerate(self.Originals) if row is not None)
+
+    # Complement the seed tuples against the original tuples until a fixpoint is reached, like Complement does
+    # for all tuples: every tuple is replaced by its complements with all original tuples, or kept if it has none
+    def ComplementFrom(self, seeds: list[tuple]):
+        current = list(dict.fromkeys(seeds))
+        i = 0
+        while True:
+            print(f"Incremental complement iteration {i}: {len(current)} tuples")
+            i += 1
+            complemented = {}
+            for t_1 in current:
+                complement_count = 0
+                for position in self.Candidates(t_1, self.OriginalIndex, self.OriginalNulls, self.OriginalPositions()):
+                    t_2 = self.Originals[position]
+                    if t_1 == t_2 or not self.Compatible(t_1, t_2):
+                        continue
+                    complemented[self.Merge(t_1, t_2)] = None
+                    complement_count += 1
+                if complement_count == 0:
+                    complemented[t_1] = None
+            if set(complemented) == set(current):
+                break
+            current = list(complemented)
+        # labeled nulls are replaced as in ReplaceLabeledNulls
+        return [tuple(None if isinstance(value, RelationalTable.LabeledNull) else value for value in row) for row in current]
+
+    # Add complemented tuples to the result, unless a result tuple subsumes them, removing the result tuples
+    # they subsume
+    def SubsumeIntoResult(self, rows: list[tuple]):
+        added = 0
+        for row in dict.fromkeys(rows):
+            subsumers = self.Candidates(row, self.ResultIndex, self.ResultNulls, self.Result.keys(), values_only=True)
+            if any(self.Subsumes(self.Result[result_id], row) for result_id in subsumers):
+                continue
+            for result_id in self.Candidates(row, self.ResultIndex, self.ResultNulls, self.Result.keys()):
+                if self.Subsumes(row, self.Result[result_id]):
+                    self.RemoveResult(result_id)
+            self.AddResult(row)
+            added += 1
+        return added
+
+    # Tuples of a table with its original column names, aligned to the columns of the full disjunction like
+    # the outer union: with labeled nulls for missing values and empty strings in the columns it lacks
+    def AlignedRows(self, table_index: int, frame: pd.DataFrame):
+        column_map = self.ColumnMaps[table_index] if table_index < len(self.ColumnMaps) else {}
+        unknown = [column for column in frame.columns if column_map.get(column, column) not in self.Columns]
+        if unknown:
+            raise ValueError(f"Columns {unknown} are not aligned columns of table {table_index}")
+        table = RelationalTable()
+        table.DataFrame = frame.rename(columns=column_map)
+        table.GenerateLabeledNulls()
+        return self.Rows(table.DataFrame.reindex(columns=self.Columns, fill_value=''))
+
+    def Append(self, table_index: int, frame: pd.DataFrame):
+        rows = self.AlignedRows(table_index, frame)
+        dropped = 0
+        for row in rows:
+            for result_id in self.Candidates(row, self.ResultIndex, self.ResultNulls, self.Result.keys()):
+                result = self.Result[result_id]
+                if result != row and self.Compatible(result, row):
+                    self.RemoveResult(result_id)
+                    dropped += 1
+        for row in rows:
+            self.AddOriginal(row)
+        added = self.SubsumeIntoResult(self.ComplementFrom(rows))
+        print(f"Appended {len(rows)} tuples: {dropped} result tuples replaced by {added}")
+
+    # Delete tuples, each matching one original tuple of the table by its values
+    def Delete(self, table_index: int, frame: pd.DataFrame):
+        same_tuple = lambda row, original: all(
+            (self.IsNull(value) and self.IsNull(original_value)) or value == original_value
+            for value, original_value in zip(row, original))
+        deleted = []
+        for row in self.AlignedRows(table_index, frame):
+            matches = [position for position in self.Candidates(row, self.OriginalIndex, self.OriginalNulls, self.OriginalPositions())
+                       if same_tuple(row, self.Originals[position])]
+            if not matches:
+                print(f"Warning: no tuple to delete matches {row}")
+                continue
+            position = min(matches)
+            deleted.append(self.Originals[position])
+            self.RemoveFromIndex(self.OriginalIndex, self.OriginalNulls, position, self.Originals[position])
+            self.Originals[position] = None
+
+        affected = {}
+        for row in deleted:
+            for result_id in self.Candidates(row, self.ResultIndex, self.ResultNulls, self.Result.keys(), values_only=True):
+                if self.ContainedIn(row, self.Result[result_id]):
+                    affected[result_id] = self.Result[result_id]
+        seeds = {}
+        for result_id, result in affected.items():
+            self.RemoveResult(result_id)
+            for position in self.Candidates(result, self.OriginalIndex, self.OriginalNulls, self.OriginalPositions()):
+                if self.ContainedIn(self.Originals[position], result):
+                    seeds[position] = self.Originals[position]
+        added = self.SubsumeIntoResult(self.ComplementFrom(list(seeds.values())))
+        print(f"Deleted {len(deleted)} tuples: {len(affected)} result tuples replaced by {added}")
+
+    # Apply the deleted and then the appended tuples of one table
+    def Update(self, table_index: int, appended: pd.DataFrame = None, deleted: pd.DataFrame = None):
+        if deleted is not None and len(deleted):
+            self.Delete(table_index, deleted)
+        if appended is not None and len(appended):
+            self.Append(table_index, appended)
+
+    def FullDisjunction(self):
+        table = RelationalTable()
+        table.DataFrame = pd.DataFrame(list(self.Result.values()), columns=self.Columns)
+        return table
+
+    def OuterUnion(self):
+        table = RelationalTable()
+        table.DataFrame = pd.DataFrame([row for row in self.Originals if row is not None], columns=self.Columns)
+        return table
+
+    # Save the original tuples, the result and the column maps, so that updates can continue later
+    def SaveSnapshot(self, snapshot_folder: str):
+        self.OuterUnion().SaveSnapshot(os.path.join(snapshot_folder, "outer_union"))
+        self.FullDisjunction().SaveSnapshot(os.path.join(snapshot_folder, "full_disjunction"))
+        with open(os.path.join(snapshot_folder, "column_maps.json"), 'w', encoding='utf-8') as file:
+            # stored as pairs so integer and string keys survive the round trip
+            json.dump([[[original, aligned] for original, aligned in column_map.items()] for column_map in self.ColumnMaps], file)
+
+    def LoadFromSnapshot(self, snapshot_folder: str):
+        outer_union = RelationalTable()
+        outer_union.LoadFromSnapshot(os.path.join(snapshot_folder, "outer_union"))
+        full_disjunction = RelationalTable()
+        full_disjunction.LoadFromSnapshot(os.path.join(snapshot_folder, "full_disjunction"))
+        with open(os.path.join(snapshot_folder, "column_maps.json"), 'r', encoding='utf-8') as file:
+            self.ColumnMaps = [{original: aligned for original, aligned in pairs} for pairs in json.load(file)]
+        self.Initialize(outer_union, full_disjunction)
@@ -0,0 +1,133 @@
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+try:
+    import resource     # not available on Windows, where peak RSS is not recorded
+except ImportError:
+    resource = None
+
+
+# Measurements for one stage of a run (or one iteration within a stage)
+class StageRecord:
+    def __init__(self, name: str, depth: int = 0):
+        self.Name: str = name
+        self.Depth: int = depth     # nesting level, e.g. complement iterations sit inside the complement stage
+        self.WallTime: float = 0.0
+        self.CPUTime: float = 0.0
+        self.PeakRSS: int = None    # peak resident set size of the process so far, in bytes
+        self.PeakTracedMemory: int = None   # peak Python allocations during the stage, in bytes
+        self.TupleCounts: dict[str, int] = {}
+        # peak traced memory of nested stages, which have to reset the tracemalloc peak
+        self._nested_peak = 0
+
+    def Count(self, name: str, value: int):
+        self.TupleCounts[name] = value
+
+    def AsDict(self):
+        return {
+            "stage": self.Name,
+            "depth": self.Depth,
+            "wall_time": self.WallTime,
+            "cpu_time": self.CPUTime,
+            "peak_rss": self.PeakRSS,
+            "peak_traced_memory": self.PeakTracedMemory,
+            **{f"tuples_{name}": value for name, value in self.TupleCounts.items()},
+        }
+
+
+def PeakRSS():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kilobytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# Records wall time, CPU time, memory and tuple counts for the stages of a run. Stages are entered with
+# the Stage context manager. Hooks are objects with StageStarted(record) and StageFinished(record) methods
+# that are called around every stage, e.g. to attach a profiler
+class Instrumentation:
+    def __init__(self, trace_memory: bool = False):
+        # whether tracemalloc was started by this instrumentation, so that it only stops tracing it started
+        self._started_tracing = False
+        self.TraceMemory = trace_memory     # tracemalloc gives exact peaks but slows Python code down noticeably
+        self.Records: list[StageRecord] = []
+        self.Hooks: list = []
+        self._active: list[StageRecord] = []
+
+    # Turning memory tracing off stops tracemalloc (if it was started here), so later runs do not pay for it
+    @property
+    def TraceMemory(self) -> bool:
+        return self._trace_memory
+
+    @TraceMemory.setter
+    def TraceMemory(self, trace_memory: bool):
+        self._trace_memory = trace_memory
+        if not trace_memory:
+            self.StopTracing()
+
+    def StopTracing(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def AddHook(self, hook):
+        self.Hooks.append(hook)
+
+    def RemoveHook(self, hook):
+        if hook in self.Hooks:
+            self.Hooks.remove(hook)
+
+    def Reset(self):
+        self.Records = []
+        self.StopTracing()
+
+    @contextmanager
+    def Stage(self, name: str):
+        record = StageRecord(name, len(self._active))
+        if self.TraceMemory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            if self._active:
+                # keep the enclosing stage's peak before resetting it for this stage
+                parent = self._active[-1]
+                parent._nested_peak = max(parent._nested_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        for hook in self.Hooks:
+            hook.StageStarted(record)
+
+        # records are kept in the order the stages started, so enclosing stages come before nested ones
+        self.Records.append(record)
+        self._active.append(record)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            record.WallTime = time.perf_counter() - wall_start
+            record.CPUTime = time.process_time() - cpu_start
+            self._active.pop()
+            if self.TraceMemory:
+                record.PeakTracedMemory = max(record._nested_peak, tracemalloc.get_traced_memory()[1])
+                if self._active:
+                    parent = self._active[-1]
+                    parent._nested_peak = max(parent._nested_peak, record.PeakTracedMemory)
+            record.PeakRSS = PeakRSS()
+            for hook in reversed(self.Hooks):
+                hook.StageFinished(record)
+
+    def Summary(self):
+        lines = []
+        for record in self.Records:
+            counts = ", ".join(f"{name}={value}" for name, value in record.TupleCounts.items())
+            lines.append(f"{'  ' * record.Depth}{record.Name}: {record.WallTime:.3f}s wall, {record.CPUTime:.3f}s CPU"
+                         + (f", {counts}" if counts else ""))
+        return "\n".join(lines)
+
+
+# Stand-in for Instrumentation.Stage when code runs without instrumentation
+@contextmanager
+def NoInstrumentation(name: str):
+    yield StageRecord(name)
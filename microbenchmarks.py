@@ -0,0 +1,181 @@
+import io
+import sys
+import json
+import timeit
+import argparse
+import contextlib
+import numpy as np
+import pandas as pd
+from table import RelationalTable
+from database import RelationalDatabase
+from sql_engine import SQLiteEngine
+from column_clustering import ColumnClustering
+from workload_generator import SyntheticWorkloadGenerator
+
+
+# Micro-benchmarks for the table-level primitives of ALITE, runnable offline (no embedding model needed).
+# Each primitive is timed over a range of input sizes, and the scaling exponent is the slope of log(time)
+# against log(size), e.g. about 2 for an operation that is quadratic in its input.
+#   python microbenchmarks.py --primitives complement subsume_tuples --sizes 10 20 40 80 --output micro.json
+
+
+# Aligned tables with row_count rows each, generated with known alignment so no model is needed
+def AlignedTables(row_count: int, table_count: int = 3, column_count: int = 4):
+    generator = SyntheticWorkloadGenerator(table_count=table_count, row_count=row_count, column_count=column_count,
+                                           null_rate=0.2, cardinality=max(2, row_count // 2), join_fanout=2)
+    database = RelationalDatabase()
+    for frame in generator.GenerateFrames():
+        table = RelationalTable()
+        table.DataFrame = frame
+        database.Tables.append(table)
+    SyntheticWorkloadGenerator.ApplyKnownAlignment(database)
+    return database.Tables
+
+
+def OuterUnion(tables: list[RelationalTable]):
+    fullDisjunction = RelationalTable()
+    for table in tables:
+        table.GenerateLabeledNulls()
+        fullDisjunction.OuterUnionWith(table)
+    return fullDisjunction
+
+
+# Every primitive maps an input size to (setup, run), where setup prepares fresh state before each timed run
+def OuterUnionBenchmark(size: int):
+    state = {}
+    def setup():
+        state["tables"] = AlignedTables(size)
+        for table in state["tables"]:
+            table.GenerateLabeledNulls()
+        state["target"] = RelationalTable()
+    def run():
+        for table in state["tables"]:
+            state["target"].OuterUnionWith(table)
+    return setup, run
+
+# k and is_subsumed compare a single pair of tuples, so their size is the number of columns. Both stop at the
+# first column where the tuples conflict, so the pair agrees on every column where both have a value and is
+# missing every other value in the second tuple: k complements it and is_subsumed finds the first tuple subsumes
+# the second, both after going through all columns
+def TuplePairBenchmark(size: int, method: str):
+    table = RelationalTable()
+    values = [f"v{column}" for column in range(size)]
+    if method == "k":
+        # missing values as in the outer union, before labeled nulls are replaced
+        missing = [table.LabeledNull(column) for column in range(size)]
+    else:
+        missing = [pd.NA] * size
+    table.DataFrame = pd.DataFrame([values, [value if column % 2 == 0 else missing[column] for column, value in enumerate(values)]],
+                                   columns=[str(column) for column in range(size)], dtype=object)
+    t_1 = table.DataFrame.iloc[0]
+    t_2 = table.DataFrame.iloc[1]
+    compare = getattr(table, method)
+    return (lambda: None), (lambda: compare(t_1, t_2))
+
+def ComplementBenchmark(size: int):
+    state = {}
+    def setup():
+        state["table"] = OuterUnion(AlignedTables(size))
+    return setup, lambda: state["table"].Complement()
+
+def SubsumeTuplesBenchmark(size: int):
+    state = {}
+    def setup():
+        table = OuterUnion(AlignedTables(size))
+        table.ReplaceLabeledNulls()
+        state["table"] = table
+    return setup, lambda: state["table"].SubsumeTuples()
+
+# The same operations on the SQLite engine, which is loaded with the outer union during setup
+def SQLiteComplementBenchmark(size: int):
+    state = {}
+    def setup():
+        state["engine"] = SQLiteEngine()
+        state["engine"].LoadOuterUnion(OuterUnion(AlignedTables(size)).DataFrame)
+    return setup, lambda: state["engine"].Complement()
+
+def SQLiteSubsumeTuplesBenchmark(size: int):
+    state = {}
+    def setup():
+        table = OuterUnion(AlignedTables(size))
+        table.ReplaceLabeledNulls()
+        state["engine"] = SQLiteEngine()
+        state["frame"] = table.DataFrame
+    return setup, lambda: state["engine"].SubsumeTuples(state["frame"])
+
+def GenerateLabeledNullsBenchmark(size: int):
+    state = {}
+    def setup():
+        state["table"] = AlignedTables(size, table_count=1)[0]
+    return setup, lambda: state["table"].GenerateLabeledNulls()
+
+# ColumnClustering.fit on size column embeddings, spread over tables of 5 columns
+def ColumnClusteringBenchmark(size: int):
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((size, 384)).astype(np.float32)
+    from_table = [column // 5 for column in range(size)]
+    return (lambda: None), (lambda: ColumnClustering(min_clusters=5).fit(embeddings, from_table))
+
+
+# primitive name -> (benchmark, default sizes, whether a run leaves its input unchanged so it can be repeated
+# without a new setup)
+PRIMITIVES = {
+    "outer_union": (OuterUnionBenchmark, [1000, 2000, 4000, 8000], False),
+    "k": (lambda size: TuplePairBenchmark(size, "k"), [4, 8, 16, 32], True),
+    "complement": (ComplementBenchmark, [5, 10, 20, 40], False),
+    "is_subsumed": (lambda size: TuplePairBenchmark(size, "is_subsumed"), [4, 8, 16, 32], True),
+    "subsume_tuples": (SubsumeTuplesBenchmark, [25, 50, 100, 200], False),
+    "complement_sqlite": (SQLiteComplementBenchmark, [5, 10, 20, 40], False),
+    "subsume_tuples_sqlite": (SQLiteSubsumeTuplesBenchmark, [25, 50, 100, 200], False),
+    "generate_labeled_nulls": (GenerateLabeledNullsBenchmark, [1000, 2000, 4000, 8000], False),
+    "column_clustering": (ColumnClusteringBenchmark, [20, 40, 80, 160], True),
+}
+
+
+# Best time of repeat runs for every size, plus ops/sec and the fitted scaling exponent
+def BenchmarkPrimitive(name: str, sizes: list[int] = None, repeat: int = 5):
+    benchmark, default_sizes, repeatable = PRIMITIVES[name]
+    sizes = sizes or default_sizes
+    measurements = []
+    for size in sizes:
+        setup, run = benchmark(size)
+        timer = timeit.Timer(run, setup)
+        # the primitives log their progress, which would otherwise be timed as well
+        with contextlib.redirect_stdout(io.StringIO()):
+            # fast primitives are run in batches long enough to time reliably
+            number = timer.autorange()[0] if repeatable else 1
+            best = min(timer.repeat(repeat=repeat, number=number)) / number
+        measurements.append({"size": size, "seconds": best, "ops_per_second": 1 / best if best > 0 else float('inf')})
+
+    exponent = None
+    if len(sizes) > 1:
+        exponent = float(np.polyfit(np.log(sizes), np.log([m["seconds"] for m in measurements]), deg=1)[0])
+    return {"primitive": name, "measurements": measurements, "scaling_exponent": exponent}
+
+
+def Main(argv):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the ALITE table primitives.")
+    parser.add_argument("--primitives", nargs="+", choices=list(PRIMITIVES), default=list(PRIMITIVES))
+    parser.add_argument("--sizes", nargs="+", type=int, help="input sizes (default: per primitive)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per size, the best one is reported")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in args.primitives:
+        result = BenchmarkPrimitive(name, args.sizes, args.repeat)
+        results.append(result)
+        for measurement in result["measurements"]:
+            print(f"{name:24} size {measurement['size']:6}: {measurement['seconds'] * 1000:10.3f} ms "
+                  f"({measurement['ops_per_second']:.1f} ops/sec)")
+        if result["scaling_exponent"] is not None:
+            print(f"{name:24} scaling exponent: {result['scaling_exponent']:.2f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(Main(sys.argv[1:]))
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+
+# MinHash signatures of sets of column values. The fraction of positions where two signatures agree is an
+# unbiased estimate of the Jaccard similarity of the two value sets. Values are hashed through their string
+# representation with pandas' stable hash, so signatures are the same across processes and runs
+
+DEFAULT_PERMUTATIONS = 128
+CHUNK_SIZE = 8192
+
+
+def HashValues(values):
+    strings = np.asarray([str(value) for value in values], dtype=object)
+    return pd.util.hash_array(strings, categorize=False)
+
+
+# Seeds and odd multipliers of the num_perm hash functions, each applied as a multiply-xorshift mix of the value hash
+def HashFunctions(num_perm: int = DEFAULT_PERMUTATIONS, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    seeds = rng.integers(0, np.iinfo(np.uint64).max, size=num_perm, dtype=np.uint64, endpoint=True)
+    multipliers = rng.integers(0, np.iinfo(np.uint64).max, size=num_perm, dtype=np.uint64, endpoint=True) | np.uint64(1)
+    return seeds, multipliers
+
+
+# MinHash signature of the distinct non-null values, as num_perm unsigned 64-bit integers. An empty set has
+# the maximum value in every position
+def MinHash(values, num_perm: int = DEFAULT_PERMUTATIONS, seed: int = 0):
+    values = pd.unique(pd.Series(values, dtype=object).dropna())
+    signature = np.full(num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+    seeds, multipliers = HashFunctions(num_perm, seed)
+    # in chunks, which bounds the memory for columns with many distinct values
+    for start in range(0, len(values), CHUNK_SIZE):
+        hashes = HashValues(values[start:start + CHUNK_SIZE])[:, None] ^ seeds[None, :]
+        # integer overflow is the intended modulo 2^64 arithmetic here
+        with np.errstate(over='ignore'):
+            hashes = hashes * multipliers[None, :]
+        hashes ^= hashes >> np.uint64(29)
+        np.minimum(signature, hashes.min(axis=0), out=signature)
+    return signature
+
+
+def EstimateJaccard(signature: np.ndarray, other_signature: np.ndarray):
+    return float(np.mean(signature == other_signature))
+
+
+# Estimated fraction of the first value set that is contained in the second, from the Jaccard similarity J of
+# their signatures and the set sizes: |A n B| = J (|A| + |B|) / (1 + J)
+def EstimateContainment(signature: np.ndarray, size: int, other_signature: np.ndarray, other_size: int):
+    if size == 0:
+        return 0.0
+    jaccard = EstimateJaccard(signature, other_signature)
+    return min(1.0, jaccard * (size + other_size) / (1 + jaccard) / size)
+
+
+# Locality-sensitive hashing index over MinHash signatures. Signatures are split into bands of rows, and two
+# signatures become candidates if they agree on all rows of at least one band, which happens with probability
+# 1 - (1 - J^rows)^bands. With the defaults (32 bands of 4 rows), pairs with a Jaccard similarity of 0.3 are
+# found with probability 0.23, pairs of 0.5 with 0.87 and pairs above 0.7 almost always, while dissimilar pairs
+# are rarely compared at all
+class LSHIndex:
+    def __init__(self, num_perm: int = DEFAULT_PERMUTATIONS, bands: int = 32):
+        self.Bands = bands
+        self.Rows = num_perm // bands
+        self.Buckets: list[dict[bytes, list]] = [{} for _ in range(bands)]
+
+    def BandKeys(self, signature: np.ndarray):
+        return [signature[band * self.Rows:(band + 1) * self.Rows].tobytes() for band in range(self.Bands)]
+
+    def Insert(self, key, signature: np.ndarray):
+        for buckets, band_key in zip(self.Buckets, self.BandKeys(signature)):
+            buckets.setdefault(band_key, []).append(key)
+
+    def Query(self, signature: np.ndarray):
+        candidates = set()
+        for buckets, band_key in zip(self.Buckets, self.BandKeys(signature)):
+            candidates.update(buckets.get(band_key, []))
+        return candidates
+
+    # All pairs of inserted keys that share a bucket in some band
+    def CandidatePairs(self):
+        pairs = set()
+        for buckets in self.Buckets:
+            for keys in buckets.values():
+                for i in range(len(keys)):
+                    for j in range(i + 1, len(keys)):
+                        pairs.add((keys[i], keys[j]))
+        return pairs
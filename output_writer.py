@@ -0,0 +1,39 @@
+import queue
+import threading
+
+
+# Runs write tasks (stage outputs and checkpoints) on a background thread, in the order they were submitted,
+# so that serializing a stage overlaps with computing the next one. Callers must pass a snapshot of anything
+# that may still change. At most max_pending writes are queued, which bounds the memory held by snapshots.
+# A failed write does not stop the writes after it; Wait re-raises the first error once all of them are done
+class BackgroundWriter:
+    def __init__(self, max_pending: int = 2):
+        self.Pending: queue.Queue = queue.Queue(maxsize=max_pending)
+        self.Errors: list[Exception] = []
+        # not a daemon thread, so the interpreter waits for outstanding writes before exiting
+        self.Thread = threading.Thread(target=self.Run, name="ALITE output writer")
+        self.Thread.start()
+
+    def Submit(self, write_func, *args):
+        self.Pending.put((write_func, args))
+
+    def Run(self):
+        while True:
+            task = self.Pending.get()
+            if task is None:
+                return
+            write_func, args = task
+            try:
+                write_func(*args)
+            except Exception as error:
+                print(f"Background write failed: {error}")
+                self.Errors.append(error)
+
+    # Stop accepting work, the thread exits once everything submitted so far has been written
+    def Close(self):
+        self.Pending.put(None)
+
+    def Wait(self):
+        self.Thread.join()
+        if self.Errors:
+            raise self.Errors[0]
@@ -0,0 +1,173 @@
+import time
+import queue
+import threading
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from table import RelationalTable
+from column_signature import SignatureDimension
+
+# Marks the end of the items in a queue
+END_OF_QUEUE = object()
+
+
+# Bounded queue between two pipeline stages that records how full it was and how long each side waited: a
+# producer stalls when the queue is full (the consumer is the bottleneck), and a consumer stalls when it is
+# empty (the producer is the bottleneck). Each queue has one producer and one consumer
+class MeasuredQueue:
+    def __init__(self, name: str, maxsize: int, stop: threading.Event):
+        self.Name = name
+        self.Queue = queue.Queue(maxsize)
+        self.Stop = stop
+        self.Items: int = 0
+        self.MaxDepth: int = 0
+        self.PutStall: float = 0.0
+        self.GetStall: float = 0.0
+        self._depth_total = 0
+        self._depth_samples = 0
+        self._lock = threading.Lock()
+
+    def RecordDepth(self):
+        depth = self.Queue.qsize()
+        with self._lock:
+            self.MaxDepth = max(self.MaxDepth, depth)
+            self._depth_total += depth
+            self._depth_samples += 1
+
+    # Returns False if the pipeline was stopped while waiting for space
+    def Put(self, item):
+        start = time.perf_counter()
+        while True:
+            try:
+                self.Queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                if self.Stop.is_set():
+                    return False
+        self.PutStall += time.perf_counter() - start
+        if item is not END_OF_QUEUE:
+            self.Items += 1
+        self.RecordDepth()
+        return True
+
+    def Get(self):
+        start = time.perf_counter()
+        item = self.Queue.get()
+        self.GetStall += time.perf_counter() - start
+        self.RecordDepth()
+        return item
+
+    def Statistics(self):
+        return {
+            "Items": self.Items,
+            "Capacity": self.Queue.maxsize,
+            "MaxDepth": self.MaxDepth,
+            "MeanDepth": self._depth_total / self._depth_samples if self._depth_samples else 0.0,
+            "PutStall": self.PutStall,
+            "GetStall": self.GetStall,
+        }
+
+
+# Loads tables and embeds their columns for AssignIntegrationIDs as a pipeline of three stages connected by
+# bounded queues, so that reading and parsing the files, taking the column samples and running the embedding
+# model overlap instead of taking turns:
+#   load:   a thread reads the CSV files into tables (tables that are already loaded are passed on as they are)
+#   sample: a thread assigns the integration IDs of every table in order and takes the column values to embed
+#   embed:  the calling thread embeds the values of one table per batch, into a block of rows per table
+# With column features "signature", the embed stage computes the column signatures instead and the sample stage
+# only assigns integration IDs. The queue statistics and the busy time of each stage tell which stage held the
+# others up
+class AlignmentPipeline:
+    def __init__(self, transformer: SentenceTransformer, column_features: str = "values", queue_size: int = 4):
+        self.Transformer = transformer
+        self.ColumnFeatures = column_features
+        self.Stop = threading.Event()
+        self.LoadQueue = MeasuredQueue("Load", queue_size, self.Stop)
+        self.SampleQueue = MeasuredQueue("Sample", queue_size, self.Stop)
+        # time each stage spent working (not waiting on a queue), and the wall time of the whole pipeline
+        self.BusyTimes: dict[str, float] = {"Load": 0.0, "Sample": 0.0, "Embed": 0.0}
+        self.WallTime: float = 0.0
+
+    # Run a stage on its own thread, passing any error on to the next stage instead of the items
+    def StartStage(self, name: str, work, output: MeasuredQueue):
+        def run():
+            try:
+                work()
+            except BaseException as error:
+                output.Put(error)
+                return
+            output.Put(END_OF_QUEUE)
+        thread = threading.Thread(target=run, name=f"AlignmentPipeline {name}", daemon=True)
+        thread.start()
+        return thread
+
+    # Items of a queue until its end, re-raising an error of the stage before it
+    @staticmethod
+    def Items(input_queue: MeasuredQueue):
+        while True:
+            item = input_queue.Get()
+            if item is END_OF_QUEUE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    # Sources are loaded tables or CSV file paths, which are loaded like RelationalDatabase.LoadFromFolder.
+    # Returns the tables in order, and the column embeddings of each table as a block of rows
+    def Run(self, sources: list, lazy: bool = False, sketch: bool = False, storage: str = "object"):
+        def load():
+            for source in sources:
+                if self.Stop.is_set():
+                    return
+                start = time.perf_counter()
+                table = source
+                if not isinstance(source, RelationalTable):
+                    print(f"Loading data from file {source} into relational table")
+                    table = RelationalTable()
+                    table.LoadFromCSV(source, lazy=lazy, sketch=sketch, storage=storage)
+                self.BusyTimes["Load"] += time.perf_counter() - start
+                if not self.LoadQueue.Put(table):
+                    return
+
+        def sample():
+            offset = 0
+            for table in self.Items(self.LoadQueue):
+                start = time.perf_counter()
+                offset = table.InitializeIntegrationIDs(offset)
+                column_values = table.SampleColumnValues() if self.ColumnFeatures != "signature" else None
+                self.BusyTimes["Sample"] += time.perf_counter() - start
+                if not self.SampleQueue.Put((table, column_values)):
+                    return
+
+        start_time = time.perf_counter()
+        threads = [self.StartStage("load", load, self.LoadQueue), self.StartStage("sample", sample, self.SampleQueue)]
+        tables = []
+        blocks = []
+        embedding_dimension = self.Transformer.get_sentence_embedding_dimension()
+        try:
+            for table, column_values in self.Items(self.SampleQueue):
+                start = time.perf_counter()
+                print(f"Initializing table {len(tables)}")
+                column_count = len(table.IntegrationIDToColumnIndex)
+                if self.ColumnFeatures == "signature":
+                    block = np.empty((column_count, SignatureDimension(embedding_dimension)), dtype=np.float32)
+                    table.InitializeColumnSignatures(self.Transformer, out=block)
+                else:
+                    block = np.empty((column_count, embedding_dimension), dtype=np.float32)
+                    table.EmbedColumnValues(self.Transformer, column_values, out=block)
+                tables.append(table)
+                blocks.append(block)
+                self.BusyTimes["Embed"] += time.perf_counter() - start
+        finally:
+            # stop the other stages if embedding failed
+            self.Stop.set()
+            for thread in threads:
+                thread.join()
+            self.WallTime = time.perf_counter() - start_time
+        return tables, blocks
+
+    def Statistics(self):
+        return {
+            "WallTime": self.WallTime,
+            "BusyTimes": dict(self.BusyTimes),
+            "Queues": {input_queue.Name: input_queue.Statistics() for input_queue in [self.LoadQueue, self.SampleQueue]},
+        }
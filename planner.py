@@ -0,0 +1,137 @@
+from table import RelationalTable
+
+
+# One step of an integration plan: the full disjunction of the tables integrated so far (if any) with the
+# tables of the step, joined on the shared aligned columns, with the estimated size and cost of the step
+class PlanStep:
+    def __init__(self, table_indices: list[int], shared_columns: list[str], input_tuples: int,
+                 estimated_tuples: float, estimated_cost: float):
+        self.TableIndices: list[int] = table_indices
+        self.SharedColumns: list[str] = shared_columns
+        self.InputTuples: int = input_tuples
+        self.EstimatedTuples: float = estimated_tuples
+        self.EstimatedCost: float = estimated_cost
+
+
+# Size and distinct value counts of a table, or estimates of them for an intermediate result
+class TableStatistics:
+    def __init__(self, tuple_count: float, distinct_counts: dict[str, float]):
+        self.TupleCount: float = tuple_count
+        self.DistinctCounts: dict[str, float] = distinct_counts
+
+
+# Plans the full disjunction of aligned tables as a sequence of pairwise integrations instead of one outer union
+# of all tables. Tables are connected when they share aligned columns (integration IDs), and the plan greedily
+# starts from the cheapest connected pair and keeps adding the connected table whose step is cheapest; tables
+# without any connection come last. Sizes are estimated from distinct value counts of the most selective shared
+# column (shared columns of integrated tables tend to be correlated, so they are not treated as independent),
+# assuming the values of the side with fewer distinct values are contained in the other. The cost of a step
+# is the number of tuple pairs compared by complementation, which compares the result so far and the step's
+# tuples with the tuples of all tables integrated so far (see RelationalDatabase.RunIntegrationPlan), and by
+# subsumption, which is quadratic in the output
+class IntegrationPlanner:
+    def __init__(self, tables: list[RelationalTable]):
+        self.Tables = tables
+        self.Statistics: list[TableStatistics] = [
+            TableStatistics(table.TupleCount(), {str(column): max(1, table.DataFrame[column].nunique()) for column in table.DataFrame.columns})
+            for table in tables
+        ]
+
+    # Shared columns of every pair of tables (i, j) with i < j that share any
+    def ConnectivityGraph(self):
+        edges = {}
+        for i in range(len(self.Tables)):
+            for j in range(i + 1, len(self.Tables)):
+                shared = sorted(self.Statistics[i].DistinctCounts.keys() & self.Statistics[j].DistinctCounts.keys())
+                if shared:
+                    edges[(i, j)] = shared
+        return edges
+
+    # Estimated statistics of the full disjunction of two inputs, and the cost of computing it when the tables
+    # integrated so far have the given number of tuples (by default the two inputs are tables)
+    def EstimateIntegration(self, left: TableStatistics, right: TableStatistics, integrated_tuples: float = None):
+        shared = left.DistinctCounts.keys() & right.DistinctCounts.keys()
+        if shared:
+            column = max(shared, key=lambda column: max(left.DistinctCounts[column], right.DistinctCounts[column]))
+            left_distinct, right_distinct = left.DistinctCounts[column], right.DistinctCounts[column]
+            join = left.TupleCount * right.TupleCount / max(left_distinct, right_distinct)
+            left_matched = min(1.0, right_distinct / left_distinct)
+            right_matched = min(1.0, left_distinct / right_distinct)
+            # tuples without a join partner are kept on their own
+            tuple_count = join + left.TupleCount * (1 - left_matched) + right.TupleCount * (1 - right_matched)
+        else:
+            # tuples without shared columns all complement each other
+            tuple_count = left.TupleCount * right.TupleCount
+        tuple_count = max(tuple_count, left.TupleCount, right.TupleCount)
+
+        distinct_counts = {}
+        for column in left.DistinctCounts.keys() | right.DistinctCounts.keys():
+            distinct = max(left.DistinctCounts.get(column, 1), right.DistinctCounts.get(column, 1))
+            distinct_counts[column] = min(distinct, tuple_count)
+        if integrated_tuples is None:
+            integrated_tuples = left.TupleCount + right.TupleCount
+        cost = (left.TupleCount + right.TupleCount) * integrated_tuples + tuple_count ** 2
+        return TableStatistics(tuple_count, distinct_counts), cost
+
+    def Plan(self):
+        if not self.Tables:
+            return []
+        edges = self.ConnectivityGraph()
+        connected = lambda i, done: any(tuple(sorted((i, j))) in edges for j in done)
+
+        # first step: the cheapest connected pair, or just the smallest table
+        first_step = None
+        for (i, j) in edges:
+            statistics, cost = self.EstimateIntegration(self.Statistics[i], self.Statistics[j])
+            if first_step is None or cost < first_step[2]:
+                first_step = ([i, j], statistics, cost)
+        if first_step is None:
+            smallest = min(range(len(self.Tables)), key=lambda i: self.Statistics[i].TupleCount)
+            first_step = ([smallest], self.Statistics[smallest], 0.0)
+
+        table_indices, current, cost = first_step
+        done = set(table_indices)
+        shared = edges.get(tuple(sorted(table_indices)), [])
+        input_tuples = sum(self.Statistics[i].TupleCount for i in table_indices)
+        integrated_tuples = input_tuples
+        plan = [PlanStep(table_indices, shared, input_tuples, current.TupleCount, cost)]
+
+        while len(done) < len(self.Tables):
+            remaining = [i for i in range(len(self.Tables)) if i not in done]
+            # prefer connected tables, cartesian steps come last
+            candidates = [i for i in remaining if connected(i, done)] or remaining
+            best = None
+            for i in candidates:
+                statistics, cost = self.EstimateIntegration(current, self.Statistics[i],
+                                                            integrated_tuples + self.Statistics[i].TupleCount)
+                if best is None or cost < best[2]:
+                    best = (i, statistics, cost)
+            i, statistics, cost = best
+            shared = sorted(current.DistinctCounts.keys() & self.Statistics[i].DistinctCounts.keys())
+            plan.append(PlanStep([i], shared, round(current.TupleCount) + self.Statistics[i].TupleCount, statistics.TupleCount, cost))
+            current = statistics
+            integrated_tuples += self.Statistics[i].TupleCount
+            done.add(i)
+        return plan
+
+    # Estimated cost of integrating all tables at once, the way RunALITE does by default
+    def SingleStepCost(self, plan: list[PlanStep]):
+        all_tuples = sum(statistics.TupleCount for statistics in self.Statistics)
+        final_tuples = plan[-1].EstimatedTuples if plan else 0
+        return all_tuples ** 2 + final_tuples ** 2
+
+    def Explain(self, plan: list[PlanStep] = None):
+        plan = self.Plan() if plan is None else plan
+        describe = lambda i: f"T{i} ({self.Tables[i].TableName}, {self.Statistics[i].TupleCount} tuples)"
+        lines = [f"Integration plan for {len(self.Tables)} tables in {len(plan)} steps:"]
+        for step_number, step in enumerate(plan, start=1):
+            tables = " + ".join(describe(i) for i in step.TableIndices)
+            on = f"on columns {step.SharedColumns}" if step.SharedColumns else "without shared columns (cartesian)"
+            prefix = "" if step_number == 1 else "result + "
+            lines.append(f"  {step_number}. {prefix}{tables} {on}: {step.InputTuples:.0f} input tuples, "
+                         f"~{step.EstimatedTuples:.0f} output tuples, cost ~{step.EstimatedCost:.2e}")
+        pairwise_cost = sum(step.EstimatedCost for step in plan)
+        lines.append(f"Estimated cost: {pairwise_cost:.2e} pairwise, {self.SingleStepCost(plan):.2e} as a single integration")
+        edges = self.ConnectivityGraph()
+        lines.append("Connectivity: " + (", ".join(f"T{i}-T{j} {shared}" for (i, j), shared in edges.items()) or "none"))
+        return "\n".join(lines)
@@ -0,0 +1,70 @@
+import os
+import pstats
+import cProfile
+
+
+# Instrumentation hook that captures a cProfile of every top-level stage of a run and writes it to the
+# output folder as "profile - <stage>.prof", next to "profile - all stages.prof" with the stages combined.
+# The files can be opened with pstats or a viewer such as snakeviz. Nested stages (e.g. complement
+# iterations) are part of their enclosing stage's profile, since only one profiler can be active at a time
+class StageProfiler:
+    def __init__(self, output_folder: str):
+        self.OutputFolder = output_folder
+        self.Profiles: dict[str, str] = {}  # stage name -> profile file
+        self._profiler: cProfile.Profile = None
+        self._record = None
+
+    def StageStarted(self, record):
+        if self._profiler is not None:
+            return
+        self._record = record
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+
+    def StageFinished(self, record):
+        if record is not self._record:
+            return
+        self._profiler.disable()
+        os.makedirs(self.OutputFolder, exist_ok=True)
+        filepath = os.path.join(self.OutputFolder, f"profile - {record.Name}.prof")
+        self._profiler.dump_stats(filepath)
+        self.Profiles[record.Name] = filepath
+        self._profiler = None
+        self._record = None
+
+    # Statistics of all profiled stages together, or None if nothing was profiled
+    def Combined(self):
+        if not self.Profiles:
+            return None
+        return pstats.Stats(*self.Profiles.values())
+
+    # Write the combined profile of all stages and return its path
+    def SaveCombined(self):
+        stats = self.Combined()
+        if stats is None:
+            return None
+        filepath = os.path.join(self.OutputFolder, "profile - all stages.prof")
+        stats.dump_stats(filepath)
+        return filepath
+
+    # The functions with the most time spent in their own code, over all profiled stages
+    def HotFunctions(self, top: int = 10):
+        stats = self.Combined()
+        if stats is None:
+            return []
+        hot_functions = []
+        for (filename, line, function), (_, calls, total_time, cumulative_time, _) in stats.stats.items():
+            hot_functions.append({
+                "function": f"{function} ({os.path.basename(filename)}:{line})",
+                "calls": calls,
+                "total_time": total_time,
+                "cumulative_time": cumulative_time,
+            })
+        hot_functions.sort(key=lambda entry: entry["total_time"], reverse=True)
+        return hot_functions[:top]
+
+    def Summary(self, top: int = 10):
+        lines = [f"{'own time':>10} {'cumulative':>10} {'calls':>9}  function"]
+        for entry in self.HotFunctions(top):
+            lines.append(f"{entry['total_time']:9.3f}s {entry['cumulative_time']:9.3f}s {entry['calls']:9}  {entry['function']}")
+        return "\n".join(lines)
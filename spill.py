@@ -0,0 +1,160 @@
+import os
+import math
+import pandas as pd
+from table import RelationalTable
+from instrumentation import Instrumentation, NoInstrumentation
+
+# Complement and subsumption keep about this many copies of their input in memory at once
+WORKING_COPIES = 4
+
+
+# Out-of-core complementation and subsumption. The tuples are hash-partitioned on one column into partition files
+# in the spill folder, and each partition is processed on its own, so only one partition is in memory at a time;
+# the result of every partition is written back to the spill folder as soon as it is done, and the results are
+# merged once all partitions are processed.
+# Tuples with different values in the partition column never complement (or subsume) each other, so a tuple
+# with a value only depends on its own partition. Tuples without a value in the partition column (the residual)
+# can combine with tuples of any partition, so they are added to every partition, and the results without a
+# value in the partition column are only kept if every partition kept them: such a tuple is either built from
+# residual tuples alone, which happens the same way in every partition, or is a tuple that another partition
+# complements or subsumes. This gives the same tuples as processing everything at once, as long as the residual
+# is small, which is why the column with the fewest missing values is chosen by default.
+# The number of partitions is chosen so that WORKING_COPIES copies of a partition and the residual fit in the
+# memory budget (in bytes). The budget only bounds the working set of complementation and subsumption, not the
+# peak memory of a run: the table is in memory before it is partitioned (e.g. the whole outer union) and after
+# the results are merged, since the next stage needs it. Complementation can also produce many more tuples than
+# it is given, so the budget is a guide for the input size rather than a hard limit
+class SpillPartitioner:
+    def __init__(self, spill_folder: str, memory_budget: int, partition_column: str = None,
+                 instrumentation: Instrumentation = None):
+        self.SpillFolder = spill_folder
+        self.MemoryBudget = memory_budget
+        self.PartitionColumn = partition_column
+        self.Instrumentation = instrumentation
+        # number of partitions and residual tuples of the most recent operation
+        self.PartitionCount: int = 0
+        self.ResidualCount: int = 0
+
+    # Missing values as Complement sees them: NaN, labeled nulls and empty strings
+    @staticmethod
+    def ComplementNulls(column: pd.Series):
+        return column.map(lambda value: pd.isna(value) or isinstance(value, RelationalTable.LabeledNull) or str(value) == '').astype(bool)
+
+    # Missing values as SubsumeTuples sees them
+    @staticmethod
+    def SubsumptionNulls(column: pd.Series):
+        return column.isna()
+
+    # Hashable key of a tuple that compares labeled nulls by their label, since labeled nulls read from different
+    # partition files are different objects
+    @staticmethod
+    def TupleKey(row):
+        return tuple(("LabeledNull", value.idx) if isinstance(value, RelationalTable.LabeledNull)
+                     else None if pd.isna(value) else value for value in row)
+
+    # The column with the fewest missing values, and the most distinct values among those
+    def ChoosePartitionColumn(self, frame: pd.DataFrame, find_nulls):
+        if self.PartitionColumn is not None:
+            return self.PartitionColumn
+        null_counts = {column: int(find_nulls(frame[column]).sum()) for column in frame.columns}
+        return min(frame.columns, key=lambda column: (null_counts[column], -frame[column].nunique()))
+
+    def ChoosePartitionCount(self, frame: pd.DataFrame, residual: pd.DataFrame, distinct_values: int):
+        frame_bytes = frame.memory_usage(deep=True).sum()
+        residual_bytes = residual.memory_usage(deep=True).sum()
+        available = self.MemoryBudget / WORKING_COPIES - residual_bytes
+        if available <= 0:
+            print(f"Warning: the {len(residual)} residual tuples alone exceed the memory budget, using one partition per value")
+            return max(1, distinct_values)
+        return max(1, min(distinct_values, math.ceil((frame_bytes - residual_bytes) / available)))
+
+    # Write the partitions and the residual to the spill folder, returning the partition files and the residual file
+    def WritePartitions(self, frame: pd.DataFrame, column: str, is_null: pd.Series, name: str):
+        os.makedirs(self.SpillFolder, exist_ok=True)
+        residual = frame[is_null]
+        if len(residual):
+            # label the residual's labeled nulls uniquely, so that TupleKey tells them apart
+            labels = iter(range(1, residual.size + 1))
+            residual = residual.map(lambda value: RelationalTable.LabeledNull(next(labels))
+                                    if isinstance(value, RelationalTable.LabeledNull) else value)
+        partitioned = frame[~is_null]
+        values = partitioned[column]
+        self.PartitionCount = self.ChoosePartitionCount(frame, residual, values.nunique())
+        self.ResidualCount = len(residual)
+        print(f"Partitioning {len(frame)} tuples on {column} into {self.PartitionCount} partitions with {len(residual)} residual tuples")
+
+        partition_files = []
+        # Python's hash agrees with equality (e.g. 1 and 1.0), like the comparisons of Complement and SubsumeTuples
+        partition_ids = values.map(lambda value: hash(value) % self.PartitionCount)
+        for partition_id, partition in partitioned.groupby(partition_ids, sort=True):
+            filepath = os.path.join(self.SpillFolder, f"{name} partition {partition_id}.pkl")
+            partition.to_pickle(filepath)
+            partition_files.append(filepath)
+        residual_file = os.path.join(self.SpillFolder, f"{name} residual.pkl")
+        residual.to_pickle(residual_file)
+        return partition_files, residual_file
+
+    # Apply the operation to every partition (with the residual) and merge the results into the table
+    def RunPartitioned(self, table: RelationalTable, name: str, find_nulls, operation):
+        stage = self.Instrumentation.Stage if self.Instrumentation else NoInstrumentation
+        frame = table.DataFrame
+        columns = frame.columns
+        column = self.ChoosePartitionColumn(frame, find_nulls)
+        partition_files, residual_file = self.WritePartitions(frame, column, find_nulls(frame[column]), name)
+        # only the partition being processed stays in memory
+        del frame
+        table.DataFrame = pd.DataFrame(columns=columns)
+
+        result_files = []
+        residual_results = None
+        residual_keys = None
+        for partition_index, partition_file in enumerate(partition_files or [None]):
+            with stage(f"{name} partition {partition_index}") as record:
+                partition_table = RelationalTable()
+                partition_table.Storage = table.Storage
+                frames = [pd.read_pickle(partition_file)] if partition_file else []
+                partition_table.DataFrame = pd.concat(frames + [pd.read_pickle(residual_file)], ignore_index=True)
+                record.Count("input", partition_table.TupleCount())
+                operation(partition_table)
+                result = partition_table.DataFrame
+                record.Count("output", len(result))
+
+                is_null = find_nulls(result[column])
+                result_file = os.path.join(self.SpillFolder, f"{name} result {partition_index}.pkl")
+                result[~is_null].to_pickle(result_file)
+                result_files.append(result_file)
+                keys = {self.TupleKey(row) for row in result[is_null].itertuples(index=False)}
+                if residual_results is None:
+                    residual_results, residual_keys = result[is_null], keys
+                else:
+                    residual_keys &= keys
+            if partition_file:
+                os.remove(partition_file)
+            del partition_table, result
+        os.remove(residual_file)
+
+        # residual results in every partition, once each
+        kept = set()
+        keep = []
+        for row in residual_results.itertuples(index=False):
+            key = self.TupleKey(row)
+            keep.append(key in residual_keys and key not in kept)
+            kept.add(key)
+        # read back one result file at a time, each is removed as soon as it is read
+        results = []
+        for result_file in result_files:
+            results.append(pd.read_pickle(result_file))
+            os.remove(result_file)
+        results.append(residual_results[keep])
+        table.DataFrame = pd.concat(results, ignore_index=True)[columns]
+
+    # Complement the table partition by partition. The complement function complements a table in place, e.g.
+    # RelationalDatabase.ComplementTable or RelationalTable.Complement
+    def Complement(self, table: RelationalTable, complement=None):
+        complement = complement or (lambda partition_table: partition_table.Complement(self.Instrumentation))
+        self.RunPartitioned(table, "Complement", self.ComplementNulls, complement)
+
+    def SubsumeTuples(self, table: RelationalTable):
+        original_row_count = table.TupleCount()
+        self.RunPartitioned(table, "Subsumption", self.SubsumptionNulls, lambda partition_table: partition_table.SubsumeTuples())
+        print(f"Subsumed tuples over all partitions: {original_row_count - table.TupleCount()}")
@@ -0,0 +1,194 @@
+import os
+import sqlite3
+import pandas as pd
+from table import RelationalTable
+from instrumentation import Instrumentation, NoInstrumentation
+from budget import ExecutionBudget
+
+
+# Executes the outer union, the complement fixpoint and subsumption of ALITE as SQL on an embedded SQLite
+# database, instead of the row loops of RelationalTable. The aligned tables are loaded once and the
+# intermediate results stay in the database, and are only read back as DataFrames for the stage outputs.
+# With a database file, SQLite keeps only its page cache in memory and spills everything else to the file.
+# The tuples are the same as with RelationalTable (up to row order), with these representations:
+#   - labeled nulls are NULL, and the outer union's empty strings stay empty strings, so that like in
+#     RelationalTable.k both count as missing for complementation, while only NULL does for subsumption
+#   - tuples of the outer union that have labeled nulls get a unique gid, since labeled nulls never equal
+#     anything but themselves: such a tuple only equals itself, while tuples without labeled nulls (gid NULL)
+#     compare by value
+#   - complemented tuples have NULL where both tuples were missing a value, like pd.NA in RelationalTable
+class SQLiteEngine:
+    def __init__(self, database_file: str = ":memory:", instrumentation: Instrumentation = None):
+        self.DatabaseFile = database_file
+        self.Connection = sqlite3.connect(database_file)
+        # the database only holds intermediate results, so durability is not needed
+        self.Connection.execute("PRAGMA journal_mode = OFF")
+        self.Connection.execute("PRAGMA synchronous = OFF")
+        self.Connection.execute(f"PRAGMA threads = {os.cpu_count() or 1}")
+        self.Instrumentation = instrumentation
+        # columns of the full disjunction in order, stored as c0, c1, ... in SQL
+        self.Columns: list = []
+        # tables that currently hold data: the loaded tables, "outer_union" and "complement"
+        self.Loaded: set[str] = set()
+        self.TableCount: int = 0
+
+    def Close(self):
+        self.Connection.close()
+        if self.DatabaseFile != ":memory:" and os.path.exists(self.DatabaseFile):
+            os.remove(self.DatabaseFile)
+
+    # Value as stored in SQL: labeled nulls and NaN become NULL, and values SQLite cannot store become strings
+    @staticmethod
+    def SQLValue(value):
+        if isinstance(value, RelationalTable.LabeledNull):
+            return None
+        if isinstance(value, (str, bytes)):
+            return value
+        if pd.isna(value):
+            return None
+        if isinstance(value, (bool, int, float)):
+            return value
+        return str(value)
+
+    @staticmethod
+    def SQLRows(frame: pd.DataFrame):
+        return [tuple(SQLiteEngine.SQLValue(value) for value in row)
+                for row in frame.astype(object).itertuples(index=False, name=None)]
+
+    def SQLColumns(self, prefix: str = ""):
+        return [f"{prefix}c{index}" for index in range(len(self.Columns))]
+
+    def ReadFrame(self, query: str):
+        rows = self.Connection.execute(query).fetchall()
+        return pd.DataFrame(rows, columns=self.Columns, dtype=object) if rows else pd.DataFrame(columns=self.Columns)
+
+    def CreateTable(self, name: str, columns: list[str], rows: list[tuple]):
+        self.Connection.execute(f"DROP TABLE IF EXISTS {name}")
+        # value columns are declared without a type, so SQLite keeps every value as it was inserted
+        self.Connection.execute(f"CREATE TABLE {name} ({', '.join(columns)})")
+        if rows:
+            placeholders = ", ".join("?" * len(columns))
+            self.Connection.executemany(f"INSERT INTO {name} VALUES ({placeholders})", rows)
+        self.Loaded.add(name)
+
+    # Load the aligned tables in the order of the outer union. Like RelationalTable.OuterUnionWith, tables
+    # without tuples are left out, and the columns are ordered by name
+    def LoadTables(self, tables: list[RelationalTable]):
+        frames = [table.DataFrame for table in tables if not table.DataFrame.empty]
+        self.Columns = sorted({column for frame in frames for column in frame.columns})
+        position = {column: index for index, column in enumerate(self.Columns)}
+        for table_index, frame in enumerate(frames):
+            self.CreateTable(f"table_{table_index}", [f"c{position[column]}" for column in frame.columns], self.SQLRows(frame))
+        self.TableCount = len(frames)
+
+    # Outer union of the loaded tables, with empty strings in the columns a table does not have. Returns the
+    # tuples as a DataFrame with None for missing values, for RelationalTable.GenerateLabeledNulls
+    def OuterUnion(self):
+        selects = []
+        for table_index in range(self.TableCount):
+            table_columns = {row[1] for row in self.Connection.execute(f"PRAGMA table_info(table_{table_index})")}
+            values = ", ".join(column if column in table_columns else f"'' AS {column}" for column in self.SQLColumns())
+            selects.append(f"SELECT {values} FROM table_{table_index}")
+        self.Connection.execute("DROP TABLE IF EXISTS outer_union")
+        self.Connection.execute(f"CREATE TABLE outer_union (gid INTEGER, {', '.join(self.SQLColumns())})")
+        if selects:
+            self.Connection.execute(f"INSERT INTO outer_union SELECT NULL, * FROM ({' UNION ALL '.join(selects)})")
+        self.SetTupleIdentities("outer_union")
+        self.Loaded.add("outer_union")
+        return self.ReadFrame(f"SELECT {', '.join(self.SQLColumns())} FROM outer_union ORDER BY rowid")
+
+    # Load an outer union that was computed elsewhere (e.g. restored from a checkpoint)
+    def LoadOuterUnion(self, frame: pd.DataFrame):
+        self.Columns = list(frame.columns)
+        self.CreateTable("outer_union", ["gid INTEGER"] + self.SQLColumns(), [(None,) + row for row in self.SQLRows(frame)])
+        self.SetTupleIdentities("outer_union")
+
+    def SetTupleIdentities(self, name: str):
+        has_labeled_nulls = " OR ".join(f"{column} IS NULL" for column in self.SQLColumns()) or "0"
+        self.Connection.execute(f"UPDATE {name} SET gid = rowid WHERE {has_labeled_nulls}")
+
+    # SQL conditions of RelationalTable.Complement for tuples t1 and t2: whether t1.equals(t2), whether k
+    # complements them, and the values of the complemented tuple
+    def ComplementExpressions(self):
+        columns = self.SQLColumns()
+        missing = lambda tuple_name, column: f"({tuple_name}.{column} IS NULL OR {tuple_name}.{column} = '')"
+        same_values = " AND ".join(f"t1.{column} IS t2.{column}" for column in columns) or "1"
+        equal = f"((t2.gid IS NOT NULL AND t1.gid IS t2.gid) OR (t2.gid IS NULL AND t1.gid IS NULL AND {same_values}))"
+        compatible = " AND ".join(f"({missing('t1', column)} OR {missing('t2', column)} OR t1.{column} = t2.{column})"
+                                  for column in columns) or "1"
+        merged = ", ".join(f"CASE WHEN NOT {missing('t1', column)} THEN t1.{column} "
+                           f"WHEN NOT {missing('t2', column)} THEN t2.{column} END AS {column}" for column in columns)
+        return equal, compatible, merged
+
+    # Complement the outer union until a fixpoint is reached. If the outer union is not in the database yet, it
+    # is loaded from the frame. Returns the complemented tuples, with None for missing values. With a budget,
+    # no new iteration is started once it is used up (see RelationalTable.Complement)
+    def Complement(self, frame: pd.DataFrame = None, budget: ExecutionBudget = None):
+        stage = self.Instrumentation.Stage if self.Instrumentation else NoInstrumentation
+        if "outer_union" not in self.Loaded:
+            self.LoadOuterUnion(frame)
+        columns = ", ".join(self.SQLColumns())
+        equal, compatible, merged = self.ComplementExpressions()
+        partners = f"{compatible} AND NOT {equal}"
+
+        self.Connection.execute("DROP TABLE IF EXISTS complement")
+        self.Connection.execute(f"CREATE TABLE complement AS SELECT gid, {columns} FROM outer_union")
+        outer_union_count = self.Count("outer_union")
+        i = 0
+        changed = True
+        while changed:
+            if budget and budget.Exhausted():
+                tuple_count = self.Count("complement")
+                print(f"Budget used up after {i} complement iterations")
+                budget.Interrupted(tuple_count, tuple_count * outer_union_count)
+                break
+            with stage(f"Complement iteration {i}") as iteration_record:
+                print(f"Iter: {i}")
+                input_count = self.Count("complement")
+                if budget:
+                    budget.ReportProgress(i, input_count)
+                i += 1
+                # every tuple is replaced by its complements with all tuples of the outer union, or kept if
+                # it has none
+                self.Connection.execute("DROP TABLE IF EXISTS complement_new")
+                self.Connection.execute(f"""
+                    CREATE TABLE complement_new AS SELECT DISTINCT * FROM (
+                        SELECT NULL AS gid, {merged} FROM complement t1 JOIN outer_union t2 ON {partners}
+                        UNION ALL
+                        SELECT t1.gid, {', '.join(self.SQLColumns('t1.'))} FROM complement t1
+                        WHERE NOT EXISTS (SELECT 1 FROM outer_union t2 WHERE {partners}))""")
+                changed = self.Connection.execute(
+                    "SELECT EXISTS (SELECT * FROM complement EXCEPT SELECT * FROM complement_new) "
+                    "OR EXISTS (SELECT * FROM complement_new EXCEPT SELECT * FROM complement)").fetchone()[0]
+                iteration_record.Count("input", input_count)
+                self.Connection.execute("DROP TABLE complement")
+                self.Connection.execute("ALTER TABLE complement_new RENAME TO complement")
+                iteration_record.Count("output", self.Count("complement"))
+                if budget:
+                    budget.Charge(input_count * outer_union_count)
+                    budget.IterationFinished()
+        self.Loaded.add("complement")
+        print("Complement operation performed.")
+        return self.ReadFrame(f"SELECT {columns} FROM complement ORDER BY rowid")
+
+    # Remove subsumed tuples like RelationalTable.SubsumeTuples: a tuple is removed if another tuple has all of
+    # its values and more, or is identical and comes first. Subsumes the complemented tuples in the database,
+    # or the frame if there are none
+    def SubsumeTuples(self, frame: pd.DataFrame = None):
+        if "complement" not in self.Loaded:
+            self.Columns = list(frame.columns)
+            self.CreateTable("complement", ["gid INTEGER"] + self.SQLColumns(), [(None,) + row for row in self.SQLRows(frame)])
+        columns = self.SQLColumns()
+        subsumes = " AND ".join(f"(t2.{column} IS NULL OR t1.{column} = t2.{column})" for column in columns) or "1"
+        has_more = " OR ".join(f"(t1.{column} IS NOT NULL AND t2.{column} IS NULL)" for column in columns) or "0"
+        original_row_count = self.Count("complement")
+        result = self.ReadFrame(f"""
+            SELECT {', '.join(columns)} FROM complement t2 WHERE NOT EXISTS (
+                SELECT 1 FROM complement t1
+                WHERE t1.rowid <> t2.rowid AND {subsumes} AND ({has_more} OR t1.rowid < t2.rowid))
+            ORDER BY t2.rowid""")
+        print(f"Subsumed tuples: {original_row_count - len(result)}")
+        return result
+
+    def Count(self, name: str):
+        return self.Connection.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
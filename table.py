@@ -3,16 +3,49 @@ import numpy as np
 from sentence_transformers import SentenceTransformer
 import os
 import datetime
+import json
+from instrumentation import Instrumentation, NoInstrumentation
+from budget import ExecutionBudget
+from column_signature import HEADER_WEIGHT, SignatureDimension, ValueFeatures
+from minhash import DEFAULT_PERMUTATIONS, MinHash
 
+# Storage options of RelationalTable (see RelationalTable.Storage), with the pandas dtype_backend of each
+STORAGE_BACKENDS = {"object": None, "nullable": "numpy_nullable", "arrow": "pyarrow"}
 
 class RelationalTable:
     def __init__(self):
         self.IntegrationIDToColumnIndex: dict[int, int] = {}
+        self.SampleFrame: pd.DataFrame = None   # only set while the table is loaded lazily
+        self.SourceFile: str = None
+        self.PendingColumnRenames: dict[str, str] = {}
+        # MinHash sketch of the values of each column (one row per column, in column order) and the number of
+        # distinct values per column, computed on demand and dropped whenever the table data is replaced
+        self.ValueSketch: np.ndarray = None
+        self.DistinctCounts: np.ndarray = None
         self.DataFrame: pd.DataFrame = pd.DataFrame()
         self.labeled_null_counter = 0  # Counter to track unique labeled nulls
         self.ColumnEmbeddings: dict[int, np.ndarray] = {}
         self.ColumnNames: dict[int|str, str] = {}
         self.TableName: str = None
+        # "object" keeps missing values as labeled nulls and empty strings in object columns. "nullable" and
+        # "arrow" keep the native type of every column and its missing values in a validity mask, as pandas
+        # nullable dtypes or as pyarrow-backed ArrowDtype columns (which requires pyarrow). A missing value then
+        # acts as a labeled null of its own, and the columns a table lacks in an outer union are missing too
+        self.Storage: str = "object"
+
+    # Full table data, which is read from the source file on first access if the table was loaded lazily
+    @property
+    def DataFrame(self) -> pd.DataFrame:
+        if self.SampleFrame is not None:
+            self.LoadFullTable()
+        return self._DataFrame
+
+    @DataFrame.setter
+    def DataFrame(self, frame: pd.DataFrame):
+        self._DataFrame = frame
+        self.SampleFrame = None
+        self.ValueSketch = None
+        self.DistinctCounts = None
 
 
     # Save attributes to file (including table)
@@ -63,66 +96,250 @@ class RelationalTable:
 
         print(f"Metadata and attributes saved to {result_filename}")
 
-    # Load CSV data into the DataFrame
-    def LoadFromCSV(self, csv_file: str):
+    # Save a lossless binary snapshot of the table into a folder. The table data is pickled column block by
+    # column block, which keeps dtypes and labeled nulls intact, the embeddings are stored as one .npy matrix,
+    # and the remaining attributes are written as JSON. A lazily loaded table stays lazy in its snapshot
+    def SaveSnapshot(self, snapshot_folder: str):
+        os.makedirs(snapshot_folder, exist_ok=True)
+        metadata = {
+            "TableName": self.TableName,
+            "SourceFile": self.SourceFile,
+            "Lazy": not self.IsLoaded(),
+            "PendingColumnRenames": self.PendingColumnRenames,
+            # stored as pairs so integer and string keys survive the round trip
+            "ColumnNames": [[key, name] for key, name in self.ColumnNames.items()],
+            "IntegrationIDToColumnIndex": [[integrationID, index] for integrationID, index in self.IntegrationIDToColumnIndex.items()],
+            "LabeledNullCounter": self.labeled_null_counter,
+            "Storage": self.Storage,
+            "EmbeddingIDs": list(self.ColumnEmbeddings.keys()),
+        }
+
+        if self.IsLoaded():
+            self.DataFrame.to_pickle(os.path.join(snapshot_folder, "table.pkl"))
+        else:
+            self.SampleFrame.to_pickle(os.path.join(snapshot_folder, "sample.pkl"))
+        if self.ColumnEmbeddings:
+            embeddings = np.stack(list(self.ColumnEmbeddings.values()))
+            np.save(os.path.join(snapshot_folder, "embeddings.npy"), embeddings)
+        with open(os.path.join(snapshot_folder, "metadata.json"), 'w', encoding='utf-8') as metadata_file:
+            json.dump(metadata, metadata_file)
+        print(f"Table snapshot saved to {snapshot_folder}")
+
+    # Restore a table saved with SaveSnapshot. Embeddings are memory-mapped rather than read into memory
+    def LoadFromSnapshot(self, snapshot_folder: str, mmap_embeddings: bool = True):
+        with open(os.path.join(snapshot_folder, "metadata.json"), 'r', encoding='utf-8') as metadata_file:
+            metadata = json.load(metadata_file)
+
+        self.TableName = metadata["TableName"]
+        self.SourceFile = metadata["SourceFile"]
+        if metadata["Lazy"]:
+            self.DataFrame = pd.DataFrame()
+            self.SampleFrame = pd.read_pickle(os.path.join(snapshot_folder, "sample.pkl"))
+        else:
+            self.DataFrame = pd.read_pickle(os.path.join(snapshot_folder, "table.pkl"))
+        self.PendingColumnRenames = metadata["PendingColumnRenames"]
+        self.ColumnNames = {key: name for key, name in metadata["ColumnNames"]}
+        self.IntegrationIDToColumnIndex = {integrationID: index for integrationID, index in metadata["IntegrationIDToColumnIndex"]}
+        self.labeled_null_counter = metadata["LabeledNullCounter"]
+        self.Storage = metadata.get("Storage", "object")
+
+        self.ColumnEmbeddings = {}
+        if metadata["EmbeddingIDs"]:
+            embeddings = np.load(os.path.join(snapshot_folder, "embeddings.npy"), mmap_mode='r' if mmap_embeddings else None)
+            for row, integrationID in enumerate(metadata["EmbeddingIDs"]):
+                self.ColumnEmbeddings[integrationID] = embeddings[row]
+
+    # Load CSV data into the DataFrame. If lazy, only the header and a uniform random sample of sample_rows rows
+    # are kept (see SampleCSV), which is all that column alignment needs, and the whole file is read once the
+    # tuples are used. The storage selects how the data is kept (see Storage)
+    def LoadFromCSV(self, csv_file: str, lazy: bool = False, sample_rows: int = 1000, sketch: bool = False,
+                    storage: str = "object"):
+        if storage not in STORAGE_BACKENDS:
+            raise ValueError(f"Unknown storage {storage}, expected one of {list(STORAGE_BACKENDS)}")
         self.TableName = os.path.basename(csv_file)
-        self.DataFrame = pd.read_csv(csv_file, encoding="ISO-8859-1", on_bad_lines='skip')
+        self.SourceFile = csv_file
+        self.Storage = storage
+        if lazy:
+            self.DataFrame = pd.DataFrame()
+            self.SampleFrame = self.SampleCSV(sample_rows)
+        else:
+            self.DataFrame = self.ReadCSV()
+        if sketch:
+            self.ValueSketches()
+
+    def ReadCSV(self, nrows: int = None, chunksize: int = None):
+        dtype_backend = STORAGE_BACKENDS[self.Storage]
+        options = {"dtype_backend": dtype_backend} if dtype_backend else {}
+        return pd.read_csv(self.SourceFile, encoding="ISO-8859-1", on_bad_lines='skip', nrows=nrows,
+                           chunksize=chunksize, **options)
+
+    # Uniform random sample of sample_rows rows of the source file (in file order), read in chunks so that only
+    # the sample and one chunk are held at a time. Every row gets a random key and the rows with the smallest
+    # keys are kept, so files sorted or clustered by some column are sampled evenly. The keys are seeded, so a
+    # file is always sampled the same way
+    def SampleCSV(self, sample_rows: int, seed: int = 0, chunk_rows: int = 100000):
+        random = np.random.default_rng(seed)
+        sample, keys = self.ReadCSV(nrows=0), np.empty(0)
+        for chunk in self.ReadCSV(chunksize=max(sample_rows, chunk_rows)):
+            sample = chunk if sample.empty else pd.concat([sample, chunk])
+            keys = np.concatenate([keys, random.random(len(chunk))])
+            if len(sample) > sample_rows:
+                keep = np.sort(np.argpartition(keys, sample_rows)[:sample_rows])
+                sample, keys = sample.iloc[keep], keys[keep]
+        return sample.reset_index(drop=True)
+
+    def IsTyped(self):
+        return self.Storage != "object"
+
+    # Convert the table data to another storage. Labeled nulls and empty strings become missing values
+    def ConvertStorage(self, storage: str):
+        if storage not in STORAGE_BACKENDS:
+            raise ValueError(f"Unknown storage {storage}, expected one of {list(STORAGE_BACKENDS)}")
+        frame = self.DataFrame
+        if storage == "object":
+            frame = frame.astype(object)
+        else:
+            frame = frame.mask(self.MissingMask()).convert_dtypes(dtype_backend=STORAGE_BACKENDS[storage])
+        self.Storage = storage
+        self.DataFrame = frame
+
+    # Which values are missing, as k sees them: NaN or a value missing from the validity mask, an empty string,
+    # or a labeled null
+    def MissingMask(self):
+        frame = self.DataFrame
+        missing = frame.isna()
+        for column in frame.columns:
+            if pd.api.types.is_string_dtype(frame[column].dtype):
+                missing[column] |= (frame[column] == '').fillna(False).astype(bool)
+        if not self.IsTyped():
+            missing |= frame.map(lambda value: isinstance(value, self.LabeledNull))
+        return missing
+
+    # MinHash sketches and distinct value counts of all columns, over the loaded values (the sample of a lazily
+    # loaded table). See minhash.py
+    def ValueSketches(self, num_perm: int = DEFAULT_PERMUTATIONS):
+        if self.ValueSketch is None or self.ValueSketch.shape[1] != num_perm:
+            frame = self.AlignmentFrame()
+            self.ValueSketch = np.empty((frame.shape[1], num_perm), dtype=np.uint64)
+            self.DistinctCounts = np.empty(frame.shape[1], dtype=np.int64)
+            for columnIndex in range(frame.shape[1]):
+                column = frame.iloc[:, columnIndex]
+                self.ValueSketch[columnIndex] = MinHash(column, num_perm)
+                self.DistinctCounts[columnIndex] = column.nunique()
+        return self.ValueSketch, self.DistinctCounts
+
+    # Read the full table for a lazily loaded table, applying any column renames made in the meantime
+    def LoadFullTable(self):
+        if self.SampleFrame is None:
+            return
+        print(f"Loading full table data from {self.SourceFile}")
+        frame = self.ReadCSV()
+        frame.rename(columns=self.PendingColumnRenames, inplace=True)
+        self.PendingColumnRenames = {}
+        self.DataFrame = frame
+
+    # Independent copy of the table, e.g. to hand a consistent snapshot to a background writer. Without deep, the
+    # copy shares the data of the table (see DatabaseSnapshot)
+    def Copy(self, deep: bool = True):
+        table = RelationalTable()
+        table._DataFrame = self._DataFrame.copy(deep=deep)
+        table.SampleFrame = None if self.SampleFrame is None else self.SampleFrame.copy(deep=deep)
+        table.SourceFile = self.SourceFile
+        table.PendingColumnRenames = dict(self.PendingColumnRenames)
+        table.IntegrationIDToColumnIndex = dict(self.IntegrationIDToColumnIndex)
+        table.ColumnEmbeddings = dict(self.ColumnEmbeddings)
+        table.ColumnNames = dict(self.ColumnNames)
+        table.labeled_null_counter = self.labeled_null_counter
+        table.TableName = self.TableName
+        table.Storage = self.Storage
+        return table
+
+    def IsLoaded(self):
+        return self.SampleFrame is None
+
+    # The rows used for column alignment: the sampled rows while lazy, otherwise the whole table
+    def AlignmentFrame(self):
+        if self.SampleFrame is not None:
+            return self.SampleFrame
+        return self._DataFrame
 
     def TupleCount(self):
         return len(self.DataFrame.index)
 
     # Assign unique integration IDs to each column (must be unique between tables as well, hence an offset)
     def InitializeIntegrationIDs(self, offset: int):
-        for i in range(len(self.DataFrame.columns)):
+        column_count = len(self.AlignmentFrame().columns)
+        for i in range(column_count):
             integrationID = i + offset
             column_index = i
             self.IntegrationIDToColumnIndex[integrationID] = column_index
-        return offset + len(self.DataFrame.columns)
+        return offset + column_count
     
     # Record all the datatypes and names for columns in the table
     def GetColumnNames(self):
-        column_names = self.DataFrame.columns.to_list()
+        column_names = self.AlignmentFrame().columns.to_list()
         for integrationID, columnIndex in self.IntegrationIDToColumnIndex.items():
             column_name = column_names[columnIndex]
             self.ColumnNames[integrationID] = column_name
     
-    # For each column in the table, assign a unique embedding for clustering later
-    def InitializeColumnEmbeddings(self, transformer: SentenceTransformer, random_sample: bool = True):
+    # For each column in the table, assign a unique embedding for clustering later. The embeddings are written
+    # as rows of out (one per column, in column order) if given, so they can live in a database-wide matrix
+    def InitializeColumnEmbeddings(self, transformer: SentenceTransformer, random_sample: bool = True, out: np.ndarray = None):
+        self.EmbedColumnValues(transformer, self.SampleColumnValues(random_sample), out)
+
+    # The values of every column to embed (or a sample of them), as strings
+    def SampleColumnValues(self, random_sample: bool = True):
         self.GetColumnNames()
+        column_values = []
+        for columnIndex in self.IntegrationIDToColumnIndex.values():
+            values = self.AlignmentFrame().iloc[:, columnIndex].values
 
-        for integrationID, columnIndex in self.IntegrationIDToColumnIndex.items():
-            # read all available entries, generate an embedding by taking the mean of their embeddings
-            sum = np.zeros(transformer.get_sentence_embedding_dimension())
-            column = self.DataFrame.iloc[:, columnIndex]
-            column_values = column.values
-            value_count = 0
-            
             # if using a random sample, take the first 100 available values as the sample
             if random_sample:
-                column_values = sorted(column_values, key = lambda x: 1 if pd.isna(x) else np.random.rand())[:100]
+                values = sorted(values, key = lambda x: 1 if pd.isna(x) else np.random.rand())[:100]
 
-            for value in column_values:
-                if pd.isna(value):
-                    continue
-                else:
-                    value_count += 1
-                
-                # embed the string representation of the value (works for all types)
-                str_value = str(value)
-                column_annotated = f"{str_value}"
-                embedding = transformer.encode(column_annotated, normalize_embeddings=True)
-            
-                sum += embedding
-            
+            # embed the string representation of the value (works for all types)
+            column_values.append([str(value) for value in values if not pd.isna(value)])
+        return column_values
+
+    # Embed the values of all columns (from SampleColumnValues) in one batch, and take the mean per column
+    def EmbedColumnValues(self, transformer: SentenceTransformer, column_values: list[list[str]], out: np.ndarray = None):
+        if out is None:
+            out = np.empty((len(self.IntegrationIDToColumnIndex), transformer.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        all_values = [value for values in column_values for value in values]
+        embeddings = transformer.encode(all_values, normalize_embeddings=True, batch_size=256) if all_values else None
+
+        start = 0
+        for row, integrationID in enumerate(self.IntegrationIDToColumnIndex):
+            value_count = len(column_values[row])
             # take the mean if there were valid values in the column
             if value_count:
-                self.ColumnEmbeddings[integrationID] = sum / (value_count)
-                continue
+                out[row] = embeddings[start:start + value_count].mean(axis=0)
             # otherwise just use a random embedding
             else:
-                random_embedding = np.random.rand(sum.shape[0]) * 2 - 1
-                self.ColumnEmbeddings[integrationID] = (sum + random_embedding) / 2
+                out[row] = (np.random.rand(out.shape[1]) * 2 - 1) / 2
+            start += value_count
+            self.ColumnEmbeddings[integrationID] = out[row]
         
+    # Cheaper alternative to InitializeColumnEmbeddings: each column gets a signature of its header name's
+    # embedding and statistics and MinHash features of its values (see column_signature.py), computed over
+    # all loaded values without running the transformer on them
+    def InitializeColumnSignatures(self, transformer: SentenceTransformer, out: np.ndarray = None):
+        self.GetColumnNames()
+        header_dimension = transformer.get_sentence_embedding_dimension()
+        if out is None:
+            out = np.empty((len(self.IntegrationIDToColumnIndex), SignatureDimension(header_dimension)), dtype=np.float32)
+
+        headers = [str(self.ColumnNames[integrationID]) for integrationID in self.IntegrationIDToColumnIndex]
+        header_embeddings = transformer.encode(headers, normalize_embeddings=True) if headers else None
+
+        for row, (integrationID, columnIndex) in enumerate(self.IntegrationIDToColumnIndex.items()):
+            column = self.AlignmentFrame().iloc[:, columnIndex]
+            out[row, :header_dimension] = HEADER_WEIGHT * header_embeddings[row]
+            out[row, header_dimension:] = ValueFeatures(column)
+            self.ColumnEmbeddings[integrationID] = out[row]
+
     def RenameColumns(self, column_clusters):
         # change the column names to the new Integration ID (i.e. which cluster the column falls into)
         column_name_map = {}
@@ -132,7 +349,12 @@ class RelationalTable:
             new_name = str(column_clusters[integrationID])
             column_name_map[old_name] = new_name
             reverse_map[new_name] = old_name
-        self.DataFrame.rename(columns=column_name_map, inplace=True)
+        if self.SampleFrame is not None:
+            # defer renaming the full table until it is actually read
+            self.SampleFrame.rename(columns=column_name_map, inplace=True)
+            self.PendingColumnRenames.update(column_name_map)
+        else:
+            self.DataFrame.rename(columns=column_name_map, inplace=True)
 
         # clear data used to assign the integration IDs that is no longer needed
         self.ColumnEmbeddings.clear()
@@ -149,8 +371,11 @@ class RelationalTable:
         def __eq__(self, other):
             return other is self    # labeled nulls cannot be equal unless they are the same
 
-    # Generate labeled nulls to distinguish missing values in the data
+    # Generate labeled nulls to distinguish missing values in the data. Typed storage keeps missing values in
+    # the validity mask instead, where each missing value is already distinct by its position
     def GenerateLabeledNulls(self):
+        if self.IsTyped():
+            return
         def label_missing(value):
             if pd.isna(value):
                 self.labeled_null_counter += 1
@@ -161,6 +386,8 @@ class RelationalTable:
 
     # Replace labeled nulls back to NaN or missing values
     def ReplaceLabeledNulls(self):
+        if self.IsTyped():
+            return
         def remove_label(value):
             if isinstance(value, self.LabeledNull):
                 return None  # Convert labeled nulls to None
@@ -175,9 +402,21 @@ class RelationalTable:
             return
         elif self.DataFrame.empty:
             # If self is empty, take the other_table
-            self.DataFrame = other_table.DataFrame.copy().fillna("")
+            self.Storage = other_table.Storage
+            self.DataFrame = other_table.DataFrame.copy() if self.IsTyped() else other_table.DataFrame.copy().fillna("")
             self.ColumnNames.update(other_table.ColumnNames)
             return
+        elif self.IsTyped():
+            # the columns a table lacks are missing values of the column type in the other table, so the
+            # union keeps the column types
+            all_columns = sorted(set(self.DataFrame.columns) | set(other_table.DataFrame.columns))
+            def add_missing_columns(frame, other_frame):
+                missing = {col: pd.Series(pd.NA, index=frame.index, dtype=other_frame[col].dtype)
+                           for col in other_frame.columns if col not in frame.columns}
+                return pd.concat([frame, pd.DataFrame(missing, index=frame.index)], axis=1)[all_columns]
+            self.DataFrame = pd.concat([add_missing_columns(self.DataFrame, other_table.DataFrame),
+                                        add_missing_columns(other_table.DataFrame, self.DataFrame)], ignore_index=True)
+            return
         elif self.DataFrame.equals(other_table.DataFrame):
             # # If both tables are identical, do a regular union
             self.DataFrame = pd.concat([self.DataFrame, other_table.DataFrame], ignore_index=True).fillna("")
@@ -239,45 +478,126 @@ class RelationalTable:
         # alphabetically order the columns by name to create a consistent ordering
         self.DataFrame = self.DataFrame.reindex(sorted(self.DataFrame.columns), axis=1)
 
-    def Complement(self):
-        U_ou = self.DataFrame.copy()  # Outer unioned tuples
-        U_comp = U_ou.copy()
+    # Complement the tuples until a fixpoint is reached. With instrumentation, each iteration is recorded as a stage.
+    # With a budget (see budget.py), complementation stops early once the budget is used up, keeping the tuples
+    # that were not complemented yet as they are. With partners (a frame with the same columns), the tuples are
+    # complemented with the partner tuples instead of with each other
+    def Complement(self, instrumentation: Instrumentation = None, budget: ExecutionBudget = None,
+                   partners: pd.DataFrame = None):
+        stage = instrumentation.Stage if instrumentation else NoInstrumentation
+        U_ou = self.DataFrame.copy() if partners is None else partners  # Outer unioned tuples
+        U_comp = self.DataFrame.copy()
         U_temp = pd.DataFrame(columns=U_comp.columns)
 
         i = 0
-        while not U_temp.equals(U_comp):
-            print(f"Iter: {i}")
-            i += 1
-            U_temp = U_comp.copy()
-            U_comp_new = pd.DataFrame(columns=U_comp.columns)
-            print("\n")
-
-            for _, t_1 in U_temp.iterrows():
-                complement_count = 0
-                for _, t_2 in U_ou.iterrows():
-                    if t_1.equals(t_2):
-                        continue
-                    R, complement_status = self.k(t_1, t_2)
-                    if complement_status:
-                        U_comp_new = pd.concat([U_comp_new, pd.DataFrame([R])], ignore_index=True)
-                        #print("Tuple 1: \n", t_1, "\n")
-                        #print("Tuple 2: \n", t_2, "\n")
-                        #print("Result: \n", pd.DataFrame([R]), "\n")
-                        #print("New tuple: \n", U_comp_new, "\n")
-                        complement_count += 1
-
-                if complement_count == 0:
-                    U_comp_new = pd.concat([U_comp_new, pd.DataFrame([t_1])], ignore_index=True)
-
-            U_comp_new.drop_duplicates(inplace=True, ignore_index=True)
-            U_comp = U_comp_new
-
-        self.DataFrame = U_comp.replace({pd.NA: None})
+        stopped_at = None
+        while not U_temp.equals(U_comp) and stopped_at is None:
+            if budget and budget.Exhausted():
+                print(f"Budget used up after {i} complement iterations")
+                budget.Interrupted(len(U_comp), len(U_comp) * len(U_ou))
+                break
+            with stage(f"Complement iteration {i}") as iteration_record:
+                print(f"Iter: {i}")
+                if budget:
+                    budget.ReportProgress(i, len(U_comp))
+                i += 1
+                U_temp = U_comp.copy()
+                U_comp_new = pd.DataFrame(columns=U_comp.columns)
+                print("\n")
+
+                for row_number, (_, t_1) in enumerate(U_temp.iterrows()):
+                    if budget and budget.Exhausted():
+                        stopped_at = row_number
+                        break
+                    complement_count = 0
+                    for _, t_2 in U_ou.iterrows():
+                        if t_1.equals(t_2):
+                            continue
+                        R, complement_status = self.k(t_1, t_2)
+                        if complement_status:
+                            U_comp_new = pd.concat([U_comp_new, pd.DataFrame([R])], ignore_index=True)
+                            #print("Tuple 1: \n", t_1, "\n")
+                            #print("Tuple 2: \n", t_2, "\n")
+                            #print("Result: \n", pd.DataFrame([R]), "\n")
+                            #print("New tuple: \n", U_comp_new, "\n")
+                            complement_count += 1
+
+                    if complement_count == 0:
+                        U_comp_new = pd.concat([U_comp_new, pd.DataFrame([t_1])], ignore_index=True)
+                    if budget:
+                        budget.Charge(len(U_ou))
+
+                if stopped_at is not None:
+                    print(f"Budget used up in complement iteration {i - 1}, {len(U_temp) - stopped_at} tuples not complemented")
+                    U_comp_new = pd.concat([U_comp_new, U_temp.iloc[stopped_at:]], ignore_index=True)
+                    budget.Interrupted(len(U_temp) - stopped_at, (len(U_temp) - stopped_at) * len(U_ou))
+                elif budget:
+                    budget.IterationFinished()
+
+                U_comp_new.drop_duplicates(inplace=True, ignore_index=True)
+                U_comp = U_comp_new
+                iteration_record.Count("input", len(U_temp))
+                iteration_record.Count("output", len(U_comp))
+
+        if self.IsTyped():
+            # back to the column types of the outer union, with missing values in the validity mask
+            self.DataFrame = U_comp.astype(self.DataFrame.dtypes.to_dict())
+        else:
+            self.DataFrame = U_comp.replace({pd.NA: None})
         print("original tuples: \n", U_ou, "\n")
         print("final tuples: \n", U_comp, "\n")
         print("Complement operation performed.")
 
 
+    # Split the tuples into the joinable ones and the dangling ones, which cannot complement with any other tuple
+    # because they differ from each of them on some column where both have a value. Complement keeps dangling
+    # tuples unchanged, and since complemented tuples keep every value of the tuples they were made from, a
+    # dangling tuple also never complements a complemented tuple, so dangling tuples can skip Complement.
+    # Tuples are grouped by which columns have values. A tuple has a partner in another group if its values on
+    # the columns shared with that group occur in the group (any tuple if no columns are shared), and in its own
+    # group if another tuple has the same values and is not identical to it (identical tuples are skipped by
+    # Complement)
+    def SplitDanglingTuples(self):
+        frame = self.DataFrame
+        joinable = self.JoinableMask()
+        return frame[joinable].reset_index(drop=True), frame[~joinable].reset_index(drop=True)
+
+    # Which tuples can complement with some other tuple (see SplitDanglingTuples)
+    def JoinableMask(self):
+        frame = self.DataFrame
+        is_null = self.MissingMask().to_numpy()
+        values = frame.to_numpy(dtype=object)
+
+        groups: dict[tuple, list[int]] = {}     # columns with values -> rows
+        for row, row_nulls in enumerate(is_null):
+            groups.setdefault(tuple(np.flatnonzero(~row_nulls)), []).append(row)
+
+        joinable = np.zeros(len(frame), dtype=bool)
+        for columns, rows in groups.items():
+            same_values: dict[tuple, list[int]] = {}
+            for row in rows:
+                same_values.setdefault(tuple(values[row, list(columns)]), []).append(row)
+            for matching_rows in same_values.values():
+                first = frame.iloc[matching_rows[0]]
+                if any(not first.equals(frame.iloc[row]) for row in matching_rows[1:]):
+                    joinable[matching_rows] = True
+
+            for other_columns, other_rows in groups.items():
+                remaining = [row for row in rows if not joinable[row]]
+                if not remaining:
+                    break
+                if other_columns == columns:
+                    continue
+                shared = [column for column in columns if column in set(other_columns)]
+                if not shared:
+                    joinable[remaining] = True
+                    break
+                other_values = {tuple(values[row, shared]) for row in other_rows}
+                for row in remaining:
+                    if tuple(values[row, shared]) in other_values:
+                        joinable[row] = True
+        return joinable
+
     def k(self, t_1, t_2):
         complement_status = True
         R = {}
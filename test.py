@@ -1,7 +1,23 @@
 import unittest
+import importlib.util
+import os
+import time
+import tempfile
+import timeit
+import tracemalloc
+import json
 import pandas as pd
+from unittest import mock
 from table import RelationalTable
+from database import RelationalDatabase
+from instrumentation import Instrumentation
+from workload_generator import SyntheticWorkloadGenerator
+from benchmark import PairConfusionCounts, Benchmarker
+import benchmark_cli
+import microbenchmarks
+import embedding
 import numpy as np
+from scipy import stats
 
 
 class TestRelationalTableFunctions(unittest.TestCase):
@@ -472,6 +488,70 @@ class TestRelationalTableFunctions(unittest.TestCase):
         # Assert equality
         pd.testing.assert_frame_equal(actual_df, expected_df, check_dtype=False)
 
+    def test_column_signatures_without_value_embeddings(self):
+        table = RelationalTable()
+        table.DataFrame = pd.DataFrame({'name': ['a', 'b', None], 'size': [1.5, 20.0, 300.0]})
+        table.InitializeIntegrationIDs(0)
+        transformer = mock.Mock()
+        transformer.get_sentence_embedding_dimension.return_value = 4
+        transformer.encode.return_value = np.eye(4, dtype=np.float32)[:2]
+
+        table.InitializeColumnSignatures(transformer)
+
+        # only the two header names are embedded
+        self.assertEqual(transformer.encode.call_args[0][0], ['name', 'size'])
+        self.assertEqual(len(table.ColumnEmbeddings), 2)
+        signatures = list(table.ColumnEmbeddings.values())
+        np.testing.assert_array_equal(signatures[0][:4], [1, 0, 0, 0])
+        self.assertFalse(np.allclose(signatures[0][4:], signatures[1][4:]))
+
+    def test_split_dangling_tuples(self):
+        table = RelationalTable()
+        table.DataFrame = pd.DataFrame({
+            'key': ['A', 'A', 'B', 'C', 'C'],
+            'value': ['x', '', 'y', 'z', 'z'],
+        })
+
+        joinable, dangling = table.SplitDanglingTuples()
+
+        # (A, x) and (A, '') agree on every column where both have a value; (B, y) conflicts with every other
+        # tuple, and the two (C, z) tuples are identical, which Complement does not combine
+        self.assertEqual(joinable['key'].tolist(), ['A', 'A'])
+        self.assertEqual(dangling['key'].tolist(), ['B', 'C', 'C'])
+
+    def test_typed_storage_keeps_column_types(self):
+        self.check_typed_storage("nullable", 'Int64')
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "arrow storage requires pyarrow")
+    def test_arrow_storage_keeps_column_types(self):
+        self.check_typed_storage("arrow", 'int64[pyarrow]')
+        table = RelationalTable()
+        table.DataFrame = pd.DataFrame({'0': ['A', None], '1': [1, None]})
+        table.ConvertStorage("arrow")
+        self.assertTrue(all(isinstance(dtype, pd.ArrowDtype) for dtype in table.DataFrame.dtypes))
+        self.assertEqual(table.MissingMask().to_numpy().tolist(), [[False, False], [True, True]])
+
+    def check_typed_storage(self, storage, integer_dtype):
+        table_a = RelationalTable()
+        table_a.DataFrame = pd.DataFrame({'0': ['A', 'B'], '1': [1, None]})
+        table_b = RelationalTable()
+        table_b.DataFrame = pd.DataFrame({'0': ['A', 'C'], '2': [1.5, 2.5]})
+        full_disjunction = RelationalTable()
+        for table in [table_a, table_b]:
+            table.ConvertStorage(storage)
+            table.GenerateLabeledNulls()
+            full_disjunction.OuterUnionWith(table)
+
+        # missing values, including the columns a table lacks, are in the validity mask instead of placeholders
+        self.assertEqual(str(full_disjunction.DataFrame['1'].dtype), integer_dtype)
+        self.assertEqual(int(full_disjunction.MissingMask().to_numpy().sum()), 5)
+
+        full_disjunction.Complement()
+        full_disjunction.SubsumeTuples()
+        self.assertEqual(str(full_disjunction.DataFrame['1'].dtype), integer_dtype)
+        rows = sorted(str(row) for row in full_disjunction.DataFrame.astype(object).values.tolist())
+        self.assertEqual(rows, sorted(["['A', 1, 1.5]", "['B', <NA>, <NA>]", "['C', <NA>, 2.5]"]))
+
     def test_subsume_tuples_basic(self):
         # Create Table
         table = RelationalTable()
@@ -489,6 +569,559 @@ class TestRelationalTableFunctions(unittest.TestCase):
 
         pd.testing.assert_frame_equal(table.DataFrame.reset_index(drop=True), expected_df)
 
+    def test_lazy_load_defers_full_read(self):
+        with tempfile.TemporaryDirectory() as folder:
+            csv_file = os.path.join(folder, 'lazy.csv')
+            pd.DataFrame({
+                'Name': [f'n{i}' for i in range(50)],
+                'Value': list(range(50))
+            }).to_csv(csv_file, index=False)
+
+            table = RelationalTable()
+            table.LoadFromCSV(csv_file, lazy=True, sample_rows=10)
+            self.assertFalse(table.IsLoaded())
+            self.assertEqual(len(table.SampleFrame), 10)
+            # the sample is drawn from the whole (sorted) file, not just its first rows
+            self.assertGreaterEqual(table.SampleFrame['Value'].max(), 10)
+            self.assertEqual(table.SampleFrame['Value'].nunique(), 10)
+            self.assertEqual(table.SampleCSV(10, chunk_rows=7)['Value'].nunique(), 10)
+            self.assertEqual(len(table.SampleCSV(100)), 50)
+
+            # alignment only needs the sampled rows
+            self.assertEqual(table.InitializeIntegrationIDs(0), 2)
+            table.GetColumnNames()
+            table.RenameColumns({0: 5, 1: 7})
+            self.assertFalse(table.IsLoaded())
+
+            # the full table is read on first use, with the renames applied
+            self.assertEqual(table.TupleCount(), 50)
+            self.assertTrue(table.IsLoaded())
+            self.assertEqual(table.DataFrame.columns.to_list(), ['5', '7'])
+            self.assertEqual(table.ColumnNames, {'5': 'Name', '7': 'Value'})
+
+    def test_snapshot_round_trip(self):
+        table = RelationalTable()
+        table.TableName = 'snapshot.csv'
+        table.DataFrame = pd.DataFrame({
+            '0': ['A', None, 'C'],
+            '1': [1.5, 2.5, None]
+        })
+        table.ColumnNames = {'0': 'Letter', '1': 'Number'}
+        table.ColumnEmbeddings = {3: np.array([0.25, 0.5]), 4: np.array([1.0, -1.0])}
+        table.GenerateLabeledNulls()
+
+        with tempfile.TemporaryDirectory() as folder:
+            table.SaveSnapshot(folder)
+            restored = RelationalTable()
+            restored.LoadFromSnapshot(folder)
+
+            self.assertEqual(restored.TableName, 'snapshot.csv')
+            self.assertEqual(restored.ColumnNames, table.ColumnNames)
+            self.assertEqual(restored.labeled_null_counter, 2)
+            self.assertEqual(list(restored.ColumnEmbeddings.keys()), [3, 4])
+            np.testing.assert_array_equal(restored.ColumnEmbeddings[4], [1.0, -1.0])
+
+            # labeled nulls keep their type and index instead of being stringified
+            restored_null = restored.DataFrame.loc[1, '0']
+            self.assertIsInstance(restored_null, RelationalTable.LabeledNull)
+            self.assertEqual(restored_null.idx, table.DataFrame.loc[1, '0'].idx)
+            self.assertEqual(restored.DataFrame.loc[1, '1'], 2.5)
+
+
+class TestRelationalDatabaseFunctions(unittest.TestCase):
+    def make_aligned_database(self):
+        table_a = RelationalTable()
+        table_a.TableName = 'a.csv'
+        table_a.DataFrame = pd.DataFrame({
+            '0': ['A', 'B'],
+            '1': [1, 2]
+        })
+        table_b = RelationalTable()
+        table_b.TableName = 'b.csv'
+        table_b.DataFrame = pd.DataFrame({
+            '0': ['A', 'C'],
+            '2': ['x', 'y']
+        })
+
+        database = RelationalDatabase()
+        database.Tables = [table_a, table_b]
+        database.IntegrationIDsAssigned = True
+        return database
+
+    def test_resume_skips_checkpointed_stages(self):
+        with tempfile.TemporaryDirectory() as folder:
+            first_database = self.make_aligned_database()
+            first_result = first_database.RunALITE(folder, resume=True)
+            first_database.WaitForOutput()
+
+            # a rerun on the same inputs loads the final checkpoint instead of recomputing
+            with mock.patch.object(RelationalTable, 'Complement', side_effect=AssertionError("complement was rerun")):
+                resumed_result = self.make_aligned_database().RunALITE(folder, resume=True)
+
+            pd.testing.assert_frame_equal(resumed_result.DataFrame, first_result.DataFrame)
+
+    def test_failed_run_closes_background_writer(self):
+        database = self.make_aligned_database()
+        with tempfile.TemporaryDirectory() as folder:
+            # invalid arguments are rejected before the writer is started
+            self.assertRaises(ValueError, database.RunALITE, folder, engine="duckdb")
+            self.assertIsNone(database.OutputWriter)
+
+            with mock.patch.object(RelationalTable, 'Complement', side_effect=RuntimeError("complement failed")):
+                self.assertRaises(RuntimeError, database.RunALITE, folder)
+            output_writer = database.OutputWriter
+            database.WaitForOutput()
+            self.assertFalse(output_writer.Thread.is_alive())
+
+            # errors of background writes are raised by WaitForOutput
+            with mock.patch.object(RelationalDatabase, 'SaveStageOutput', side_effect=OSError("disk full")):
+                database.RunALITE(folder)
+            self.assertRaises(OSError, database.WaitForOutput)
+            self.assertIsNone(database.OutputWriter)
+
+    def test_memory_tracing_stops_after_traced_runs(self):
+        instrumentation = Instrumentation(trace_memory=True)
+        with instrumentation.Stage("Traced") as record:
+            self.assertTrue(tracemalloc.is_tracing())
+            self.assertEqual(len(list(range(10000))), 10000)
+        self.assertGreater(record.PeakTracedMemory, 0)
+        instrumentation.Reset()
+        self.assertFalse(tracemalloc.is_tracing())
+
+        instrumentation.TraceMemory = True
+        with instrumentation.Stage("Traced"):
+            pass
+        instrumentation.TraceMemory = False
+        self.assertFalse(tracemalloc.is_tracing())
+
+        # tracing that was started elsewhere is left on
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        instrumentation.TraceMemory = True
+        with instrumentation.Stage("Traced"):
+            pass
+        instrumentation.Reset()
+        self.assertTrue(tracemalloc.is_tracing())
+
+    def test_profiled_run_writes_stage_profiles(self):
+        with tempfile.TemporaryDirectory() as folder:
+            database = self.make_aligned_database()
+            database.RunALITE(folder, output_policy="none", profile=True)
+            database.WaitForOutput()
+
+            self.assertIn("Complement", database.Profiler.Profiles)
+            self.assertTrue(os.path.exists(os.path.join(folder, "profile - Complement.prof")))
+            self.assertTrue(os.path.exists(os.path.join(folder, "profile - all stages.prof")))
+            self.assertTrue(database.Profiler.HotFunctions())
+            # the profiler is only attached for the profiled run
+            self.assertNotIn(database.Profiler, database.Instrumentation.Hooks)
+
+    def test_spilled_run_matches_in_memory_run(self):
+        def run(**options):
+            database = self.make_aligned_database()
+            # tuples of this table have no value in column 0, the partition column, so every partition gets them
+            table_c = RelationalTable()
+            table_c.TableName = 'c.csv'
+            table_c.DataFrame = pd.DataFrame({'2': ['x', 'z']})
+            database.Tables.append(table_c)
+            with tempfile.TemporaryDirectory() as folder:
+                result = database.RunALITE(folder, output_policy="none", **options)
+                if options:
+                    # partition results are spilled too, and removed once merged
+                    self.assertFalse(os.listdir(os.path.join(folder, "Spill")))
+                    self.assertIsNone(database.OutputWriter)
+            return sorted(map(str, result.DataFrame[['0', '1', '2']].values.tolist()))
+
+        # a budget of one byte gives one partition per value
+        self.assertEqual(run(memory_budget=1), run())
+
+    def test_sqlite_engine_matches_pandas_engine(self):
+        def run(engine):
+            database = self.make_aligned_database()
+            table_c = RelationalTable()
+            table_c.TableName = 'c.csv'
+            table_c.DataFrame = pd.DataFrame({'1': [1, None], '2': ['x', 'z']})
+            database.Tables.append(table_c)
+            with tempfile.TemporaryDirectory() as folder:
+                result = database.RunALITE(folder, output_policy="none", engine=engine)
+            return sorted(map(str, result.DataFrame[['0', '1', '2']].values.tolist()))
+
+        self.assertEqual(run("sqlite"), run("pandas"))
+        # the sqlite engine cannot spill, so a memory budget is refused instead of ignored
+        with tempfile.TemporaryDirectory() as folder:
+            self.assertRaises(ValueError, self.make_aligned_database().RunALITE, folder, engine="sqlite", memory_budget=1024)
+
+    def test_comparison_budget_returns_partial_result(self):
+        database = self.make_aligned_database()
+        with tempfile.TemporaryDirectory() as folder:
+            result = database.RunALITE(folder, output_policy="none", resume=True, comparison_budget=2)
+            database.WaitForOutput()
+            # only the outer union was checkpointed
+            self.assertEqual(sorted(os.listdir(os.path.join(folder, "Checkpoints"))),
+                             ["0 - AlignedTables", "1 - PostOuterJoinAndLabeledNulls"])
+
+        # the first joinable tuple was complemented, the second one was kept as it is
+        completeness = database.Completeness
+        self.assertFalse(completeness["Complete"])
+        self.assertEqual((completeness["IterationsCompleted"], completeness["Comparisons"],
+                          completeness["PairsUnexamined"], completeness["TuplesUnprocessed"]), (0, 2, 2, 1))
+        self.assertIn(['A', 1, 'x'], result.DataFrame[['0', '1', '2']].values.tolist())
+
+        database = self.make_aligned_database()
+        with tempfile.TemporaryDirectory() as folder:
+            result = database.RunALITE(folder, output_policy="none", comparison_budget=100)
+        self.assertTrue(database.Completeness["Complete"])
+        self.assertEqual(result.TupleCount(), 3)
+
+    def test_estimate_complement_calibrated_on_previous_runs(self):
+        table_a = RelationalTable()
+        table_a.DataFrame = pd.DataFrame({'0': [f'k{i}' for i in range(100)], '1': range(100)})
+        table_b = RelationalTable()
+        table_b.DataFrame = pd.DataFrame({'0': [f'k{i % 50}' for i in range(100)], '2': [f'x{i}' for i in range(100)]})
+        database = RelationalDatabase()
+        database.Tables = [table_a, table_b]
+        database.IntegrationIDsAssigned = True
+
+        # half of the keys of a match two tuples of b each, the other half are kept on their own
+        estimate = database.EstimateComplement(sample_size=100)
+        self.assertEqual(estimate.RawOutputTuples, 150)
+        join = estimate.Joins[0]
+        self.assertEqual((join.Column, join.Overlap, join.Fanout), ('0', 0.5, 2.0))
+        # each tuple of a has one partner in b on average and each tuple of b one in a, out of 200 * 200 pairs
+        self.assertAlmostEqual(estimate.CompatibleFraction, 200 / 200 ** 2)
+
+        # previous runs took 4e-5 seconds per comparison and had twice the estimated output
+        tuple_counts = {("d1", "ALITE"): (100, 150), ("d2", "ALITE"): (200, 300), ("d1", "Other"): (100, 150)}
+        durations = {("d1", "ALITE"): 1.0, ("d2", "ALITE"): 4.0, ("d1", "Other"): 100.0}
+        estimate = database.EstimateComplement(tuple_counts, durations, {("d1", "ALITE"): 75}, sample_size=100)
+        self.assertEqual(estimate.CalibrationRuns, 2)
+        self.assertAlmostEqual(estimate.OutputTuples, 300)
+        self.assertAlmostEqual(estimate.Seconds, 200 * (200 + 300) * 4e-5)
+
+    def test_snapshot_forks_share_data_and_stay_independent(self):
+        database = self.make_aligned_database()
+        database.Tables[0].DataFrame.loc[1, '1'] = None
+        snapshot = database.Snapshot()
+
+        results = []
+        for _ in range(2):
+            fork = snapshot.Fork()
+            self.assertTrue(np.shares_memory(fork.Tables[0].DataFrame['0'].to_numpy(), snapshot.Tables[0].DataFrame['0'].to_numpy()))
+            with tempfile.TemporaryDirectory() as folder:
+                result = fork.RunALITE(folder, output_policy="none")
+            results.append(sorted(map(str, result.DataFrame[['0', '1', '2']].values.tolist())))
+            # the fork's tables got labeled nulls, the snapshot's did not
+            self.assertIsInstance(fork.Tables[0].DataFrame.loc[1, '1'], RelationalTable.LabeledNull)
+            self.assertTrue(pd.isna(snapshot.Tables[0].DataFrame.loc[1, '1']))
+
+        self.assertEqual(results[0], results[1])
+        self.assertTrue(snapshot.Fork().IntegrationIDsAssigned)
+        frame = snapshot.Fork().Tables[0].DataFrame
+        with self.assertRaises(ValueError):
+            frame.iloc[0, 0] = 'Z'
+
+        # extension columns cannot be read-only, so every fork writes into its own copy
+        database.Tables[0].DataFrame['3'] = pd.array([1, None], dtype='Int64')
+        snapshot = database.Snapshot()
+        frame = snapshot.Fork().Tables[0].DataFrame
+        frame.loc[0, '3'] = 7
+        frame.loc[1, '3'] = 8
+        self.assertEqual(snapshot.Tables[0].DataFrame['3'].tolist(), [1, pd.NA])
+        self.assertEqual(snapshot.Fork().Tables[0].DataFrame['3'].tolist(), [1, pd.NA])
+
+    def test_embedding_matrix_is_shared_and_cached_in_embedding_file(self):
+        # a table writes its column embeddings into the rows it is given, and keeps views of them
+        table = RelationalTable()
+        table.DataFrame = pd.DataFrame({'id': [1, 2], 'name': ['x', 'y']})
+        table.InitializeIntegrationIDs(0)
+        matrix = np.zeros((3, 2), dtype=np.float32)
+        table.InitializeColumnEmbeddings(DigitModel(), out=matrix[1:])
+        np.testing.assert_array_equal(matrix, [[0, 0], [1, 0], [0, 1]])
+        self.assertTrue(all(np.shares_memory(embedding, matrix) for embedding in table.ColumnEmbeddings.values()))
+
+        with tempfile.TemporaryDirectory() as output_folder:
+            folder = os.path.join(output_folder, 'data')
+            os.mkdir(folder)
+            pd.DataFrame({'id': [1, 2], 'name': ['x', 'y']}).to_csv(os.path.join(folder, 'a.csv'), index=False)
+            pd.DataFrame({'key': [2, 3], 'city': ['u', 'v']}).to_csv(os.path.join(folder, 'b.csv'), index=False)
+            embedding_file = os.path.join(output_folder, 'embeddings.dat')
+
+            with mock.patch('database.LoadEmbeddingModel', return_value=DigitModel()):
+                database = RelationalDatabase()
+                database.LoadFromFolder(folder)
+                database.AssignIntegrationIDs(embedding_file)
+            self.assertIsInstance(database.EmbeddingMatrix, np.memmap)
+            stored = np.fromfile(embedding_file, dtype=np.float32).reshape(database.EmbeddingMatrix.shape)
+            np.testing.assert_array_equal(stored, database.EmbeddingMatrix)
+
+            # the same inputs and settings map the stored embeddings instead of embedding the columns again
+            model = mock.Mock(wraps=DigitModel())
+            with mock.patch('database.LoadEmbeddingModel', return_value=model):
+                cached = RelationalDatabase()
+                cached.LoadFromFolder(folder)
+                cached.AssignIntegrationIDs(embedding_file)
+                model.encode.assert_not_called()
+                np.testing.assert_array_equal(cached.EmbeddingMatrix, database.EmbeddingMatrix)
+                self.assertEqual([table.ColumnNames for table in cached.Tables], [table.ColumnNames for table in database.Tables])
+
+                # another model embeds the columns again
+                changed = RelationalDatabase()
+                changed.LoadFromFolder(folder)
+                changed.EmbeddingModel = "other-model"
+                changed.AssignIntegrationIDs(embedding_file)
+                model.encode.assert_called()
+            # release the memory maps before the folder is removed
+            del database, cached, changed
+
+    def test_pipelined_alignment_matches_sequential_alignment(self):
+        with tempfile.TemporaryDirectory() as folder:
+            for name, frame in [('a.csv', pd.DataFrame({'id': [1, 2], 'name': ['x', 'y']})),
+                                ('b.csv', pd.DataFrame({'key': [2, 3], 'city': ['u', 'v']})),
+                                ('c.csv', pd.DataFrame({'code': [3, 4]}))]:
+                frame.to_csv(os.path.join(folder, name), index=False)
+
+            # the column embeddings of the tables as they are when clustering is done with them
+            clustered_embeddings = []
+            rename_columns = RelationalTable.RenameColumns
+            def record_embeddings(table, column_clusters):
+                clustered_embeddings.append(list(table.ColumnEmbeddings.values()))
+                return rename_columns(table, column_clusters)
+
+            with mock.patch('database.LoadEmbeddingModel', return_value=DigitModel()), \
+                    mock.patch.object(RelationalTable, 'RenameColumns', record_embeddings):
+                sequential = RelationalDatabase()
+                sequential.LoadFromFolder(folder)
+                sequential.AssignIntegrationIDs()
+                pipelined = RelationalDatabase()
+                pipelined.LoadAndAssignIntegrationIDs(folder, queue_size=1)
+
+        self.assertEqual([table.TableName for table in pipelined.Tables], [table.TableName for table in sequential.Tables])
+        self.assertEqual([table.ColumnNames for table in pipelined.Tables], [table.ColumnNames for table in sequential.Tables])
+        np.testing.assert_array_equal(pipelined.EmbeddingMatrix, sequential.EmbeddingMatrix)
+        # the column embeddings of every table are rows of the shared matrix, as with sequential alignment
+        self.assertEqual(len(clustered_embeddings), 6)
+        for database, embeddings in [(sequential, clustered_embeddings[:3]), (pipelined, clustered_embeddings[3:])]:
+            for table_embeddings in embeddings:
+                self.assertTrue(table_embeddings)
+                self.assertTrue(all(np.shares_memory(embedding, database.EmbeddingMatrix) for embedding in table_embeddings))
+        statistics = pipelined.PipelineStatistics
+        self.assertEqual([statistics["Queues"][name]["Items"] for name in ["Load", "Sample"]], [3, 3])
+        self.assertLessEqual(statistics["Queues"]["Load"]["MaxDepth"], 1)
+
+    def test_embedding_models_are_cached_per_backend(self):
+        embedding.ClearEmbeddingModels()
+        self.addCleanup(embedding.ClearEmbeddingModels)
+        with mock.patch('embedding.SentenceTransformer') as transformer, \
+                mock.patch('torch.ao.quantization.quantize_dynamic', side_effect=lambda model, *args, **kwargs: model) as quantize:
+            model = embedding.LoadEmbeddingModel("model")
+            self.assertIs(embedding.LoadEmbeddingModel("model"), model)
+            # the torch backend loads the model as SentenceTransformer does by default, on any device
+            transformer.assert_called_once_with("model")
+
+            embedding.LoadEmbeddingModel("model", "quantized")
+            transformer.assert_called_with("model", device="cpu")
+            quantize.assert_called_once()
+            embedding.LoadEmbeddingModel("model", "onnx")
+            transformer.assert_called_with("model", backend="onnx", local_files_only=False)
+            self.assertEqual(transformer.call_count, 3)
+
+        self.assertRaises(ValueError, embedding.LoadEmbeddingModel, "model", "tensorrt")
+
+    def test_incremental_full_disjunction_updates(self):
+        with tempfile.TemporaryDirectory() as folder:
+            database = self.make_aligned_database()
+            database.RunALITE(folder, output_policy="none", resume=True)
+            database.WaitForOutput()
+            incremental = database.IncrementalFullDisjunction(folder)
+
+        incremental.Update(1, appended=pd.DataFrame({'0': ['B'], '2': ['z']}))
+        incremental.Update(1, deleted=pd.DataFrame({'0': ['A'], '2': ['x']}))
+        result = incremental.FullDisjunction().DataFrame[['0', '1', '2']]
+        self.assertEqual(sorted(map(str, result.values.tolist())),
+                         ["['A', 1, '']", "['B', 2, 'z']", "['C', '', 'y']"])
+
+        with tempfile.TemporaryDirectory() as folder:
+            self.assertRaises(ValueError, database.IncrementalFullDisjunction, folder)
+
+    def test_overlap_table_order_keeps_full_disjunction(self):
+        frames = [
+            pd.DataFrame({'0': [f'k{i}' for i in range(10)], '1': range(10)}),
+            pd.DataFrame({'2': [f'x{i}' for i in range(10)]}),
+            pd.DataFrame({'0': [f'k{i}' for i in range(5, 15)], '3': range(100, 110)}),
+        ]
+        results = []
+        for table_order in ["input", "overlap"]:
+            database = RelationalDatabase()
+            for frame in frames:
+                table = RelationalTable()
+                table.DataFrame = frame.copy()
+                database.Tables.append(table)
+            database.IntegrationIDsAssigned = True
+            with tempfile.TemporaryDirectory() as folder:
+                result = database.RunALITE(folder, output_policy="none", table_order=table_order)
+            results.append(result.DataFrame)
+
+        # only the key columns of the first and last table overlap
+        self.assertEqual(list(database.ColumnOverlaps), [((0, 0), (2, 0))])
+        self.assertEqual(database.OverlapTableOrder(), [0, 2, 1])
+        columns = sorted(results[0].columns)
+        pd.testing.assert_frame_equal(
+            results[0][columns].astype(str).sort_values(columns).reset_index(drop=True),
+            results[1][columns].astype(str).sort_values(columns).reset_index(drop=True))
+
+    def test_pairwise_integration_plan(self):
+        frames = [
+            pd.DataFrame({'0': ['a1', 'a2'], '1': ['b1', 'b2']}),
+            pd.DataFrame({'2': ['c1'], '3': ['d1']}),
+            pd.DataFrame({'1': ['b1', None], '2': ['c1', 'c2']}),
+            # shares no columns with the other tables
+            pd.DataFrame({'4': ['e1']}),
+        ]
+        def make_database():
+            database = RelationalDatabase()
+            for index, frame in enumerate(frames):
+                table = RelationalTable()
+                table.TableName = f'{index}.csv'
+                table.DataFrame = frame.copy()
+                database.Tables.append(table)
+            database.IntegrationIDsAssigned = True
+            return database
+
+        database = make_database()
+        plan, explanation = database.PlanIntegration()
+        # every step after the first joins a table connected to the result so far, the cartesian step comes last
+        self.assertEqual(len(plan), 3)
+        self.assertEqual(sorted(sum((step.TableIndices for step in plan), [])), [0, 1, 2, 3])
+        self.assertTrue(plan[1].SharedColumns)
+        self.assertEqual(plan[2].TableIndices, [3])
+        self.assertIn("Integration plan for 4 tables in 3 steps", explanation)
+
+        with tempfile.TemporaryDirectory() as folder:
+            result = database.RunALITE(folder, output_policy="none", strategy="pairwise")
+            single = make_database().RunALITE(folder, output_policy="none")
+            self.assertRaises(ValueError, database.RunALITE, folder, strategy="pairwise", engine="sqlite")
+        rows = result.DataFrame[['0', '1', '2', '3', '4']].values.tolist()
+        self.assertIn(['a1', 'b1', 'c1', 'd1', 'e1'], rows)
+        # integrating step by step gives the same full disjunction as integrating all tables at once
+        self.assertEqual(sorted(map(repr, rows)), sorted(map(repr, single.DataFrame[['0', '1', '2', '3', '4']].values.tolist())))
+
+    def test_compare_flags_significant_slowdowns(self):
+        def export(durations, cluster_durations, filepath):
+            benchmarker = Benchmarker(output_policy="none")
+            for method, samples in durations.items():
+                benchmarker.DurationSamples[("parks", method)] = samples
+            benchmarker.ClusterQuality["parks"] = [1, 0, 1, 0, 1.0, 1.0, 1.0, 1.0]
+            benchmarker.ClusterDurationSamples["parks"] = cluster_durations
+            benchmarker.ExportResults(filepath)
+
+        with tempfile.TemporaryDirectory() as folder:
+            baseline_file, current_file, output_file = (os.path.join(folder, name) for name in ["baseline.json", "current.json", "comparison.json"])
+            export({"ALITE": [1.0, 1.1, 0.9, 1.0], "ALITE-SQLite": [2.0]}, [0.5, 0.6, 0.55], baseline_file)
+            export({"ALITE": [1.5, 1.6, 1.4, 1.5], "ALITE-SQLite": [3.0]}, [0.5, 0.62, 0.54], current_file)
+            arguments = benchmark_cli.ParseArguments(["compare", baseline_file, current_file, "--output", output_file])
+            self.assertEqual(benchmark_cli.Compare(arguments), 1)
+            with open(output_file, 'r', encoding='utf-8') as file:
+                comparisons = {(entry["kind"], entry["method"]): entry for entry in json.load(file)}
+
+        # one-sided Welch t-test of the ALITE durations, computed by hand
+        current, baseline = np.array([1.5, 1.6, 1.4, 1.5]), np.array([1.0, 1.1, 0.9, 1.0])
+        variances = current.var(ddof=1) / len(current), baseline.var(ddof=1) / len(baseline)
+        t = (current.mean() - baseline.mean()) / np.sqrt(sum(variances))
+        degrees_of_freedom = sum(variances) ** 2 / sum(variance ** 2 / 3 for variance in variances)
+        alite = comparisons[("integration", "ALITE")]
+        self.assertAlmostEqual(alite["p_value"], stats.t.sf(t, degrees_of_freedom))
+        self.assertAlmostEqual(alite["ratio"], 1.5)
+        self.assertTrue(alite["regression"])
+        # without repetitions there is no test, and the slowdown alone is flagged
+        self.assertIsNone(comparisons[("integration", "ALITE-SQLite")]["p_value"])
+        self.assertTrue(comparisons[("integration", "ALITE-SQLite")]["regression"])
+        self.assertFalse(comparisons[("clustering", "")]["regression"])
+
+    def test_parallel_benchmarks_record_failures_per_stage(self):
+        with tempfile.TemporaryDirectory() as folder:
+            # Benchmarker writes to TestData in the working directory
+            original_directory = os.getcwd()
+            os.chdir(folder)
+            self.addCleanup(os.chdir, original_directory)
+            for stage_folder in ["align", "real"]:
+                os.makedirs(os.path.join(stage_folder, "shared"))
+
+            with mock.patch('benchmark.BenchmarkDatasetInProcess', FailOrHangInProcess):
+                benchmarker = Benchmarker(output_policy="none")
+                benchmarker.RunBenchmarksParallel("align", "real", workers=2, timeout=1)
+                # the same dataset name in both stages is recorded once per stage
+                self.assertEqual(sorted(benchmarker.FailedBenchmarks), [("align", "shared"), ("integration", "shared")])
+                self.assertIn("ValueError", benchmarker.FailedBenchmarks[("align", "shared")])
+                self.assertEqual(benchmarker.FailedBenchmarks[("integration", "shared")], "timed out after 1 seconds")
+
+                arguments = benchmark_cli.ParseArguments(["run", "--stages", "align", "--workers", "2", "--align-folder", "align",
+                                                          "--output", "results.json"])
+                self.assertEqual(benchmark_cli.Run(arguments), 1)
+
+    def test_microbenchmarks_run_on_tiny_inputs(self):
+        # the tuple pair of k and is_subsumed is compatible, so both go through every column
+        for method in ["k", "is_subsumed"]:
+            setup, run = microbenchmarks.TuplePairBenchmark(4, method)
+            setup()
+            self.assertTrue(run() if method == "is_subsumed" else run()[1])
+            self.assertGreater(timeit.Timer(run, setup).timeit(number=1), 0)
+
+        result = microbenchmarks.BenchmarkPrimitive("subsume_tuples", sizes=[2, 4], repeat=1)
+        self.assertEqual([measurement["size"] for measurement in result["measurements"]], [2, 4])
+        self.assertTrue(all(measurement["seconds"] > 0 for measurement in result["measurements"]))
+        self.assertIsNotNone(result["scaling_exponent"])
+
+    def test_synthetic_workload_with_known_alignment(self):
+        with tempfile.TemporaryDirectory() as folder:
+            data_folder = os.path.join(folder, 'synthetic')
+            SyntheticWorkloadGenerator(table_count=4, row_count=5).Generate(data_folder)
+            # a smaller workload in the same folder replaces the earlier tables
+            SyntheticWorkloadGenerator(table_count=2, row_count=6, column_count=5, column_overlap=0.5).Generate(data_folder)
+            database = RelationalDatabase()
+            database.LoadFromFolder(data_folder)
+
+            with open(os.path.join(data_folder, 'notes.txt'), 'w') as file:
+                file.write("not a table")
+            self.assertRaises(ValueError, SyntheticWorkloadGenerator().Generate, data_folder)
+
+        self.assertEqual(sorted(table.TableName for table in database.Tables), ['synthetic_0.csv', 'synthetic_1.csv'])
+        self.assertEqual([table.TupleCount() for table in database.Tables], [6, 6])
+        SyntheticWorkloadGenerator.ApplyKnownAlignment(database)
+        # columns with the same generated name, and only those, get the same integration ID
+        names = {}
+        for table in database.Tables:
+            self.assertEqual(len(table.ColumnNames), 5)
+            for integration_id, column_name in table.ColumnNames.items():
+                self.assertEqual(names.setdefault(integration_id, column_name), column_name)
+        self.assertEqual(len(set(names.values())), len(names))
+        self.assertEqual(sum(name.startswith("shared_") for name in names.values()), 4)
+
+    def test_pair_confusion_counts_match_pairwise_comparison(self):
+        # table 0 has columns a (ID 0) and b (ID 1), table 1 has a (ID 0) and c (ID 1)
+        counts = PairConfusionCounts([0, 0, 1, 1], ['a', 'b', 'a', 'c'], [0, 1, 0, 1])
+        # within table 0: aa, bb positive and matched, ab, ba negative; same for table 1;
+        # across: a-a positive and matched, b-c negative but flagged positive, a-c and b-a negative
+        self.assertEqual(counts, (5, 1, 6, 0))
+
+
+# Embedding model that embeds numbers and other values as two different unit vectors
+class DigitModel:
+    def get_sentence_embedding_dimension(self):
+        return 2
+
+    def encode(self, values, normalize_embeddings=True, batch_size=256):
+        return np.array([[1.0, 0.0] if value.isdigit() else [0.0, 1.0] for value in values], dtype=np.float32)
+
+
+# Stands in for benchmark.BenchmarkDatasetInProcess: the align benchmark fails and the integration benchmark hangs
+def FailOrHangInProcess(kind, dataset_name, dataset_path, *settings_and_connection):
+    connection = settings_and_connection[-1]
+    if kind == "align":
+        connection.send(("error", "Traceback (most recent call last):\nValueError: no columns"))
+        connection.close()
+    else:
+        time.sleep(60)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,93 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+from database import RelationalDatabase
+
+
+# Generates families of related CSV tables for scaling benchmarks. Every table has a join key column drawn
+# from a common key domain, a number of attribute columns shared with other tables (whose values are a
+# function of the key, so tuples from different tables agree and can be complemented), and columns that are
+# unique to the table. Columns with the same name represent the same attribute, which gives the ground truth
+# for column alignment
+class SyntheticWorkloadGenerator:
+    def __init__(self, table_count: int = 3, row_count: int = 100, column_count: int = 4, column_overlap: float = 0.5,
+                 null_rate: float = 0.1, cardinality: int = 50, join_fanout: float = 1.0, seed: int = 0):
+        self.TableCount = table_count
+        self.RowCount = row_count               # rows per table
+        self.ColumnCount = column_count         # columns per table, including the join key
+        self.ColumnOverlap = column_overlap     # fraction of attribute columns taken from the shared pool
+        self.NullRate = null_rate               # fraction of attribute values that are missing
+        self.Cardinality = cardinality          # distinct values per attribute column
+        self.JoinFanout = join_fanout           # average number of rows per join key value in each table
+        self.Seed = seed
+
+    # Column names of every table: the join key, then shared and table-specific attribute columns
+    def TableSchemas(self, rng: np.random.Generator):
+        attribute_count = self.ColumnCount - 1
+        shared_count = int(round(attribute_count * self.ColumnOverlap))
+        shared_pool = [f"shared_{i}" for i in range(attribute_count)]
+
+        schemas = []
+        for table_index in range(self.TableCount):
+            shared = list(rng.choice(shared_pool, size=shared_count, replace=False))
+            unique = [f"t{table_index}_attr_{i}" for i in range(attribute_count - shared_count)]
+            schemas.append(["key"] + sorted(shared) + unique)
+        return schemas
+
+    def GenerateTable(self, columns: list[str], rng: np.random.Generator):
+        key_domain = max(1, int(round(self.RowCount / self.JoinFanout)))
+        keys = rng.integers(0, key_domain, size=self.RowCount)
+
+        data = {"key": keys}
+        for column in columns[1:]:
+            if column.startswith("shared_"):
+                # the same attribute has the same value for a key in every table
+                multiplier = 2 * int(column.split("_")[1]) + 3
+                values = (keys * multiplier + multiplier) % self.Cardinality
+            else:
+                values = rng.integers(0, self.Cardinality, size=self.RowCount)
+            column_values = pd.Series([f"{column}_v{value}" for value in values], dtype=object)
+            column_values[rng.random(self.RowCount) < self.NullRate] = None
+            data[column] = column_values
+        return pd.DataFrame(data, columns=columns)
+
+    # Generate the tables in memory
+    def GenerateFrames(self):
+        rng = np.random.default_rng(self.Seed)
+        return [self.GenerateTable(columns, rng) for columns in self.TableSchemas(rng)]
+
+    # Write the tables as CSV files into the output folder and return their paths. Tables generated into the
+    # folder before are removed, since loading the folder would pick them up; any other file is an error
+    def Generate(self, output_folder: str):
+        os.makedirs(output_folder, exist_ok=True)
+        dataset_name = os.path.basename(os.path.normpath(output_folder))
+        table_file = re.compile(re.escape(dataset_name) + r"_\d+\.csv")
+        other_files = [file for file in os.listdir(output_folder) if not table_file.fullmatch(file)]
+        if other_files:
+            raise ValueError(f"{output_folder} contains files that are not generated tables: {other_files}")
+        for file in os.listdir(output_folder):
+            os.remove(os.path.join(output_folder, file))
+
+        files = []
+        for table_index, frame in enumerate(self.GenerateFrames()):
+            filepath = os.path.join(output_folder, f"{dataset_name}_{table_index}.csv")
+            frame.to_csv(filepath, index=False)
+            files.append(filepath)
+        print(f"Generated {len(files)} tables with {self.RowCount} rows each in {output_folder}")
+        return files
+
+    # Align the columns of a database loaded from generated tables by their names, which are the ground
+    # truth, so that scaling benchmarks of the integration stages do not depend on the embedding model
+    @staticmethod
+    def ApplyKnownAlignment(database: RelationalDatabase):
+        offset = 0
+        cluster_of_name = {}
+        for table in database.Tables:
+            offset = table.InitializeIntegrationIDs(offset)
+            table.GetColumnNames()
+            column_clusters = {}
+            for integrationID, column_name in table.ColumnNames.items():
+                column_clusters[integrationID] = cluster_of_name.setdefault(column_name, len(cluster_of_name))
+            table.RenameColumns(column_clusters)
+        database.IntegrationIDsAssigned = True